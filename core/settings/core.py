@@ -201,6 +201,18 @@ ERPNEXT_TOKEN = os.getenv('ERPNEXT_TOKEN', '')
 ERPNEXT_SITE_LOCATION = os.getenv('ERPNEXT_SITE_LOCATION',
                                   'https://erp.kartoza.com')
 
+ERPNEXT_POOL_SIZE = int(os.getenv('ERPNEXT_POOL_SIZE', 10))
+ERPNEXT_CONNECT_TIMEOUT = float(os.getenv('ERPNEXT_CONNECT_TIMEOUT', 5))
+ERPNEXT_READ_TIMEOUT = float(os.getenv('ERPNEXT_READ_TIMEOUT', 60))
+ERPNEXT_MAX_RETRIES = int(os.getenv('ERPNEXT_MAX_RETRIES', 3))
+ERPNEXT_RETRY_BACKOFF = float(os.getenv('ERPNEXT_RETRY_BACKOFF', 0.5))
+ERPNEXT_PAGE_LENGTH = int(os.getenv('ERPNEXT_PAGE_LENGTH', 500))
+ERPNEXT_FULL_SYNC_INTERVAL_HOURS = int(os.getenv('ERPNEXT_FULL_SYNC_INTERVAL_HOURS', 24))
+ERPNEXT_SYNC_WORKERS = int(os.getenv('ERPNEXT_SYNC_WORKERS', 8))
+ERPNEXT_SUBMIT_WORKERS = int(os.getenv('ERPNEXT_SUBMIT_WORKERS', 4))
+ERPNEXT_BILLABLE_HISTORY_START = os.getenv('ERPNEXT_BILLABLE_HISTORY_START', '2015-01-01')
+ERPNEXT_REPORT_SYNC_DAYS = int(os.getenv('ERPNEXT_REPORT_SYNC_DAYS', 45))
+
 ERPNEXT_OAUTH_CLIENT_ID = os.getenv('ERPNEXT_OAUTH_CLIENT_ID', '')
 ERPNEXT_OAUTH_CLIENT_SECRET = os.getenv('ERPNEXT_OAUTH_CLIENT_SECRET', '')
 ERPNEXT_OAUTH_REDIRECT_URI = os.getenv('ERPNEXT_OAUTH_REDIRECT_URI', 'http://localhost:8080/api/erpnext-oauth/callback/')
@@ -250,6 +262,12 @@ CACHES = {
         "LOCATION": absolute_path('core', 'cache'),
     }
 }
+# Seconds to coalesce schedule saves before re-rendering the cached schedule lists; 0 disables it.
+SCHEDULE_CACHE_WARMUP_DELAY = float(os.getenv('SCHEDULE_CACHE_WARMUP_DELAY', 1))
+# Longest `since` window the schedule delta API answers fully; older tombstones are pruned.
+SCHEDULE_DELTA_WINDOW_DAYS = int(os.getenv('SCHEDULE_DELTA_WINDOW_DAYS', 30))
+# Seconds the delta cursor trails now, so saves whose transaction commits after a poll are not skipped.
+SCHEDULE_DELTA_CURSOR_LAG_SECONDS = float(os.getenv('SCHEDULE_DELTA_CURSOR_LAG_SECONDS', 10))
 
 DEFAULT_FROM_EMAIL = os.environ.get(
     'DEFAULT_FROM_EMAIL',
@@ -12,7 +12,7 @@ from drf_spectacular.types import OpenApiTypes
 
 from timesheet.models.profile import Profile
 from timesheet.models.task import Task
-from timesheet.utils.erp import get_detailed_report_data_by_employee
+from timesheet.utils.report_rows import get_detailed_report_rows
 
 # --- Task description parsing & allocation helpers ---
 ALLOWED_SIZE_BUCKETS = (1, 2, 3, 5, 8)
@@ -323,10 +323,10 @@ class EmployeeSummary(UserPassesTestMixin, APIView):
             start_date, end_date = end_date, start_date
 
         # Fetch raw rows (same shape as you showed)
-        rows = get_detailed_report_data_by_employee(
-            profile.employee_id,
-            start_date.strftime('%Y-%m-%d'),
-            end_date.strftime('%Y-%m-%d')
+        rows = get_detailed_report_rows(
+            employee_id=profile.employee_id,
+            start_date=start_date.strftime('%Y-%m-%d'),
+            end_date=end_date.strftime('%Y-%m-%d')
         )
 
         task_descriptions = {}
@@ -5,7 +5,8 @@ from django.http import Http404, HttpResponse
 from django.shortcuts import get_object_or_404
 from rest_framework.views import APIView, Response
 from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
-from timesheet.utils.erp import get_burndown_chart_data, get_detailed_report_data
+from timesheet.utils.erp import get_burndown_chart_data
+from timesheet.utils.report_rows import get_detailed_report_rows
 from timesheet.models.project import Project
 from timesheet.models.summary import SavedSummary
 from timesheet.models.task import Task
@@ -81,10 +82,9 @@ class DownloadReportData(UserPassesTestMixin, APIView):
             Project,
             id=request.GET.get('id', None)
         )
-        detailed_report = get_detailed_report_data(project.name)
+        detailed_report = get_detailed_report_rows(project.name)
         if len(detailed_report) == 0:
             raise Http404()
-        detailed_report = detailed_report[:-1]
         response = HttpResponse(content_type='text/csv')
         response['Content-Disposition'] = 'attachment; filename="Detailed Report {}.csv"'.format(
             project.name
@@ -198,10 +198,9 @@ class ReportData(UserPassesTestMixin, APIView):
             Project,
             id=request.GET.get('id', None)
         )
-        detailed_report = get_detailed_report_data(project.name, user=self.request.user)
+        detailed_report = get_detailed_report_rows(project.name, user=self.request.user)
         if len(detailed_report) == 0:
             raise Http404()
-        detailed_report = detailed_report[:-1]
         analysis = {
             'task_based_analysis': self.task_based_analysis(detailed_report),
             'user_based_analysis': self.user_based_analysis(detailed_report)
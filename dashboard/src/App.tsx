@@ -298,7 +298,7 @@ function AppContent() {
         fade: 'fade-out'
     })
     const [compliment, setCompliment] = useState(randomCompliments[0])
-    const [submitTimesheet, { isLoading: isUpdating, isSuccess, isError }] = useSubmitTimesheetMutation();
+    const [submitTimesheet, { isLoading: isUpdating, isSuccess, isError, error: submitError }] = useSubmitTimesheetMutation();
     const [updateTimesheet] = useUpdateTimesheetMutation();
     const [deleteTimeLog, { isLoading: isDeleteLoading, isSuccess: isDeleteSuccess, isError: isDeleteError }] = useDeleteTimeLogMutation();
     const [deleteAllTimeLogs] = useDeleteAllTimeLogsMutation();
@@ -720,6 +720,14 @@ function AppContent() {
         return new Promise( res => setTimeout(res, delay) );
     }
 
+    const submitErrorMessage = (error: any) => {
+        if (error?.data?.error) return error.data.error
+        if (error?.data?.failed) {
+            return `${error.data.failed} time log(s) were not accepted by ERPNext. Please try submitting again.`
+        }
+        return 'Timesheet submission to ERPNext failed. Please try again.'
+    }
+
     const submitTimesheetClicked = async () => {
         submitTimesheet({})
     }
@@ -920,6 +928,9 @@ function AppContent() {
                         ⚠️ Today, timesheet submission to ERPNext will be unavailable.
                         Additionally, the app will be unavailable on the following dates: { unavailableDates }.
                     </div> : null}
+                    { isError && !isUpdating ? <div className={'unavailable-message'}>
+                        ⚠️ { submitErrorMessage(submitError) }
+                    </div> : null}
                     </Grid>
                     <Grid item xs={12} md={4} style={{ display: 'flex', justifyContent: 'end', alignContent: 'center'}}>
                         <Suspense fallback={<div></div>}>
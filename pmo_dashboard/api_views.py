@@ -12,7 +12,7 @@ from pmo_dashboard.access import can_access_pmo
 from pmo_dashboard.billable_sync import fetch_and_save_billable_hours
 from pmo_dashboard.serializers.project import ProjectSerializer
 from timesheet.models.project import Project
-from timesheet.utils.erp import ProjectsNotFound, pull_project_members_from_erp, pull_projects_only_from_erp, pull_tasks_from_erp
+from timesheet.utils.erp import ErpFetchError, ProjectsNotFound, pull_project_members_from_erp, pull_projects_only_from_erp, pull_tasks_from_erp
 
 logger = logging.getLogger(__name__)
 
@@ -81,9 +81,9 @@ class ProjectSyncView(APIView):
 
         active_projects = list(Project.objects.filter(is_active=True))
 
-        pull_tasks_from_erp(request.user, active_projects)
+        task_counts = pull_tasks_from_erp(request.user, active_projects)
         t2 = time.perf_counter()
-        logger.warning('ProjectSyncView pull_tasks_from_erp took %.2fs', t2 - t1)
+        logger.warning('ProjectSyncView pull_tasks_from_erp took %.2fs (%s)', t2 - t1, task_counts)
 
         pull_project_members_from_erp(request.user, project_names=[p.name for p in active_projects])
         t3 = time.perf_counter()
@@ -133,10 +133,15 @@ class ProjectDetailSyncView(APIView):
         except ProjectsNotFound:
             Project.objects.filter(pk=pk).update(is_active=False)
             return Response({'detail': 'Project no longer exists in ERPNext.'}, status=status.HTTP_404_NOT_FOUND)
+        except ErpFetchError:
+            return Response({'detail': 'Could not reach ERPNext.'}, status=status.HTTP_502_BAD_GATEWAY)
         t1 = time.perf_counter()
         logger.warning('ProjectDetailSyncView pull_projects_only_from_erp took %.2fs', t1 - t0)
 
-        pull_tasks_from_erp(request.user, [project], filters=f'[["project", "=", "{name}"]]')
+        try:
+            pull_tasks_from_erp(request.user, [project], filters=f'[["project", "=", "{name}"]]')
+        except ErpFetchError:
+            return Response({'detail': 'Could not reach ERPNext.'}, status=status.HTTP_502_BAD_GATEWAY)
         t2 = time.perf_counter()
         logger.warning('ProjectDetailSyncView pull_tasks_from_erp took %.2fs', t2 - t1)
 
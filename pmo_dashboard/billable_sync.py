@@ -1,20 +1,16 @@
-import json
 import logging
 
+from django.db.models import Sum
+
+from timesheet.models.report_row import TimesheetReportRow
 from timesheet.models.task import Task
 from timesheet.utils.erp import get_detailed_report_data
 
 logger = logging.getLogger(__name__)
 
 
-def fetch_and_save_billable_hours(project_name: str) -> list[dict]:
-    """
-    Fetch Timesheet Detailed Report from ERPNext for a project, aggregate
-    billable and consumed hours per task, persist to Task.billable_hours,
-    and return per-task summary rows.
-    """
-    rows = get_detailed_report_data(project_name)
-
+def aggregate_billable_hours(rows: list) -> dict[str, dict]:
+    """Sum consumed and billable hours per ERPNext task ID over Timesheet Detailed Report rows."""
     by_task: dict[str, dict] = {}
     for row in rows:
         if not isinstance(row, dict):
@@ -24,28 +20,77 @@ def fetch_and_save_billable_hours(project_name: str) -> list[dict]:
             by_task[erp_id] = {'consumed': 0.0, 'billable': 0.0}
         by_task[erp_id]['consumed'] += float(row.get('Hours') or 0)
         by_task[erp_id]['billable'] += float(row.get('Billable Hours') or 0)
+    return by_task
+
+
+def _bulk_save_billable_hours(tasks, by_task: dict[str, dict]) -> int:
+    """Write aggregated billable hours onto tasks with one bulk_update. Returns rows changed."""
+    changed = []
+    for task in tasks:
+        totals = by_task.get(task.erp_id)
+        if totals is not None and task.billable_hours != totals['billable']:
+            task.billable_hours = totals['billable']
+            changed.append(task)
+    Task.objects.bulk_update(changed, ['billable_hours'], batch_size=500)
+    return len(changed)
+
+
+def fetch_and_save_billable_hours(project_name: str) -> list[dict]:
+    """
+    Fetch Timesheet Detailed Report from ERPNext for a project, aggregate
+    billable and consumed hours per task, persist to Task.billable_hours,
+    and return per-task summary rows.
+    """
+    return save_billable_hours(get_detailed_report_data(project_name))
+
+
+def save_billable_hours(rows: list) -> list[dict]:
+    """
+    Aggregate already-fetched Timesheet Detailed Report rows per task,
+    persist to Task.billable_hours, and return per-task summary rows.
+    """
+    by_task = aggregate_billable_hours(rows)
 
     task_lookup = {
         t.erp_id: t
         for t in Task.objects.filter(erp_id__in=by_task.keys())
     }
+    _bulk_save_billable_hours(task_lookup.values(), by_task)
 
     results = []
     for erp_id, totals in by_task.items():
         task = task_lookup.get(erp_id)
-        billable = totals['billable']
-
-        if task:
-            Task.objects.filter(pk=task.pk).update(billable_hours=billable)
-            logger.debug('Updated billable_hours=%.2f for task %s', billable, erp_id)
-
         results.append({
             'erp_id': erp_id,
             'name': task.name if task else erp_id,
             'budget': task.expected_time if task else 0.0,
             'consumed': totals['consumed'],
-            'billable': billable,
+            'billable': totals['billable'],
             'left': (task.expected_time if task else 0.0) - totals['consumed'],
         })
 
     return sorted(results, key=lambda r: r['budget'], reverse=True)
+
+
+def cached_billable_hours(projects) -> dict[str, dict]:
+    """Sum consumed and billable hours per ERPNext task ID of the given projects from the cached report rows."""
+    erp_ids = Task.objects.filter(project__in=projects).exclude(erp_id='').values('erp_id')
+    totals = (
+        TimesheetReportRow.objects
+        .filter(task__in=erp_ids)
+        .order_by()
+        .values('task')
+        .annotate(consumed=Sum('hours'), billable=Sum('billable_hours'))
+    )
+    return {row['task']: {'consumed': row['consumed'], 'billable': row['billable']} for row in totals}
+
+
+def sync_company_billable_hours(projects) -> int:
+    """
+    Refresh Task.billable_hours for every task of the given projects in one
+    bulk write, summed from the local TimesheetReportRow cache kept current
+    by the report row sync, so no report is run on ERPNext. Returns tasks changed.
+    """
+    by_task = cached_billable_hours(projects)
+    tasks = Task.objects.filter(project__in=projects).exclude(erp_id='')
+    return _bulk_save_billable_hours(tasks.only('id', 'erp_id', 'billable_hours'), by_task)
@@ -1,5 +1,5 @@
 from copy import deepcopy
-from datetime import timedelta
+from datetime import date, timedelta
 from unittest.mock import patch
 
 from django.contrib.auth import get_user_model
@@ -9,11 +9,13 @@ from preferences import preferences
 from rest_framework.reverse import reverse
 from rest_framework.test import APIClient
 
+from pmo_dashboard.billable_sync import cached_billable_hours, sync_company_billable_hours
 from pmo_dashboard.models import BusinessUnit
 from timesheet.models.preferences import get_default_pmo_status_config
 from timesheet.models import Project, Task
 from timesheet.models.profile import ProfileRole
 from timesheet.models.project_member import ProjectMember
+from timesheet.models.report_row import TimesheetReportRow
 
 User = get_user_model()
 
@@ -589,3 +591,52 @@ class TestProjectDetailSyncView(PMOTestBase):
         self.assertEqual(response.status_code, 404)
         self.project.refresh_from_db()
         self.assertFalse(self.project.is_active)
+
+
+class TestCompanyBillableSync(TestCase):
+
+    def setUp(self):
+        self.alpha = Project.objects.create(name='Alpha', is_active=True, expected_start_date=date(2024, 1, 15))
+        self.beta = Project.objects.create(name='Beta', is_active=True, expected_start_date=date(2023, 6, 1))
+        self.t1 = Task.objects.create(name='T1', erp_id='TASK-1', project=self.alpha)
+        self.t2 = Task.objects.create(name='T2', erp_id='TASK-2', project=self.beta, billable_hours=3.0)
+        self.t3 = Task.objects.create(name='T3', erp_id='TASK-3', project=self.beta)
+
+    def _row(self, row_date, task, hours, billable_hours):
+        return TimesheetReportRow.objects.create(
+            date=row_date, task=task, hours=hours, billable_hours=billable_hours, data={}
+        )
+
+    def test_sums_cached_rows_per_task(self):
+        self._row(date(2024, 2, 1), 'TASK-1', 2, 1.5)
+        self._row(date(2024, 2, 2), 'TASK-1', 1, 1)
+        self._row(date(2024, 2, 1), 'TASK-2', 3, 3)
+        self._row(date(2024, 2, 1), 'OTHER', 4, 4)
+        self.assertEqual(cached_billable_hours([self.alpha, self.beta]), {
+            'TASK-1': {'consumed': 3.0, 'billable': 2.5},
+            'TASK-2': {'consumed': 3.0, 'billable': 3.0},
+        })
+
+    def test_sync_counts_hours_logged_before_expected_start(self):
+        self._row(date(2023, 12, 1), 'TASK-1', 4, 4)
+        self._row(date(2024, 2, 1), 'TASK-1', 1, 1)
+        sync_company_billable_hours([self.alpha])
+        self.t1.refresh_from_db()
+        self.assertEqual(self.t1.billable_hours, 5.0)
+
+    def test_bulk_saves_all_projects_without_erpnext(self):
+        self._row(date(2024, 2, 1), 'TASK-1', 2, 1.5)
+        self._row(date(2024, 2, 2), 'TASK-1', 1, 1)
+        self._row(date(2024, 2, 1), 'TASK-2', 3, 3)
+        self._row(date(2024, 2, 1), '', 4, 4)
+        with patch('timesheet.utils.report_rows.get_detailed_report_data') as mock_report, \
+                self.assertNumQueries(3):
+            updated = sync_company_billable_hours([self.alpha, self.beta])
+        mock_report.assert_not_called()
+        self.assertEqual(updated, 1)
+        self.t1.refresh_from_db()
+        self.t2.refresh_from_db()
+        self.t3.refresh_from_db()
+        self.assertEqual(self.t1.billable_hours, 2.5)
+        self.assertEqual(self.t2.billable_hours, 3.0)
+        self.assertEqual(self.t3.billable_hours, 0.0)
@@ -0,0 +1,152 @@
+from datetime import date, timedelta
+
+from django.contrib.auth import get_user_model
+from rest_framework import status
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from schedule.api_views.schedule import date_param
+from schedule.capacity import capacity_matrix
+from schedule.intervals import Interval, user_availability
+
+MAX_AVAILABILITY_DAYS = 366
+
+
+class TeamAvailability(APIView):
+    """
+    Busy and free days of a team, for the planner.
+
+    Query parameters (all optional):
+    - users: comma separated user ids, default every active user with an
+      active project slot
+    - from, to (YYYY-MM-DD): window, default Monday to Friday of this week
+    - weekends=1: count Saturdays and Sundays as free days
+    """
+
+    def get(self, request, format=None):
+        users = request.GET.get('users', '')
+        try:
+            user_ids = [int(user) for user in users.split(',') if user]
+        except ValueError:
+            return Response(
+                {'error': f'Invalid users "{users}"'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        try:
+            start_date = date_param(request, 'from')
+            end_date = date_param(request, 'to')
+        except ValueError as e:
+            return Response(
+                {'error': str(e)},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        today = date.today()
+        start_date = start_date or today - timedelta(days=today.weekday())
+        end_date = end_date or start_date + timedelta(days=4)
+        window = Interval(start_date, end_date)
+        if not 0 < window.days <= MAX_AVAILABILITY_DAYS:
+            return Response(
+                {'error': f'The window must be 1 to {MAX_AVAILABILITY_DAYS} days'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        users = get_user_model().objects.filter(is_active=True)
+        if user_ids:
+            users = users.filter(id__in=user_ids)
+        else:
+            users = users.filter(userprojectslot__active=True).distinct()
+        users = users.order_by('first_name', 'username')
+
+        availability = user_availability(
+            [user.id for user in users],
+            window,
+            workdays_only=request.GET.get('weekends') != '1'
+        )
+        return Response({
+            'from': window.start,
+            'to': window.end,
+            'users': [
+                {
+                    'user_id': user.id,
+                    'user_name': (
+                        user.first_name if user.first_name else user.username
+                    ),
+                    'busy': [
+                        interval.as_dict() for interval in availability[user.id]['busy']
+                    ],
+                    'free': [
+                        interval.as_dict() for interval in availability[user.id]['free']
+                    ]
+                }
+                for user in users
+            ]
+        })
+
+
+class CapacityMatrix(APIView):
+    """
+    Users x days matrix of allocated hours, leave, public holidays and free
+    hours, for the planner and the PMO dashboard.
+
+    Query parameters (all optional):
+    - from, to (YYYY-MM-DD): window, default the next four weeks from
+      Monday of this week
+    - department: only users of this department (id)
+    - business_unit: only users slotted on projects of this business unit (id)
+    - users: comma separated user ids
+    """
+
+    def get(self, request, format=None):
+        try:
+            start_date = date_param(request, 'from')
+            end_date = date_param(request, 'to')
+            user_ids = [
+                int(user) for user in request.GET.get('users', '').split(',') if user
+            ]
+            department = int(request.GET.get('department') or 0)
+            business_unit = int(request.GET.get('business_unit') or 0)
+        except ValueError as e:
+            return Response(
+                {'error': str(e)},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        today = date.today()
+        start_date = start_date or today - timedelta(days=today.weekday())
+        end_date = end_date or start_date + timedelta(days=27)
+        window = Interval(start_date, end_date)
+        if not 0 < window.days <= MAX_AVAILABILITY_DAYS:
+            return Response(
+                {'error': f'The window must be 1 to {MAX_AVAILABILITY_DAYS} days'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        users = get_user_model().objects.filter(is_active=True)
+        if user_ids:
+            users = users.filter(id__in=user_ids)
+        if department:
+            users = users.filter(profile__department_id=department)
+        if business_unit:
+            users = users.filter(
+                userprojectslot__active=True,
+                userprojectslot__project__business_unit_id=business_unit
+            )
+        if not (user_ids or department or business_unit):
+            users = users.filter(userprojectslot__active=True)
+        users = list(users.distinct().order_by('first_name', 'username'))
+
+        matrix = capacity_matrix(
+            [user.id for user in users], window.start, window.end
+        )
+        return Response({
+            'days': matrix['days'],
+            'users': [
+                {
+                    'user_id': user.id,
+                    'user_name': (
+                        user.first_name if user.first_name else user.username
+                    ),
+                    **matrix['users'][user.id]
+                }
+                for user in users
+            ]
+        })
@@ -1,20 +1,28 @@
 import csv
+import heapq
 import time
 
-import pytz
+from django.conf import settings
+from django.core.cache import cache
 from django.db.models import Q
-from django.http import Http404, HttpResponse
-from django.utils.decorators import method_decorator
-from django.views.decorators.cache import cache_page, never_cache
-from rest_framework import serializers
+from django.http import Http404, StreamingHttpResponse
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from rest_framework import serializers, status
 from rest_framework.permissions import IsAdminUser, IsAuthenticated
 from rest_framework.response import Response
+from rest_framework.settings import api_settings
 from rest_framework.views import APIView
 from datetime import datetime, timedelta, date
 from dateutil.relativedelta import relativedelta
 
-from schedule.models import Schedule, UserProjectSlot
-from timesheet.models import Task
+from schedule.cache import SCHEDULE_LIST_TIMEOUT, schedule_list_key
+from schedule.columnar import COLUMNAR_RENDERERS, columnar_rows, is_columnar
+from schedule.conditional import REVALIDATE, ListVersion
+from schedule.countdown import TaskCountdown, _naive
+from schedule.intervals import Interval, free_intervals, merge_intervals
+from schedule.models import Schedule, ScheduleTombstone, UserProjectSlot
+from timesheet.models import Project, Task
 
 START_TIME = 'start_time'
 END_TIME = 'end_time'
@@ -23,247 +31,6 @@ SCHEDULES = 'schedules'
 ID = 'id'
 
 
-def _naive(date_obj):
-    return date_obj.astimezone(pytz.UTC).replace(tzinfo=None).replace(
-        hour=0, minute=0, second=0, microsecond=0
-    )
-
-
-def update_countdown(task: Task, hours=7):
-    current_year = date.today().year
-    start_date = date(current_year, 1, 1)
-    end_date = date(current_year, 12, 31)
-
-    all_schedules = Schedule.objects.filter(
-        task=task,
-        start_time__range=(start_date, end_date)
-    )
-    remaining_days = int(
-        (task.expected_time - task.actual_time) / hours
-    )
-    task_last_update = task.last_update
-    schedule_before_last_update = all_schedules.filter(
-        end_time__lt=task_last_update
-    ).order_by('-start_time')
-    schedule_after_last_update = all_schedules.filter(
-        end_time__gte=task_last_update
-    ).order_by('start_time')
-    for schedule in schedule_after_last_update:
-        start_time = _naive(schedule.start_time)
-        end_time = _naive(schedule.end_time)
-        schedule.first_day_number = remaining_days
-        remaining_days -= ((
-                                   end_time - start_time
-                           ).days - 1)
-        remaining_days -= 1
-        schedule.last_day_number = remaining_days
-        schedule.save()
-        remaining_days -= 1
-
-    remaining_days = int(
-        (task.expected_time - task.actual_time) / hours
-    )
-    if schedule_after_last_update.exists():
-        remaining_days += 1
-
-    for schedule in schedule_before_last_update:
-        start_time = _naive(schedule.start_time)
-        end_time = _naive(schedule.end_time)
-        schedule.first_day_number = remaining_days
-        remaining_days += ((
-                                   end_time - start_time
-                           ).days - 1)
-        remaining_days += 1
-        schedule.last_day_number = remaining_days
-        schedule.save()
-        remaining_days += 1
-
-    return all_schedules
-
-
-def calculate_remaining_task_days(
-        task: Task, start_time: datetime, end_time: datetime = None,
-        excluded_schedule: Schedule = None):
-    """
-    Calculates the remaining days for a task, considering the task's
-    expected time, actual time, and any previous schedules that
-    overlap with the task. The remaining task days are
-    calculated based on a default of 7 hours of work per day
-    :param task: Task object
-    :param start_time: The start time of the current schedule being considered
-    :param end_time: The end time of the current schedule being considered
-    :param excluded_schedule: A schedule excluded from the query
-    :return: The remaining task day
-    """
-
-    # remaining task time = expected_time - actual_time = 100
-    remaining_task_time = task.expected_time - task.actual_time
-    # last task update
-    last_task_update = task.last_update
-    # hours per day ( default to 7 )
-    hours_per_day = 7
-    # remaining task day = int(100 / 7) = 14
-    remaining_task_day = int(remaining_task_time / hours_per_day)
-
-    start_time = _naive(start_time)
-    if end_time:
-        end_time = _naive(end_time)
-    last_task_update = _naive(last_task_update)
-
-    if start_time < last_task_update:
-        # Calculate previous schedules before last_task_update and
-        # after the new schedule start_time
-        previous_schedules_before_update = Schedule.objects.filter(
-            task=task,
-            start_time__lt=last_task_update,
-            start_time__gte=start_time
-        ).order_by('-start_time')
-
-        if excluded_schedule:
-            previous_schedules_before_update = (
-                previous_schedules_before_update.exclude(
-                    id=excluded_schedule.id
-                )
-            )
-        for prev_schedule in previous_schedules_before_update:
-            prev_start_time = _naive(prev_schedule.start_time)
-            prev_end_time = _naive(prev_schedule.end_time)
-            if (
-                    prev_end_time <
-                    last_task_update
-            ):
-                remaining_task_day += (
-                                              prev_end_time - prev_start_time
-                                      ).days + 1
-            else:
-                remaining_task_day += (
-                        last_task_update - prev_start_time
-                ).days
-        if end_time > last_task_update:
-            end_time = last_task_update
-        return (
-                remaining_task_day +
-                (end_time - start_time).days +
-                (1 if end_time < last_task_update else 0)
-        )
-    else:
-        # Calculate remaining days
-        # e.g. 2 previous schedules
-        previous_schedules = Schedule.objects.filter(
-            task=task,
-            start_time__lt=start_time,
-            end_time__gte=last_task_update
-        ).order_by('start_time')
-        if excluded_schedule:
-            previous_schedules = previous_schedules.exclude(
-                id=excluded_schedule.id
-            )
-
-        for previous_schedule in previous_schedules:
-            prev_end_time = _naive(previous_schedule.end_time)
-            prev_start_time = _naive(previous_schedule.start_time)
-            if prev_start_time > last_task_update:
-                remaining_task_day -= (
-                                              prev_end_time - prev_start_time
-                                      ).days + 1
-            elif prev_start_time <= last_task_update:
-                remaining_task_day -= (
-                                              prev_end_time - last_task_update
-                                      ).days + 1
-        return remaining_task_day
-
-
-def update_previous_schedules(
-        start_time, task_id, remaining_days,
-        excluded_schedules=None):
-    # Initialize the list to store updated schedules' IDs
-    updated_schedules = []
-
-    # Query the previous schedules based on the given start
-    # _time and task_id, ordered by start_time in descending order
-    prev_schedules = Schedule.objects.filter(
-        start_time__lte=start_time,
-        task_id=task_id
-    ).order_by('-start_time')
-
-    # If an excluded_schedule is provided, exclude it from the query
-    if excluded_schedules:
-        prev_schedules = prev_schedules.exclude(id__in=excluded_schedules)
-
-    # Calculate the first_day value for the first previous schedule in the loop
-    first_day = remaining_days
-
-    # If there are previous schedules, update their first_
-    # day_number and last_day_number
-    if prev_schedules.exists():
-        for prev_schedule in prev_schedules:
-            first_day += 1
-            # Update the last_day_number of the current previous schedule
-            prev_schedule.last_day_number = first_day
-
-            # Calculate the duration of the current previous schedule
-            duration = (
-                    prev_schedule.end_time -
-                    prev_schedule.start_time
-            ).days
-
-            # Update the first_day value for the next
-            # previous schedule in the loop
-            first_day = first_day + duration
-
-            # Update the first_day_number of the current previous schedule
-            prev_schedule.first_day_number = first_day
-
-            # Save the updated previous schedule to the database
-            prev_schedule.save()
-
-            # Append the updated previous schedule's ID
-            # to the updated_schedules list
-            updated_schedules.append(prev_schedule.id)
-
-    return updated_schedules
-
-
-def update_subsequent_schedules(start_time,
-                                task_id,
-                                last_day_number,
-                                excluded_schedule=None):
-    """
-    This function checks for subsequent schedules and updates their first day
-    and last day numbers accordingly
-    :param start_time: The start time of the schedule
-    :param task_id: id of the task
-    :param last_day_number: The last day number of the previous task
-    :param excluded_schedule: Schedule to be excluded for the query
-    :return:
-    """
-    updated_schedules = []
-    sub_schedules = Schedule.objects.filter(
-        start_time__gte=start_time,
-        task_id=task_id
-    ).order_by('start_time').distinct()
-
-    if excluded_schedule:
-        sub_schedules = sub_schedules.exclude(
-            id=excluded_schedule.id
-        )
-
-    if sub_schedules.exists():
-        # Update the numbers
-        for sub_schedule in sub_schedules:
-            sub_schedule.first_day_number = last_day_number - 1
-            last_day_number = (
-                    (last_day_number - 1) - (
-                    sub_schedule.end_time - sub_schedule.start_time
-            ).days
-            )
-            sub_schedule.last_day_number = last_day_number
-            sub_schedule.save()
-            updated_schedules.append(sub_schedule.id)
-
-    return updated_schedules
-
-
 class ScheduleSerializer(serializers.ModelSerializer):
     group = serializers.SerializerMethodField()
     title = serializers.SerializerMethodField()
@@ -352,44 +119,217 @@ class ScheduleSerializer(serializers.ModelSerializer):
         ]
 
 
+def date_param(request, name):
+    """A YYYY-MM-DD query parameter as a date, None if absent."""
+    value = request.GET.get(name)
+    if not value:
+        return None
+    try:
+        parsed = parse_date(value)
+    except ValueError:
+        parsed = None
+    if parsed is None:
+        raise ValueError(f'Invalid {name} date "{value}"')
+    return parsed
+
+
+def schedule_list_window():
+    current_date = date.today()
+    return (
+        current_date - relativedelta(months=6),
+        current_date + relativedelta(months=6)
+    )
+
+
+def schedule_list_queryset(start_date=None, end_date=None, timeline_id=None,
+                           user_id=None, project_id=None):
+    """
+    Schedules of active users, optionally limited to a start date window,
+    a public timeline, a user or a project. Everything ScheduleSerializer
+    reads is fetched in the same query.
+    """
+    schedules = Schedule.objects.filter(
+        (
+            Q(user_project__isnull=False) & Q(user_project__user__is_active=True)
+        ) | (
+            Q(user_project__isnull=True)
+        ),
+        (
+            Q(user__isnull=False) & Q(user__is_active=True)
+        ) | (
+            Q(user__isnull=True)
+        ),
+    ).select_related(
+        'user', 'user_project__user', 'user_project__project', 'task', 'activity'
+    )
+    if start_date and end_date:
+        schedules = schedules.filter(start_time__range=(start_date, end_date))
+    if timeline_id:
+        schedules = schedules.filter(
+            user_project__project__publictimeline__id=timeline_id
+        ).distinct()
+    if user_id:
+        schedules = schedules.filter(
+            Q(user_id=user_id) | Q(user_project__user_id=user_id)
+        )
+    if project_id:
+        schedules = schedules.filter(user_project__project_id=project_id)
+    return schedules
+
+
+def deleted_schedule_ids(since, until, timeline_id=None, user_id=None,
+                         project_id=None) -> list:
+    """
+    Ids of schedules deleted within (since, until], filtered like
+    schedule_list_queryset. Tombstones recorded before their owner was
+    kept match every filter.
+    """
+    tombstones = ScheduleTombstone.objects.filter(
+        deleted_at__gt=since, deleted_at__lte=until
+    )
+    owned = Q()
+    if timeline_id:
+        owned &= Q(project_id__in=Project.objects.filter(
+            publictimeline__id=timeline_id
+        ).values('id'))
+    if user_id:
+        owned &= Q(user_id=user_id)
+    if project_id:
+        owned &= Q(project_id=project_id)
+    if owned:
+        tombstones = tombstones.filter(
+            owned | Q(user_id__isnull=True, project_id__isnull=True)
+        )
+    return list(tombstones.values_list('schedule_id', flat=True))
+
+
+def cached_schedule_list(timeline_id=None) -> list:
+    """
+    Serialized schedules within six months of today, for one public timeline
+    or for everyone, served from the versioned schedule list cache.
+    """
+    start_date, end_date = schedule_list_window()
+    cache_key = schedule_list_key(timeline_id, start_date, end_date)
+    data = cache.get(cache_key)
+    if data is not None:
+        return data
+
+    data = ScheduleSerializer(
+        schedule_list_queryset(start_date, end_date, timeline_id), many=True
+    ).data
+    cache.set(cache_key, data, SCHEDULE_LIST_TIMEOUT)
+    return data
+
+
 class ScheduleList(APIView):
+    """
+    Schedules for the planner.
+
+    Query parameters (all optional):
+    - timelineId: only schedules of a public timeline's projects
+    - from, to (YYYY-MM-DD): start date window, default six months either
+      side of today
+    - user, project: only schedules of that user or project
+    - since (ISO datetime): only schedules changed after it, ignoring the
+      window. The response is then {schedules, deleted, cursor, reset},
+      where deleted lists ids removed since then and cursor is the since
+      value for the next poll. The cursor trails now by
+      SCHEDULE_DELTA_CURSOR_LAG_SECONDS so saves still committing are
+      picked up by the next poll. reset is true when since is older than
+      SCHEDULE_DELTA_WINDOW_DAYS, whose deletions may have been pruned; the
+      client should then reload the full list.
+
+    - format=columnar: schedules as parallel arrays with user, project and
+      task lookup tables (see columnar_rows), as msgpack when the request
+      accepts application/msgpack
+
+    Full lists carry an ETag and Last-Modified; a poll whose validators
+    still match gets a 304 without anything being serialized.
+    """
     permission_classes = []
+    renderer_classes = api_settings.DEFAULT_RENDERER_CLASSES + COLUMNAR_RENDERERS
 
-    @method_decorator(cache_page(60 * 60 * 24), name='dispatch')
     def get(self, request, format=None):
         timeline_id = self.request.GET.get('timelineId', None)
         if not timeline_id:
             if request.user.is_anonymous:
                 return Response([])
 
-        current_date = date.today()
-
-        start_date = current_date - relativedelta(months=6)
-        end_date = current_date + relativedelta(months=6)
-
-        schedules = Schedule.objects.filter(
-            (
-                Q(user_project__isnull=False) & Q(user_project__user__is_active=True)
-            ) | (
-                Q(user_project__isnull=True)
-            ),
-            (
-                Q(user__isnull=False) & Q(user__is_active=True)
-            ) | (
-                Q(user__isnull=True)
-            ),
-            start_time__range=(start_date, end_date),
-        )
-        if timeline_id:
-            schedules = schedules.filter(
-                user_project__project__publictimeline__id=timeline_id
-            ).distinct()
+        user_id = request.GET.get('user')
+        project_id = request.GET.get('project')
+        since = request.GET.get('since')
+        columnar = is_columnar(request)
+        try:
+            start_date = date_param(request, 'from')
+            end_date = date_param(request, 'to')
+            if since:
+                since = parse_datetime(since)
+                if since is None:
+                    raise ValueError('Invalid since timestamp')
+                if timezone.is_naive(since):
+                    since = timezone.make_aware(since)
+        except ValueError as e:
+            return Response(
+                {'error': str(e)},
+                status=status.HTTP_400_BAD_REQUEST
+            )
 
-        response = Response(ScheduleSerializer(
-            schedules, many=True
-        ).data)
+        if since:
+            # updated_at is stamped before commit; trail now so a save still
+            # in flight lands after the cursor rather than before it.
+            cursor = timezone.now() - timedelta(
+                seconds=settings.SCHEDULE_DELTA_CURSOR_LAG_SECONDS
+            )
+            schedules = schedule_list_queryset(
+                timeline_id=timeline_id, user_id=user_id, project_id=project_id
+            ).filter(updated_at__gt=since, updated_at__lte=cursor)
+            deleted = deleted_schedule_ids(
+                since, cursor,
+                timeline_id=timeline_id, user_id=user_id, project_id=project_id
+            )
+            schedules = ScheduleSerializer(schedules, many=True).data
+            data = {
+                'schedules': columnar_rows(schedules) if columnar else schedules,
+                'deleted': deleted,
+                'cursor': cursor.isoformat(),
+                'reset': since < ScheduleTombstone.horizon()
+            }
+        else:
+            default_start, default_end = schedule_list_window()
+            filtered = start_date or end_date or user_id or project_id
+            start_date = start_date or default_start
+            end_date = end_date or default_end
+            schedules = schedule_list_queryset(
+                start_date,
+                end_date,
+                timeline_id=timeline_id,
+                user_id=user_id,
+                project_id=project_id
+            )
+            version = ListVersion(
+                schedule_list_key(timeline_id, default_start, default_end),
+                start_date, end_date, user_id, project_id,
+                request.accepted_media_type, columnar
+            ).add(schedules).add_modified(
+                ScheduleTombstone.objects.order_by(
+                    '-deleted_at'
+                ).values_list('deleted_at', flat=True).first()
+            )
+            not_modified = version.not_modified(request)
+            if not_modified is not None:
+                return not_modified
+            if filtered:
+                data = ScheduleSerializer(schedules, many=True).data
+            else:
+                data = cached_schedule_list(timeline_id)
+            if columnar:
+                data = columnar_rows(data)
 
-        response['Cache-Control'] = 'no-store, no-cache, must-revalidate, max-age=0'
+        response = Response(data)
+        if since:
+            response['Cache-Control'] = REVALIDATE
+        else:
+            version.apply(response)
         response['Pragma'] = 'no-cache'
         response['Expires'] = '0'
 
@@ -397,12 +337,13 @@ class ScheduleList(APIView):
 
 
 class WeeklyScheduleList(APIView):
+    """
+    The user's slot schedules starting this week (Monday to Friday), in
+    start order, with the free days between them as entries whose id is
+    None.
+    """
     permission_classes = [IsAuthenticated, ]
-
-    def duration(self, start_time: str, end_time: str) -> int:
-        start_date = datetime.strptime(start_time, "%Y-%m-%d").date()
-        end_date = datetime.strptime(end_time, "%Y-%m-%d").date()
-        return (end_date - start_date).days + 1
+    renderer_classes = api_settings.DEFAULT_RENDERER_CLASSES + COLUMNAR_RENDERERS
 
     def get(self, request, format=None):
         today = datetime.today()
@@ -413,67 +354,43 @@ class WeeklyScheduleList(APIView):
             user_project__user=request.user,
             start_time__gte=_naive(dates[0]),
             start_time__lte=_naive(dates[4])
-        ).order_by('start_time', 'end_time').distinct()
+        ).order_by('start_time', 'end_time').select_related(
+            'user', 'user_project__user', 'user_project__project',
+            'task', 'activity'
+        )
 
         schedules_data = ScheduleSerializer(
             schedules, many=True
         ).data
 
-        dates = [str(_naive(date)).split(' ')[0] for date in dates]
-
-        # Extracting the dates from the schedules
-        last_schedule = None
-        index = 0
-        processed_schedules = []
-        for schedule in schedules_data:
-            start_time = schedule[START_TIME].split('T')[0]
-            end_time = schedule[END_TIME].split('T')[0]
-            if not last_schedule:
-                if start_time != dates[0]:
-                    processed_schedules.insert(index, {
-                        ID: None,
-                        START_TIME: datetime.strptime(dates[0], '%Y-%m-%d').date(),
-                        END_TIME: datetime.strptime(start_time, '%Y-%m-%d').date() - timedelta(days=1),
-                        DURATION: self.duration(dates[0], str(
-                            datetime.strptime(start_time, '%Y-%m-%d').date() - timedelta(days=1)))
-                    })
-                    index += 1
-            else:
-                if datetime.strptime(start_time, '%Y-%m-%d').date() != last_schedule[END_TIME] + timedelta(days=1):
-                    new_start_time = (
-                         last_schedule['end_time'] + timedelta(days=1)
-                    )
-                    new_end_time = datetime.strptime(start_time, '%Y-%m-%d').date() - timedelta(days=1)
-                    if new_start_time > datetime.strptime(dates[-1], '%Y-%m-%d').date():
-                        new_start_time = datetime.strptime(dates[0], '%Y-%m-%d').date()
-                    elif new_end_time < new_start_time:
-                        processed_schedules.insert(index, {
-                            'id': None,
-                            'start_time': new_start_time,
-                            'end_time': datetime.strptime(dates[-1], '%Y-%m-%d').date(),
-                            'duration': self.duration(str(new_start_time), dates[-1])
-                        })
-                        index += 1
-                        new_start_time = datetime.strptime(dates[0], '%Y-%m-%d').date()
-
-                    processed_schedules.insert(index, {
-                        'id': None,
-                        'start_time': new_start_time,
-                        'end_time': new_end_time,
-                        'duration': self.duration(str(new_start_time), str(new_end_time))
-                    })
-                    index += 1
-            processed_schedules.append(schedule)
-            last_schedule = schedule
-            index += 1
-
-            schedule[START_TIME] = datetime.strptime(start_time, '%Y-%m-%d').date()
-            schedule[END_TIME] = datetime.strptime(end_time, '%Y-%m-%d').date()
-            schedule[DURATION] = self.duration(start_time, end_time)
+        busy = []
+        for schedule, schedule_data in zip(schedules, schedules_data):
+            interval = Interval.of(schedule.start_time, schedule.end_time)
+            schedule_data[START_TIME] = interval.start
+            schedule_data[END_TIME] = interval.end
+            schedule_data[DURATION] = interval.days
+            busy.append(interval)
+
+        window = Interval(_naive(dates[0]).date(), _naive(dates[4]).date())
+        free_days = [
+            {
+                ID: None,
+                START_TIME: interval.start,
+                END_TIME: interval.end,
+                DURATION: interval.days
+            }
+            for interval in free_intervals(merge_intervals(busy, presorted=True), window)
+        ]
+        processed_schedules = list(heapq.merge(
+            free_days, schedules_data, key=lambda schedule: schedule[START_TIME]
+        ))
 
         return Response({
-            'dates': dates,
-            'schedules': processed_schedules
+            'dates': [str(day) for day in (window.start + timedelta(days=i) for i in range(5))],
+            'schedules': (
+                columnar_rows(processed_schedules) if is_columnar(request)
+                else processed_schedules
+            )
         })
 
 
@@ -499,34 +416,27 @@ class DeleteSchedule(APIView):
         end_time = _naive(schedule.end_time)
         schedule.delete()
 
+        countdown = TaskCountdown(task)
         if start_time < last_task_update:
-            prev_schedule = Schedule.objects.filter(
-                task=task,
-                start_time__lt=last_task_update,
-                start_time__gte=start_time
-            )
-            if not prev_schedule.exists():
+            if not countdown.has_schedules_between(start_time, last_task_update):
                 start_time = last_task_update
 
-        remaining_task_days = calculate_remaining_task_days(
-            task,
+        remaining_task_days = countdown.remaining_days(
             start_time,
             end_time
         )
-        updated = update_subsequent_schedules(
+        updated = countdown.update_subsequent(
             start_time=schedule.start_time,
-            task_id=task.id,
             last_day_number=remaining_task_days + 1
         )
 
         if start_time <= last_task_update:
-            updated_previous = update_previous_schedules(
+            updated += countdown.update_previous(
                 start_time,
-                task.id,
                 remaining_task_days,
-                excluded_schedules=updated
+                excluded_ids=updated
             )
-            updated += updated_previous
+        countdown.save()
 
         schedules = Schedule.objects.filter(
             id__in=updated
@@ -582,55 +492,24 @@ class UpdateSchedule(APIView):
 
         # Only update task-related fields if task exists after update (not note-only)
         if schedule.task:
-            last_task_update = _naive(schedule.task.last_update)
-
-            latest_schedule = Schedule.objects.filter(
-                task_id=schedule.task_id
-            ).order_by('-start_time').first()
-
-            remaining_task_days = calculate_remaining_task_days(
-                schedule.task,
-                schedule.start_time,
-                schedule.end_time
-            )
-
-            last_day_number = (
-                    remaining_task_days - (end_time - start_time).days
-            )
-
-            schedule.first_day_number = remaining_task_days
-            schedule.last_day_number = last_day_number
-            schedule.save()
-
-            updated = update_subsequent_schedules(
-                start_time=start_time,
-                task_id=schedule.task.id,
-                last_day_number=last_day_number,
-                excluded_schedule=schedule
+            countdown = TaskCountdown(schedule.task)
+            schedule = next(
+                item for item in countdown.schedules if item.id == schedule.id
             )
-
-            if start_time < last_task_update:
-                excluded_schedules = updated
-                excluded_schedules.append(schedule.id)
-                updated_previous = update_previous_schedules(
-                    start_time,
-                    schedule.task.id,
-                    remaining_task_days,
-                    excluded_schedules=excluded_schedules
-                )
-                updated += updated_previous
+            updated = countdown.recount(schedule)
+            countdown.save()
         else:
             # For note-only entries, just return the updated schedule
             updated = []
 
             # If we removed a task, update subsequent schedules of the old task
             if old_task:
-                updated = update_subsequent_schedules(
+                countdown = TaskCountdown(old_task)
+                updated = countdown.update_subsequent(
                     start_time=start_time,
-                    task_id=old_task.id,
-                    last_day_number=0,
-                    excluded_schedule=schedule
+                    last_day_number=0
                 )
+                countdown.save()
 
         return Response(
             ScheduleSerializer(Schedule.objects.filter(
@@ -701,9 +580,9 @@ class AddSchedule(APIView):
             project=task.project
         )
 
-        last_update = _naive(task.last_update)
-        remaining_task_days = calculate_remaining_task_days(
-            task, start_time, end_time
+        countdown = TaskCountdown(task)
+        remaining_task_days = countdown.remaining_days(
+            start_time, end_time
         )
 
         last_day_number = (
@@ -720,24 +599,9 @@ class AddSchedule(APIView):
             notes=notes,
             hours_per_day=hours_per_day
         )
-
-        updated = update_subsequent_schedules(
-            start_time=start_time,
-            task_id=task.id,
-            last_day_number=last_day_number,
-            excluded_schedule=schedule
-        )
-
-        if start_time < last_update:
-            excluded_schedules = updated
-            excluded_schedules.append(schedule.id)
-            updated_previous = update_previous_schedules(
-                start_time,
-                task.id,
-                remaining_task_days,
-                excluded_schedules=excluded_schedules
-            )
-            updated += updated_previous
+        countdown.add(schedule)
+        updated = countdown.recount(schedule, remaining_task_days)
+        countdown.save()
 
         schedules = Schedule.objects.filter(
             id__in=updated
@@ -749,39 +613,126 @@ class AddSchedule(APIView):
         })
 
 
+class Echo:
+    """File-like object whose write returns the value, for streaming csv rows."""
+
+    def write(self, value):
+        return value
+
+
+CSV_EXPORT_HEADER = [
+    'Project', 'User', 'Task', 'Start Time',
+    'End Time', 'Days', 'Notes', 'Hours Per Day'
+]
+CSV_EXPORT_FIELDS = [
+    'start_time', 'end_time', 'notes', 'hours_per_day',
+    'user_project__project__name',
+    'user_id', 'user__first_name', 'user__last_name',
+    'user_project__user_id', 'user_project__user__first_name',
+    'user_project__user__last_name',
+    'task_id', 'task__name', 'activity_id', 'activity__name',
+]
+
+
+def schedule_csv_rows(schedules):
+    """
+    CSV rows (matching ScheduleSerializer's project_name, user and task_name)
+    of a schedule queryset, read in chunks from values() rather than through
+    model instances.
+    """
+    yield CSV_EXPORT_HEADER
+    for schedule in schedules.values(*CSV_EXPORT_FIELDS).iterator(chunk_size=2000):
+        if schedule['user_id']:
+            user = f"{schedule['user__first_name']} {schedule['user__last_name']}"
+        elif schedule['user_project__user_id']:
+            user = (
+                f"{schedule['user_project__user__first_name']} "
+                f"{schedule['user_project__user__last_name']}"
+            )
+        else:
+            user = ''
+        if schedule['task_id']:
+            task_name = schedule['task__name']
+        elif schedule['activity_id']:
+            task_name = schedule['activity__name']
+        else:
+            task_name = '-'
+        start_time = timezone.localtime(schedule['start_time'])
+        end_time = timezone.localtime(schedule['end_time'])
+        yield [
+            schedule['user_project__project__name'] or '',
+            user,
+            task_name,
+            start_time.date().isoformat(),
+            end_time.date().isoformat(),
+            (end_time - start_time).days + 1,
+            schedule['notes'],
+            schedule['hours_per_day'] if schedule['hours_per_day'] else '7'
+        ]
+
+
 class ScheduleCSVExport(APIView):
-    def get(self, request, project_id, user_id=None):
+    """
+    Schedules of a project (or of a project's user) as a streamed CSV file.
+
+    Query parameters (all optional):
+    - projects: comma separated project ids, instead of or as well as the
+      project in the URL; without either every project is exported
+    - from, to (YYYY-MM-DD): only schedules starting within these days
+    - format=columnar: the serialized schedules in the columnar format
+    """
+    renderer_classes = api_settings.DEFAULT_RENDERER_CLASSES + COLUMNAR_RENDERERS
+
+    def get(self, request, project_id=None, user_id=None):
         schedules = Schedule.objects.filter(
-            user_project__project_id=project_id,
-        ).order_by('start_time')
+            user_project__isnull=False
+        ).order_by('start_time', 'id')
+        projects = request.GET.get('projects', '')
+        try:
+            project_ids = [
+                int(project) for project in projects.split(',') if project
+            ]
+        except ValueError:
+            return Response(
+                {'error': f'Invalid projects "{projects}"'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        try:
+            start_date = date_param(request, 'from')
+            end_date = date_param(request, 'to')
+        except ValueError as e:
+            return Response(
+                {'error': str(e)},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        if project_id:
+            project_ids.append(project_id)
+        if project_ids:
+            schedules = schedules.filter(
+                user_project__project_id__in=project_ids
+            )
         if user_id:
             schedules = schedules.filter(
                 user_project__user_id=user_id
             )
-        schedules = schedules.distinct()
-        serializer = ScheduleSerializer(schedules, many=True)
+        if start_date:
+            schedules = schedules.filter(start_time__date__gte=start_date)
+        if end_date:
+            schedules = schedules.filter(start_time__date__lte=end_date)
+        if is_columnar(request):
+            serializer = ScheduleSerializer(
+                schedules.select_related(
+                    'user', 'user_project__user', 'user_project__project',
+                    'task', 'activity'
+                ), many=True
+            )
+            return Response(columnar_rows(serializer.data))
 
-        response = HttpResponse(content_type='text/csv')
+        writer = csv.writer(Echo())
+        response = StreamingHttpResponse(
+            (writer.writerow(row) for row in schedule_csv_rows(schedules)),
+            content_type='text/csv'
+        )
         response['Content-Disposition'] = 'attachment; filename="schedule.csv"'
-
-        writer = csv.writer(response)
-        writer.writerow([
-            'Project', 'User', 'Task', 'Start Time',
-            'End Time', 'Days', 'Notes', 'Hours Per Day'])
-
-        for schedule in serializer.data:
-            date1 = datetime.fromisoformat(schedule['start_time'].replace("Z", "+00:00"))
-            date2 = datetime.fromisoformat(schedule['end_time'].replace("Z", "+00:00"))
-            duration = (date2 - date1).days + 1
-            writer.writerow(
-                [
-                 schedule['project_name'],
-                 schedule['user'],
-                 schedule['task_name'],
-                 schedule['start_time'].split('T')[0],
-                 schedule['end_time'].split('T')[0],
-                 duration,
-                 schedule['notes'],
-                 schedule['hours_per_day'] if schedule['hours_per_day'] else '7'])
-
         return response
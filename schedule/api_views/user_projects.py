@@ -1,4 +1,5 @@
-from django.db.models import Q
+from django.core.cache import cache
+from django.db.models import Prefetch, Q
 from django.http import Http404
 from rest_framework.permissions import IsAdminUser
 from rest_framework.views import APIView
@@ -7,6 +8,8 @@ from rest_framework import serializers
 
 from django.contrib.auth import get_user_model
 
+from schedule.cache import SCHEDULE_LIST_TIMEOUT, user_project_list_key
+from schedule.conditional import ListVersion
 from schedule.models import UserProjectSlot
 from timesheet.models import Project
 
@@ -48,38 +51,58 @@ class UserProjectList(APIView):
                 userprojectslot__project__in=projects,
                 is_active=True
             ).distinct()
+            slots = UserProjectSlot.objects.filter(
+                project__publictimeline__id=timeline_id
+            )
         else:
             users = get_user_model().objects.filter(
                 Q(profile__api_key__isnull=False) |
                 Q(profile__erpnext_oauth_access_token__isnull=False),
                 is_active=True
             )
-        users_data = []
-        for user in users:
-            user_projects = UserProjectSlot.objects.filter(
-                user=user,
+            slots = UserProjectSlot.objects.all()
+
+        cache_key = user_project_list_key(timeline_id)
+        version = ListVersion(cache_key, request.user.id).add(
+            users, modified_field=None
+        ).add(slots.filter(user__in=users))
+        not_modified = version.not_modified(request)
+        if not_modified is not None:
+            return not_modified
+
+        users_data = cache.get(cache_key)
+        if users_data is None:
+            slots = UserProjectSlot.objects.filter(
                 active=True
-            )
+            ).select_related('project', 'user')
             if timeline_id:
-                user_projects = user_projects.filter(
-                    project__publictimeline__id=timeline_id
-                )
-            user_data = {
-                'user_id': user.id,
-                'user_name': (
-                    user.first_name if user.first_name else user.username
-                ),
-                'slotted_projects': UserProjectSerializer(
-                    user_projects, many=True
-                ).data
-            }
-            if self.request.user.id == user.id:
-                users_data.insert(0, user_data)
-            else:
-                users_data.append(user_data)
-        return Response(
-            users_data
+                slots = slots.filter(project__publictimeline__id=timeline_id)
+            users_data = [
+                {
+                    'user_id': user.id,
+                    'user_name': (
+                        user.first_name if user.first_name else user.username
+                    ),
+                    'slotted_projects': UserProjectSerializer(
+                        user.slotted_projects, many=True
+                    ).data
+                }
+                for user in users.prefetch_related(Prefetch(
+                    'userprojectslot_set',
+                    queryset=slots,
+                    to_attr='slotted_projects'
+                ))
+            ]
+            cache.set(cache_key, users_data, SCHEDULE_LIST_TIMEOUT)
+
+        # The requesting user is listed first
+        users_data = sorted(
+            users_data,
+            key=lambda user_data: user_data['user_id'] != self.request.user.id
         )
+        return version.apply(Response(
+            users_data
+        ))
 
 
 class AddUserProjectSlot(APIView):
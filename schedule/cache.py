@@ -0,0 +1,181 @@
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections, transaction
+
+logger = logging.getLogger(__name__)
+
+SCHEDULE_LIST_TIMEOUT = 60 * 60 * 24
+ALL = 'all'
+USER_PROJECTS = 'user_projects'
+# Sentinel for "every timeline may be affected"
+ALL_TIMELINES = object()
+
+_state = threading.local()
+_warmer = ThreadPoolExecutor(max_workers=1, thread_name_prefix='schedule-cache')
+_warm_lock = threading.Lock()
+_warm_pending = set()
+_warm_scheduled = False
+
+
+def _version_key(scope):
+    return f'schedule_list_version:{scope}'
+
+
+def _version(scope):
+    return cache.get_or_set(_version_key(scope), 0, None)
+
+
+def _bump(scope):
+    try:
+        cache.incr(_version_key(scope))
+    except ValueError:
+        cache.set(_version_key(scope), 1, None)
+
+
+def schedule_list_key(timeline_id, start_date, end_date) -> str:
+    """
+    Cache key of the schedule list for a timeline (or every schedule) and
+    date window. The key embeds version counters, so invalidating a list is
+    a counter bump rather than a delete.
+    """
+    if timeline_id:
+        version = f'{_version("timelines")}.{_version(f"timeline:{timeline_id}")}'
+        scope = f'timeline:{timeline_id}'
+    else:
+        version = _version(ALL)
+        scope = ALL
+    return f'schedule_list:{scope}:v{version}:{start_date}:{end_date}'
+
+
+def capacity_week_key(monday) -> str:
+    """Cache key of every user's capacity in the week starting on monday."""
+    return f'capacity_week:{monday}:v{_version(ALL)}'
+
+
+def user_project_list_key(timeline_id) -> str:
+    """Cache key of the planner's user/slot list for a timeline (or everyone)."""
+    return f'user_project_list:{timeline_id or ALL}:v{_version(USER_PROJECTS)}'
+
+
+def invalidate_user_project_cache():
+    """Invalidate every cached user/slot list; slots and users change rarely."""
+    _bump(USER_PROJECTS)
+
+
+def invalidate_timeline_cache(timeline_ids):
+    """
+    Invalidate the user/slot and schedule lists of timelines whose project
+    set changed; both lists are filtered by the timeline's projects.
+    """
+    _bump(USER_PROJECTS)
+    for timeline_id in timeline_ids:
+        _bump(f'timeline:{timeline_id}')
+    _schedule_warm_up(set(timeline_ids))
+
+
+def _timelines_of(project_ids):
+    from schedule.models.public_timeline import PublicTimeline
+    return set(
+        PublicTimeline.objects.filter(
+            projects__id__in=project_ids
+        ).values_list('id', flat=True)
+    )
+
+
+def _invalidate(project_ids):
+    _bump(ALL)
+    if project_ids is ALL_TIMELINES:
+        _bump('timelines')
+        timeline_ids = ALL_TIMELINES
+    else:
+        timeline_ids = _timelines_of(project_ids) if project_ids else set()
+        for timeline_id in timeline_ids:
+            _bump(f'timeline:{timeline_id}')
+    _schedule_warm_up(timeline_ids)
+
+
+@contextmanager
+def schedule_cache_batch():
+    """Defer schedule cache invalidation on this thread until the block exits.
+
+    Bulk jobs that write many schedules wrap themselves in this so the
+    schedule lists are invalidated (and re-warmed) once at the end instead
+    of once per row.
+    """
+    depth = getattr(_state, 'depth', 0)
+    if depth == 0:
+        _state.projects = set()
+        _state.dirty = False
+    _state.depth = depth + 1
+    try:
+        yield
+    finally:
+        _state.depth = depth
+        if depth == 0 and _state.dirty:
+            _invalidate(_state.projects)
+
+
+def invalidate_schedule_cache(project_ids=ALL_TIMELINES):
+    """
+    Invalidate the cached schedule lists that may contain schedules of the
+    given projects: the full list always, plus the public timelines showing
+    those projects (every timeline when no projects are given).
+    """
+    if getattr(_state, 'depth', 0):
+        _state.dirty = True
+        if project_ids is ALL_TIMELINES or _state.projects is ALL_TIMELINES:
+            _state.projects = ALL_TIMELINES
+        else:
+            _state.projects.update(project_ids)
+        return
+    _invalidate(project_ids)
+
+
+def _schedule_warm_up(timeline_ids):
+    if settings.SCHEDULE_CACHE_WARMUP_DELAY:
+        # Render once the writes are visible to the worker's own connection
+        transaction.on_commit(lambda: _queue_warm_up(timeline_ids))
+
+
+def _queue_warm_up(timeline_ids):
+    """Queue a re-render of the invalidated lists, coalescing bursts of saves."""
+    global _warm_scheduled
+    with _warm_lock:
+        _warm_pending.add(ALL)
+        if timeline_ids is ALL_TIMELINES:
+            _warm_pending.add(ALL_TIMELINES)
+        else:
+            _warm_pending.update(timeline_ids)
+        if _warm_scheduled:
+            return
+        _warm_scheduled = True
+    _warmer.submit(_warm_up)
+
+
+def _warm_up():
+    global _warm_scheduled
+    time.sleep(settings.SCHEDULE_CACHE_WARMUP_DELAY)
+    with _warm_lock:
+        pending = set(_warm_pending)
+        _warm_pending.clear()
+        _warm_scheduled = False
+    try:
+        from schedule.api_views.schedule import cached_schedule_list
+        from schedule.models.public_timeline import PublicTimeline
+        if ALL_TIMELINES in pending:
+            pending.discard(ALL_TIMELINES)
+            pending.update(
+                PublicTimeline.objects.filter(active=True).values_list('id', flat=True)
+            )
+        for scope in pending:
+            cached_schedule_list(None if scope == ALL else scope)
+    except Exception:
+        logger.exception('Error warming the schedule cache')
+    finally:
+        connections.close_all()
@@ -0,0 +1,128 @@
+from collections import defaultdict
+from datetime import date, timedelta
+from typing import Dict, List
+
+from django.core.cache import cache
+
+from schedule.cache import SCHEDULE_LIST_TIMEOUT, capacity_week_key
+from schedule.countdown import HOURS_PER_DAY
+from schedule.intervals import Interval, SATURDAY
+from schedule.models import Schedule
+
+ALLOCATED = 'allocated'
+LEAVE = 'leave'
+HOLIDAY = 'holiday'
+
+
+def _kind(activity_name: str) -> str:
+    # The same activity names the ERP leave and holiday sync writes
+    name = (activity_name or '').lower()
+    if 'public holiday' in name:
+        return HOLIDAY
+    if 'leave -' in name or 'lieu' in name:
+        return LEAVE
+    return ALLOCATED
+
+
+def _monday(day: date) -> date:
+    return day - timedelta(days=day.weekday())
+
+
+def _empty_week() -> dict:
+    return {ALLOCATED: [0.0] * 7, LEAVE: [False] * 7, HOLIDAY: [False] * 7}
+
+
+def _compute_weeks(mondays: List[date]) -> Dict[date, dict]:
+    """
+    Capacity of every user in the given weeks, read with one query:
+    {monday: {user_id: {'allocated': [hours x 7], 'leave': [...], 'holiday': [...]}}}.
+    Allocated hours only count on weekdays.
+    """
+    weeks = {monday: defaultdict(_empty_week) for monday in mondays}
+    window = Interval(min(mondays), max(mondays) + timedelta(days=6))
+    schedules = Schedule.objects.filter(
+        start_time__date__lte=window.end,
+        end_time__date__gte=window.start
+    ).values_list(
+        'user_id', 'user_project__user_id', 'start_time', 'end_time',
+        'hours_per_day', 'activity__name'
+    )
+    for user_id, slot_user_id, start_time, end_time, hours_per_day, activity_name in schedules.iterator():
+        user_id = user_id or slot_user_id
+        if not user_id:
+            continue
+        kind = _kind(activity_name)
+        hours = hours_per_day or HOURS_PER_DAY
+        interval = Interval.of(start_time, end_time)
+        day = max(interval.start, window.start)
+        while day <= min(interval.end, window.end):
+            week = weeks.get(_monday(day))
+            if week is not None:
+                row = week[user_id][kind]
+                if kind == ALLOCATED:
+                    if day.weekday() < SATURDAY:
+                        row[day.weekday()] += hours
+                else:
+                    row[day.weekday()] = True
+            day += timedelta(days=1)
+    return {monday: dict(week) for monday, week in weeks.items()}
+
+
+def capacity_weeks(start_date: date, end_date: date) -> Dict[date, dict]:
+    """
+    Per-week capacity of every user covering the dates, from the cache where
+    possible. Missing weeks are computed together in a single query and
+    cached until the next schedule change.
+    """
+    mondays = []
+    monday = _monday(start_date)
+    while monday <= end_date:
+        mondays.append(monday)
+        monday += timedelta(days=7)
+
+    keys = {monday: capacity_week_key(monday) for monday in mondays}
+    cached = cache.get_many(keys.values())
+    weeks = {
+        monday: cached[key] for monday, key in keys.items() if key in cached
+    }
+    missing = [monday for monday in mondays if monday not in weeks]
+    if missing:
+        computed = _compute_weeks(missing)
+        cache.set_many(
+            {keys[monday]: week for monday, week in computed.items()},
+            SCHEDULE_LIST_TIMEOUT
+        )
+        weeks.update(computed)
+    return weeks
+
+
+def capacity_matrix(user_ids, start_date: date, end_date: date) -> dict:
+    """
+    Users x days matrix of allocated hours, leave, public holidays and free
+    hours. A weekday has HOURS_PER_DAY of capacity unless it is leave or a
+    holiday; weekends have none.
+    """
+    weeks = capacity_weeks(start_date, end_date)
+    days = [
+        start_date + timedelta(days=offset)
+        for offset in range((end_date - start_date).days + 1)
+    ]
+    empty = _empty_week()
+    matrix = {}
+    for user_id in user_ids:
+        row = {ALLOCATED: [], LEAVE: [], HOLIDAY: [], 'free': []}
+        for day in days:
+            week = weeks[_monday(day)].get(user_id, empty)
+            weekday = day.weekday()
+            allocated = week[ALLOCATED][weekday]
+            leave = week[LEAVE][weekday]
+            holiday = week[HOLIDAY][weekday]
+            capacity = (
+                0 if weekday >= SATURDAY or leave or holiday else HOURS_PER_DAY
+            )
+            row[ALLOCATED].append(allocated)
+            row[LEAVE].append(leave)
+            row[HOLIDAY].append(holiday)
+            row['free'].append(max(capacity - allocated, 0))
+        matrix[user_id] = row
+    return {'days': days, 'users': matrix}
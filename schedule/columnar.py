@@ -0,0 +1,95 @@
+import msgpack
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+COLUMNAR = 'columnar'
+
+# Lookup tables of the columnar schedule format: name -> fields moved into it
+SCHEDULE_LOOKUPS = {
+    'user': ('user',),
+    'project': ('project_id', 'project_name'),
+    'task': ('task_id', 'task_name', 'task_label'),
+}
+
+
+def columnar_rows(rows, lookups=SCHEDULE_LOOKUPS) -> dict:
+    """
+    Encode a list of serialized rows as parallel arrays.
+
+    Every field becomes one array under 'columns' (None where a row lacks
+    it). Fields grouped in a lookup are stored once per distinct combination
+    in 'lookups', and each row keeps only an index into that table, e.g.
+    project_name of row i is
+    lookups['project']['project_name'][columns['project'][i]].
+    """
+    looked_up = {
+        field: name for name, fields in lookups.items() for field in fields
+    }
+    fields = []
+    for row in rows:
+        for field in row:
+            if field not in looked_up and field not in fields:
+                fields.append(field)
+
+    columns = {field: [] for field in fields}
+    tables = {
+        name: {field: [] for field in table_fields}
+        for name, table_fields in lookups.items()
+    }
+    indexes = {name: {} for name in lookups}
+    used = set()
+    for name in lookups:
+        columns[name] = []
+
+    for row in rows:
+        for field in fields:
+            columns[field].append(row.get(field))
+        for name, table_fields in lookups.items():
+            if not any(field in row for field in table_fields):
+                columns[name].append(None)
+                continue
+            used.add(name)
+            key = tuple(row.get(field) for field in table_fields)
+            index = indexes[name].get(key)
+            if index is None:
+                index = indexes[name][key] = len(indexes[name])
+                for field, value in zip(table_fields, key):
+                    tables[name][field].append(value)
+            columns[name].append(index)
+
+    for name in lookups:
+        if name not in used:
+            del columns[name]
+            del tables[name]
+    return {
+        'count': len(rows),
+        'columns': columns,
+        'lookups': tables
+    }
+
+
+class ColumnarJSONRenderer(JSONRenderer):
+    """JSON renderer selected with ?format=columnar."""
+    format = COLUMNAR
+
+
+class ColumnarMsgpackRenderer(BaseRenderer):
+    """msgpack renderer selected with ?format=columnar and Accept: application/msgpack."""
+    media_type = 'application/msgpack'
+    format = COLUMNAR
+    charset = None
+    render_style = 'binary'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return msgpack.packb(data, default=JSONEncoder().default)
+
+
+COLUMNAR_RENDERERS = [ColumnarJSONRenderer, ColumnarMsgpackRenderer]
+
+
+def is_columnar(request) -> bool:
+    return getattr(request, 'accepted_renderer', None) is not None and (
+        request.accepted_renderer.format == COLUMNAR
+    )
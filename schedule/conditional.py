@@ -0,0 +1,65 @@
+import hashlib
+
+from django.db.models import Count, Max
+from django.utils.cache import get_conditional_response, quote_etag
+from django.utils.http import http_date
+
+REVALIDATE = 'no-cache, must-revalidate, max-age=0'
+
+
+class ListVersion:
+    """
+    Cheap version of a planner list: row counts and latest modification
+    times of the querysets it is built from, plus any extra tokens (e.g. the
+    schedule list cache key). Computing it runs one aggregate per queryset
+    and serializes nothing, so unchanged polls can be answered with a 304.
+    """
+
+    def __init__(self, *tokens):
+        self.tokens = [str(token) for token in tokens]
+        self.modified = None
+
+    def add(self, queryset, modified_field='updated_at'):
+        """Count a queryset's size and, if it has one, its latest modification."""
+        aggregates = {'count': Count('pk', distinct=True)}
+        if modified_field:
+            aggregates['modified'] = Max(modified_field)
+        stats = queryset.order_by().aggregate(**aggregates)
+        self.tokens.append(str(stats['count']))
+        if modified_field:
+            self.add_modified(stats['modified'])
+        return self
+
+    def add_modified(self, modified):
+        """Count a modification time towards the version and Last-Modified."""
+        self.tokens.append(modified.isoformat() if modified else '-')
+        if modified and (self.modified is None or modified > self.modified):
+            self.modified = modified
+        return self
+
+    @property
+    def etag(self) -> str:
+        return quote_etag(
+            hashlib.md5('|'.join(self.tokens).encode()).hexdigest()
+        )
+
+    @property
+    def last_modified(self):
+        return int(self.modified.timestamp()) if self.modified else None
+
+    def not_modified(self, request):
+        """304 response if the client's copy is current, otherwise None."""
+        response = get_conditional_response(
+            request, etag=self.etag, last_modified=self.last_modified
+        )
+        if response is not None:
+            self.apply(response)
+        return response
+
+    def apply(self, response):
+        """Set the validators and ask clients to revalidate before reuse."""
+        response['ETag'] = self.etag
+        if self.last_modified is not None:
+            response['Last-Modified'] = http_date(self.last_modified)
+        response['Cache-Control'] = REVALIDATE
+        return response
@@ -0,0 +1,292 @@
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+import pytz
+from django.db import connections
+from django.utils import timezone
+
+from schedule.models import Schedule
+from schedule.cache import invalidate_schedule_cache
+from timesheet.models import Task
+
+HOURS_PER_DAY = 7
+BULK_BATCH_SIZE = 500
+
+
+def _naive(date_obj):
+    return date_obj.astimezone(pytz.UTC).replace(tzinfo=None).replace(
+        hour=0, minute=0, second=0, microsecond=0
+    )
+
+
+def _aware(date_obj):
+    # Compare the way the database does: naive values are in the default timezone
+    if timezone.is_naive(date_obj):
+        return timezone.make_aware(date_obj, timezone.get_default_timezone())
+    return date_obj
+
+
+class TaskCountdown:
+    """
+    Countdown (first/last day numbers) of every schedule of one task.
+
+    All schedules of the task are loaded once and recounted in memory, then
+    only the rows whose day numbers changed are written back with a single
+    bulk_update. The arithmetic mirrors the per-row countdown it replaced,
+    which queried and saved one schedule at a time.
+    """
+
+    def __init__(self, task, schedules=None):
+        self.task = task
+        if schedules is None:
+            schedules = Schedule.objects.filter(task=task)
+        self.schedules = []
+        self._saved = {}
+        for schedule in schedules:
+            self.add(schedule)
+
+    def add(self, schedule: Schedule):
+        """Include a schedule (e.g. one just created) in the countdown."""
+        schedule.start_time = _aware(schedule.start_time)
+        schedule.end_time = _aware(schedule.end_time)
+        self.schedules.append(schedule)
+        self._saved[schedule.id] = (schedule.first_day_number, schedule.last_day_number)
+
+    @property
+    def last_task_update(self):
+        return _naive(self.task.last_update)
+
+    def _ordered(self, include, reverse=False, excluded_ids=()):
+        schedules = [
+            schedule for schedule in self.schedules
+            if schedule.id not in excluded_ids and include(schedule)
+        ]
+        return sorted(
+            schedules,
+            key=lambda schedule: (schedule.start_time, schedule.id),
+            reverse=reverse
+        )
+
+    def has_schedules_between(self, start_time, end_time) -> bool:
+        """True if a schedule starts within [start_time, end_time)."""
+        start_time, end_time = _aware(start_time), _aware(end_time)
+        return any(
+            start_time <= schedule.start_time < end_time
+            for schedule in self.schedules
+        )
+
+    def remaining_days(self, start_time, end_time=None, excluded_schedule=None) -> int:
+        """Remaining task days at start_time, counting back from or forward to the task's last update."""
+        remaining_task_day = int(
+            (self.task.expected_time - self.task.actual_time) / HOURS_PER_DAY
+        )
+        excluded_ids = {excluded_schedule.id} if excluded_schedule else set()
+
+        start_time = _naive(start_time)
+        if end_time:
+            end_time = _naive(end_time)
+        last_task_update = self.last_task_update
+
+        if start_time < last_task_update:
+            lower, upper = _aware(start_time), _aware(last_task_update)
+            for prev_schedule in self._ordered(
+                    lambda schedule: lower <= schedule.start_time < upper,
+                    reverse=True,
+                    excluded_ids=excluded_ids):
+                prev_start_time = _naive(prev_schedule.start_time)
+                prev_end_time = _naive(prev_schedule.end_time)
+                if prev_end_time < last_task_update:
+                    remaining_task_day += (prev_end_time - prev_start_time).days + 1
+                else:
+                    remaining_task_day += (last_task_update - prev_start_time).days
+            if end_time > last_task_update:
+                end_time = last_task_update
+            return (
+                remaining_task_day +
+                (end_time - start_time).days +
+                (1 if end_time < last_task_update else 0)
+            )
+
+        before, since = _aware(start_time), _aware(last_task_update)
+        for previous_schedule in self._ordered(
+                lambda schedule: schedule.start_time < before and schedule.end_time >= since,
+                excluded_ids=excluded_ids):
+            prev_start_time = _naive(previous_schedule.start_time)
+            prev_end_time = _naive(previous_schedule.end_time)
+            if prev_start_time > last_task_update:
+                remaining_task_day -= (prev_end_time - prev_start_time).days + 1
+            else:
+                remaining_task_day -= (prev_end_time - last_task_update).days + 1
+        return remaining_task_day
+
+    def update_previous(self, start_time, remaining_days, excluded_ids=()) -> list:
+        """Count up through the schedules starting at or before start_time, latest first."""
+        start_time = _aware(start_time)
+        updated = []
+        first_day = remaining_days
+        for schedule in self._ordered(
+                lambda schedule: schedule.start_time <= start_time,
+                reverse=True,
+                excluded_ids=set(excluded_ids)):
+            first_day += 1
+            schedule.last_day_number = first_day
+            first_day += (schedule.end_time - schedule.start_time).days
+            schedule.first_day_number = first_day
+            updated.append(schedule.id)
+        return updated
+
+    def update_subsequent(self, start_time, last_day_number, excluded_schedule=None) -> list:
+        """Count down through the schedules starting at or after start_time, earliest first."""
+        start_time = _aware(start_time)
+        excluded_ids = {excluded_schedule.id} if excluded_schedule else set()
+        updated = []
+        for schedule in self._ordered(
+                lambda schedule: schedule.start_time >= start_time,
+                excluded_ids=excluded_ids):
+            schedule.first_day_number = last_day_number - 1
+            last_day_number = (
+                (last_day_number - 1) -
+                (schedule.end_time - schedule.start_time).days
+            )
+            schedule.last_day_number = last_day_number
+            updated.append(schedule.id)
+        return updated
+
+    def recount(self, schedule: Schedule, remaining_days: int = None) -> list:
+        """
+        Number a schedule and recount the rest of the task's chain around it.
+
+        remaining_days defaults to the task days left at the schedule's start.
+        Returns the ids of the other schedules touched, plus the schedule
+        itself when it lies before the task's last update.
+        """
+        start_time = _naive(schedule.start_time)
+        if remaining_days is None:
+            remaining_days = self.remaining_days(
+                schedule.start_time, schedule.end_time
+            )
+        last_day_number = (
+            remaining_days - (schedule.end_time - schedule.start_time).days
+        )
+        schedule.first_day_number = remaining_days
+        schedule.last_day_number = last_day_number
+
+        updated = self.update_subsequent(
+            start_time, last_day_number, excluded_schedule=schedule
+        )
+        if start_time < self.last_task_update:
+            updated.append(schedule.id)
+            updated += self.update_previous(
+                start_time, remaining_days, excluded_ids=updated
+            )
+        return updated
+
+    def changed(self) -> list:
+        """Schedules whose day numbers differ from what was loaded or last saved."""
+        return [
+            schedule for schedule in self.schedules
+            if self._saved[schedule.id] != (
+                schedule.first_day_number, schedule.last_day_number
+            )
+        ]
+
+    def save(self) -> list:
+        """Write back the schedules whose day numbers changed, in one query."""
+        changed = self.changed()
+        if changed:
+            now = timezone.now()
+            for schedule in changed:
+                schedule.updated_at = now
+            Schedule.objects.bulk_update(
+                changed, ['first_day_number', 'last_day_number', 'updated_at']
+            )
+            invalidate_schedule_cache([self.task.project_id])
+        for schedule in changed:
+            self._saved[schedule.id] = (
+                schedule.first_day_number, schedule.last_day_number
+            )
+        return changed
+
+
+def countdown_tasks(since=None, user=None) -> list:
+    """Ids of tasks with slot schedules, optionally only those updated since a time."""
+    tasks = Task.objects.filter(schedule__user_project__isnull=False)
+    if user:
+        tasks = tasks.filter(schedule__user_project__user=user)
+    if since:
+        tasks = tasks.filter(last_update__gte=since)
+    return sorted(set(tasks.values_list('id', flat=True)))
+
+
+def _chain_position(schedule):
+    return schedule.start_time, schedule.id
+
+
+def compute_task_countdown(task_id, user=None) -> list:
+    """
+    Recount one task's chain once for all users with slot schedules on it
+    (or only the given user). Reads only; returns (schedule id, first, last)
+    for the rows that changed.
+
+    Each user's chain used to be recounted from their latest schedule of the
+    task; anchoring at the earliest of those covers every block any of those
+    passes reached.
+    """
+    task = Task.objects.get(id=task_id)
+    countdown = TaskCountdown(
+        task, Schedule.objects.filter(task=task).select_related('user_project')
+    )
+    latest_by_user = {}
+    for schedule in countdown.schedules:
+        if not schedule.user_project_id:
+            continue
+        user_id = schedule.user_project.user_id
+        if user is not None and user_id != user.id:
+            continue
+        latest = latest_by_user.get(user_id)
+        if latest is None or _chain_position(schedule) > _chain_position(latest):
+            latest_by_user[user_id] = schedule
+    if not latest_by_user:
+        return []
+    countdown.recount(min(latest_by_user.values(), key=_chain_position))
+    return [
+        (schedule.id, schedule.first_day_number, schedule.last_day_number)
+        for schedule in countdown.changed()
+    ]
+
+
+def _compute_task_countdowns(task_ids, user=None) -> list:
+    return [change for task_id in task_ids for change in compute_task_countdown(task_id, user)]
+
+
+def _close_connections():
+    connections.close_all()
+
+
+def recount_tasks(task_ids, user=None, workers=1) -> int:
+    """
+    Recount the chains of the given tasks, each exactly once, and write every
+    changed schedule with one bulk_update. With workers > 1 the tasks are
+    recounted in that many processes; only this process writes.
+    Returns the number of schedules updated.
+    """
+    if workers > 1 and len(task_ids) > 1:
+        chunks = [task_ids[index::workers] for index in range(workers)]
+        # Forked workers must open their own database connections
+        connections.close_all()
+        with ProcessPoolExecutor(max_workers=workers, initializer=_close_connections) as executor:
+            changes = [
+                change for chunk_changes in executor.map(partial(_compute_task_countdowns, user=user), chunks)
+                for change in chunk_changes
+            ]
+    else:
+        changes = _compute_task_countdowns(task_ids, user)
+
+    if changes:
+        now = timezone.now()
+        Schedule.objects.bulk_update([
+            Schedule(id=schedule_id, first_day_number=first, last_day_number=last, updated_at=now)
+            for schedule_id, first, last in changes
+        ], ['first_day_number', 'last_day_number', 'updated_at'], batch_size=BULK_BATCH_SIZE)
+        invalidate_schedule_cache()
+    return len(changes)
@@ -0,0 +1,117 @@
+from datetime import date, timedelta
+from typing import Dict, Iterable, List, NamedTuple
+
+from django.db.models import Q
+from django.utils import timezone
+
+from schedule.models import Schedule
+
+ONE_DAY = timedelta(days=1)
+SATURDAY = 5
+
+
+class Interval(NamedTuple):
+    """A run of whole calendar days, both ends inclusive."""
+    start: date
+    end: date
+
+    @classmethod
+    def of(cls, start_time, end_time) -> 'Interval':
+        """Days covered by a schedule's start and end times, in the current timezone."""
+        return cls(
+            timezone.localtime(start_time).date(),
+            timezone.localtime(end_time).date()
+        )
+
+    @property
+    def days(self) -> int:
+        return (self.end - self.start).days + 1
+
+    def as_dict(self) -> dict:
+        return {'start': self.start, 'end': self.end, 'days': self.days}
+
+
+def merge_intervals(intervals: Iterable[Interval], presorted=False) -> List[Interval]:
+    """
+    Merge overlapping or adjacent intervals in one sweep. Pass presorted
+    when the intervals already come ordered by start (e.g. from the database).
+    """
+    if not presorted:
+        intervals = sorted(intervals)
+    merged = []
+    for interval in intervals:
+        if merged and interval.start <= merged[-1].end + ONE_DAY:
+            if interval.end > merged[-1].end:
+                merged[-1] = Interval(merged[-1].start, interval.end)
+        else:
+            merged.append(interval)
+    return merged
+
+
+def free_intervals(busy: List[Interval], window: Interval, workdays_only=False) -> List[Interval]:
+    """
+    Days of the window not covered by the merged busy intervals, in one
+    sweep. With workdays_only, free runs stop at weekends.
+    """
+    free = []
+    cursor = window.start
+    for interval in busy:
+        if interval.end < cursor:
+            continue
+        if interval.start > window.end:
+            break
+        if interval.start > cursor:
+            free.append(Interval(cursor, interval.start - ONE_DAY))
+        cursor = interval.end + ONE_DAY
+    if cursor <= window.end:
+        free.append(Interval(cursor, window.end))
+    if workdays_only:
+        free = [run for interval in free for run in _workday_runs(interval)]
+    return free
+
+
+def _workday_runs(interval: Interval):
+    start = interval.start
+    while start <= interval.end:
+        if start.weekday() >= SATURDAY:
+            start += timedelta(days=7 - start.weekday())
+            continue
+        end = min(interval.end, start + timedelta(days=4 - start.weekday()))
+        yield Interval(start, end)
+        start = end + ONE_DAY
+
+
+def user_availability(user_ids, window: Interval, workdays_only=True) -> Dict[int, dict]:
+    """
+    Merged busy and free intervals of each user within the window.
+
+    Busy days come from every schedule of the user, slotted or not (leave
+    and public holidays are assigned to the user directly). All schedules
+    are read in one query ordered by start, so each user's intervals merge
+    in a single pass without sorting.
+    """
+    user_ids = list(user_ids)
+    busy = {user_id: [] for user_id in user_ids}
+    schedules = Schedule.objects.filter(
+        Q(user_id__in=user_ids) | Q(user_project__user_id__in=user_ids),
+        start_time__date__lte=window.end,
+        end_time__date__gte=window.start
+    ).order_by('start_time').values_list(
+        'user_id', 'user_project__user_id', 'start_time', 'end_time'
+    )
+    for user_id, slot_user_id, start_time, end_time in schedules.iterator():
+        busy[user_id if user_id in busy else slot_user_id].append(
+            Interval.of(start_time, end_time)
+        )
+
+    availability = {}
+    for user_id, intervals in busy.items():
+        clipped = [
+            Interval(max(interval.start, window.start), min(interval.end, window.end))
+            for interval in merge_intervals(intervals, presorted=True)
+        ]
+        availability[user_id] = {
+            'busy': clipped,
+            'free': free_intervals(clipped, window, workdays_only)
+        }
+    return availability
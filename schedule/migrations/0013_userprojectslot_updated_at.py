@@ -0,0 +1,20 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:05
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('schedule', '0012_schedule_updated_at_tombstone'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userprojectslot',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now, help_text='Last time the slot was saved, for conditional GETs'),
+            preserve_default=False,
+        ),
+    ]
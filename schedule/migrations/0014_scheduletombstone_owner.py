@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('schedule', '0013_userprojectslot_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='scheduletombstone',
+            name='project_id',
+            field=models.IntegerField(blank=True, help_text='Project of the deleted slot schedule, to filter delta polls by project or timeline', null=True),
+        ),
+        migrations.AddField(
+            model_name='scheduletombstone',
+            name='user_id',
+            field=models.IntegerField(blank=True, help_text='Owner of the deleted schedule, to filter delta polls by user', null=True),
+        ),
+    ]
@@ -1,3 +1,4 @@
 from schedule.models.user_project_slot import *  # noqa
+from schedule.models.schedule_tombstone import *  # noqa
 from schedule.models.schedule import *  # noqa
 from schedule.models.public_timeline import *  # noqa
\ No newline at end of file
@@ -1,8 +1,14 @@
 from django.db import models
-from django.db.models.signals import post_save
+from django.db.models.signals import m2m_changed, post_save
 from django.dispatch import receiver
 from faker.utils.text import slugify
 
+from schedule.cache import (
+    invalidate_schedule_cache,
+    invalidate_timeline_cache,
+    invalidate_user_project_cache,
+)
+
 
 class PublicTimeline(models.Model):
 
@@ -48,3 +54,26 @@ def post_saved_summary(sender, instance, created, **kwargs):
     if not instance.slug_name:
         instance.slug_name = slug_name
         instance.save()
+
+
+@receiver(m2m_changed, sender=PublicTimeline.projects.through)
+def clear_timeline_cache(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        invalidate_timeline_cache([instance.pk])
+    elif action != 'post_clear':
+        invalidate_timeline_cache(pk_set or [])
+    else:
+        # A project was taken off all its timelines, which are no longer known
+        invalidate_user_project_cache()
+        invalidate_schedule_cache()
+
+
+@receiver(post_save, sender='timesheet.Project')
+def clear_project_cache(sender, instance, created, **kwargs):
+    # Both planner lists show project names
+    if created:
+        return
+    invalidate_user_project_cache()
+    invalidate_schedule_cache([instance.pk])
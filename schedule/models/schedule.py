@@ -1,9 +1,13 @@
+import threading
+
 from django.contrib.auth import get_user_model
-from django.core.cache import cache
-from django.db import models
+from django.db import models, transaction
 from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
-import threading
+
+from schedule.cache import ALL_TIMELINES, invalidate_schedule_cache
+from schedule.models.schedule_tombstone import ScheduleTombstone
+from schedule.models.user_project_slot import UserProjectSlot
 
 
 class Schedule(models.Model):
@@ -77,6 +81,12 @@ class Schedule(models.Model):
         default=''
     )
 
+    updated_at = models.DateTimeField(
+        help_text='Last time the schedule was saved, for delta polling',
+        auto_now=True,
+        db_index=True
+    )
+
     @property
     def assignee(self):
         if self.user:
@@ -86,18 +96,79 @@ class Schedule(models.Model):
         return '-'
 
 
-def cache_schedule_page():
+BULK_BATCH_SIZE = 500
+
+_bulk_delete = threading.local()
+
+
+def delete_schedules(queryset) -> int:
+    """Delete schedules in bulk: one tombstone bulk_create and one cache invalidation.
+
+    The per-row receivers below cost three queries each, so batched deletes go
+    through here instead of queryset.delete(). Returns the number deleted.
+    """
+    rows = list(queryset.values_list(
+        'id', 'user_project_id', 'user_project__project_id', 'user_id', 'user_project__user_id'
+    ))
+    if not rows:
+        return 0
+    project_ids = set()
+    for _, slot_id, project_id, _, _ in rows:
+        if slot_id and not project_id:
+            project_ids = ALL_TIMELINES
+            break
+        if project_id:
+            project_ids.add(project_id)
+
+    _bulk_delete.active = True
     try:
-        from django.test.client import Client
-        client = Client()
-        response = client.get('/api/schedules/')
-    except Exception as e:
-        print(f"Error caching schedule page: {e}")
+        with transaction.atomic():
+            Schedule.objects.filter(id__in=[row[0] for row in rows]).delete()
+            ScheduleTombstone.objects.bulk_create(
+                [
+                    ScheduleTombstone(
+                        schedule_id=schedule_id,
+                        user_id=user_id or slot_user_id,
+                        project_id=project_id,
+                    )
+                    for schedule_id, _, project_id, user_id, slot_user_id in rows
+                ],
+                batch_size=BULK_BATCH_SIZE
+            )
+    finally:
+        _bulk_delete.active = False
+    invalidate_schedule_cache(project_ids)
+    return len(rows)
+
+
+@receiver(post_delete, sender=Schedule)
+def record_schedule_tombstone(sender, instance, **kwargs):
+    if getattr(_bulk_delete, 'active', False):
+        return
+    user_id, project_id = instance.user_id, None
+    if instance.user_project_id:
+        slot = UserProjectSlot.objects.filter(
+            id=instance.user_project_id
+        ).values_list('user_id', 'project_id').first()
+        if slot:
+            user_id = user_id or slot[0]
+            project_id = slot[1]
+    ScheduleTombstone.objects.create(
+        schedule_id=instance.id, user_id=user_id, project_id=project_id
+    )
 
 
 @receiver([post_save, post_delete], sender=Schedule)
-def clear_schedule_cache(sender, **kwargs):
-    cache.clear()
-    thread = threading.Thread(target=cache_schedule_page)
-    thread.daemon = True
-    thread.start()
+def clear_schedule_cache(sender, instance, **kwargs):
+    if getattr(_bulk_delete, 'active', False):
+        return
+    project_ids = ALL_TIMELINES
+    if not instance.user_project_id:
+        project_ids = []
+    else:
+        project_id = UserProjectSlot.objects.filter(
+            id=instance.user_project_id
+        ).values_list('project_id', flat=True).first()
+        if project_id:
+            project_ids = [project_id]
+    invalidate_schedule_cache(project_ids)
@@ -0,0 +1,39 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import models
+from django.utils import timezone
+
+
+class ScheduleTombstone(models.Model):
+    """Record of a deleted schedule, so planners polling for changes can drop it."""
+
+    schedule_id = models.IntegerField()
+
+    user_id = models.IntegerField(
+        null=True,
+        blank=True,
+        help_text='Owner of the deleted schedule, to filter delta polls by user'
+    )
+
+    project_id = models.IntegerField(
+        null=True,
+        blank=True,
+        help_text='Project of the deleted slot schedule, to filter delta polls by project or timeline'
+    )
+
+    deleted_at = models.DateTimeField(
+        auto_now_add=True,
+        db_index=True
+    )
+
+    @classmethod
+    def horizon(cls):
+        """Oldest deletion still on record; delta polls from before it may miss deletions."""
+        return timezone.now() - timedelta(days=settings.SCHEDULE_DELTA_WINDOW_DAYS)
+
+    @classmethod
+    def prune(cls) -> int:
+        """Drop tombstones older than the longest delta window. Returns rows deleted."""
+        deleted, _ = cls.objects.filter(deleted_at__lt=cls.horizon()).delete()
+        return deleted
@@ -1,5 +1,9 @@
 from django.contrib.auth import get_user_model
 from django.db import models
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from schedule.cache import invalidate_user_project_cache
 
 
 class UserProjectSlot(models.Model):
@@ -25,8 +29,22 @@ class UserProjectSlot(models.Model):
         default=0
     )
 
+    updated_at = models.DateTimeField(
+        help_text='Last time the slot was saved, for conditional GETs',
+        auto_now=True
+    )
+
     def __str__(self):
         return self.project.name
 
     class Meta:
         ordering = ['order']
+
+
+@receiver([post_save, post_delete], sender=UserProjectSlot)
+@receiver([post_save, post_delete], sender=get_user_model())
+@receiver(post_save, sender='timesheet.Profile')
+def clear_user_project_cache(sender, instance, update_fields=None, **kwargs):
+    if update_fields and set(update_fields) == {'last_login'}:
+        return
+    invalidate_user_project_cache()
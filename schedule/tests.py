@@ -1,6 +1,18 @@
-from datetime import datetime, timedelta
+import csv
+import io
+from datetime import date, datetime, timedelta
 
+from unittest.mock import patch
+
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+import msgpack
+from hypothesis import given, settings, strategies as st
+from hypothesis.extra.django import TestCase as HypothesisTestCase
 from pytz import utc
 from django.test import RequestFactory, TestCase, override_settings
 from django.contrib.auth import get_user_model
@@ -8,14 +20,239 @@ from rest_framework import status
 from rest_framework.test import APIClient
 
 from schedule.api_views.schedule import (
-    calculate_remaining_task_days,
-    update_subsequent_schedules,
-    update_previous_schedules,
+    schedule_list_window,
+    CSV_EXPORT_HEADER,
+    ScheduleSerializer,
 )
-from timesheet.models import Task, Project
-from schedule.models import UserProjectSlot, Schedule
+from timesheet.models import Activity, Department, Task, Project
+from timesheet.models.profile import Profile
+from schedule.countdown import TaskCountdown, _naive, countdown_tasks, recount_tasks
+from schedule.models import UserProjectSlot, Schedule, ScheduleTombstone
+from schedule.models.schedule import delete_schedules
+from schedule import cache as schedule_cache
+from schedule.cache import schedule_cache_batch, schedule_list_key
+from schedule.columnar import columnar_rows
+from schedule.intervals import Interval, free_intervals, merge_intervals
+from schedule.models.public_timeline import PublicTimeline
+
+
+
+# ── Reference countdown ───────────────────────────────────────────────────────
+# The per-row countdown the views and sync used before TaskCountdown, kept as
+# the reference its results are checked against.
+
+def calculate_remaining_task_days(
+        task: Task, start_time: datetime, end_time: datetime = None,
+        excluded_schedule: Schedule = None):
+    """
+    Calculates the remaining days for a task, considering the task's
+    expected time, actual time, and any previous schedules that
+    overlap with the task. The remaining task days are
+    calculated based on a default of 7 hours of work per day
+    :param task: Task object
+    :param start_time: The start time of the current schedule being considered
+    :param end_time: The end time of the current schedule being considered
+    :param excluded_schedule: A schedule excluded from the query
+    :return: The remaining task day
+    """
+
+    # remaining task time = expected_time - actual_time = 100
+    remaining_task_time = task.expected_time - task.actual_time
+    # last task update
+    last_task_update = task.last_update
+    # hours per day ( default to 7 )
+    hours_per_day = 7
+    # remaining task day = int(100 / 7) = 14
+    remaining_task_day = int(remaining_task_time / hours_per_day)
+
+    start_time = _naive(start_time)
+    if end_time:
+        end_time = _naive(end_time)
+    last_task_update = _naive(last_task_update)
+
+    if start_time < last_task_update:
+        # Calculate previous schedules before last_task_update and
+        # after the new schedule start_time
+        previous_schedules_before_update = Schedule.objects.filter(
+            task=task,
+            start_time__lt=last_task_update,
+            start_time__gte=start_time
+        ).order_by('-start_time')
+
+        if excluded_schedule:
+            previous_schedules_before_update = (
+                previous_schedules_before_update.exclude(
+                    id=excluded_schedule.id
+                )
+            )
+        for prev_schedule in previous_schedules_before_update:
+            prev_start_time = _naive(prev_schedule.start_time)
+            prev_end_time = _naive(prev_schedule.end_time)
+            if (
+                    prev_end_time <
+                    last_task_update
+            ):
+                remaining_task_day += (
+                                              prev_end_time - prev_start_time
+                                      ).days + 1
+            else:
+                remaining_task_day += (
+                        last_task_update - prev_start_time
+                ).days
+        if end_time > last_task_update:
+            end_time = last_task_update
+        return (
+                remaining_task_day +
+                (end_time - start_time).days +
+                (1 if end_time < last_task_update else 0)
+        )
+    else:
+        # Calculate remaining days
+        # e.g. 2 previous schedules
+        previous_schedules = Schedule.objects.filter(
+            task=task,
+            start_time__lt=start_time,
+            end_time__gte=last_task_update
+        ).order_by('start_time')
+        if excluded_schedule:
+            previous_schedules = previous_schedules.exclude(
+                id=excluded_schedule.id
+            )
+
+        for previous_schedule in previous_schedules:
+            prev_end_time = _naive(previous_schedule.end_time)
+            prev_start_time = _naive(previous_schedule.start_time)
+            if prev_start_time > last_task_update:
+                remaining_task_day -= (
+                                              prev_end_time - prev_start_time
+                                      ).days + 1
+            elif prev_start_time <= last_task_update:
+                remaining_task_day -= (
+                                              prev_end_time - last_task_update
+                                      ).days + 1
+        return remaining_task_day
+
+
+def update_previous_schedules(
+        start_time, task_id, remaining_days,
+        excluded_schedules=None):
+    # Initialize the list to store updated schedules' IDs
+    updated_schedules = []
+
+    # Query the previous schedules based on the given start
+    # _time and task_id, ordered by start_time in descending order
+    prev_schedules = Schedule.objects.filter(
+        start_time__lte=start_time,
+        task_id=task_id
+    ).order_by('-start_time')
+
+    # If an excluded_schedule is provided, exclude it from the query
+    if excluded_schedules:
+        prev_schedules = prev_schedules.exclude(id__in=excluded_schedules)
+
+    # Calculate the first_day value for the first previous schedule in the loop
+    first_day = remaining_days
+
+    # If there are previous schedules, update their first_
+    # day_number and last_day_number
+    if prev_schedules.exists():
+        for prev_schedule in prev_schedules:
+            first_day += 1
+            # Update the last_day_number of the current previous schedule
+            prev_schedule.last_day_number = first_day
+
+            # Calculate the duration of the current previous schedule
+            duration = (
+                    prev_schedule.end_time -
+                    prev_schedule.start_time
+            ).days
+
+            # Update the first_day value for the next
+            # previous schedule in the loop
+            first_day = first_day + duration
+
+            # Update the first_day_number of the current previous schedule
+            prev_schedule.first_day_number = first_day
+
+            # Save the updated previous schedule to the database
+            prev_schedule.save()
+
+            # Append the updated previous schedule's ID
+            # to the updated_schedules list
+            updated_schedules.append(prev_schedule.id)
+
+    return updated_schedules
+
+
+def update_subsequent_schedules(start_time,
+                                task_id,
+                                last_day_number,
+                                excluded_schedule=None):
+    """
+    This function checks for subsequent schedules and updates their first day
+    and last day numbers accordingly
+    :param start_time: The start time of the schedule
+    :param task_id: id of the task
+    :param last_day_number: The last day number of the previous task
+    :param excluded_schedule: Schedule to be excluded for the query
+    :return:
+    """
+    updated_schedules = []
+    sub_schedules = Schedule.objects.filter(
+        start_time__gte=start_time,
+        task_id=task_id
+    ).order_by('start_time').distinct()
+
+    if excluded_schedule:
+        sub_schedules = sub_schedules.exclude(
+            id=excluded_schedule.id
+        )
+
+    if sub_schedules.exists():
+        # Update the numbers
+        for sub_schedule in sub_schedules:
+            sub_schedule.first_day_number = last_day_number - 1
+            last_day_number = (
+                    (last_day_number - 1) - (
+                    sub_schedule.end_time - sub_schedule.start_time
+            ).days
+            )
+            sub_schedule.last_day_number = last_day_number
+            sub_schedule.save()
+            updated_schedules.append(sub_schedule.id)
+
+    return updated_schedules
 
 
+def update_schedule_countdown(user):
+    """Recount each task from the user's latest schedule of it, as the sync did per user."""
+    schedules = Schedule.objects.filter(
+        user_project__user=user
+    ).order_by('-start_time')
+    updated_tasks = []
+    for schedule in schedules:
+        if not schedule.task or schedule.task.id in updated_tasks:
+            continue
+        updated_tasks.append(schedule.task.id)
+        start_time = _naive(schedule.start_time)
+        remaining_task_days = calculate_remaining_task_days(
+            schedule.task, start_time, _naive(schedule.end_time)
+        )
+        last_day_number = (
+            remaining_task_days - (schedule.end_time - schedule.start_time).days
+        )
+        schedule.first_day_number = remaining_task_days
+        schedule.last_day_number = last_day_number
+        schedule.save()
+        updated = update_subsequent_schedules(
+            start_time, schedule.task.id, last_day_number, schedule
+        )
+        if start_time < _naive(schedule.task.last_update):
+            updated.append(schedule.id)
+            update_previous_schedules(
+                start_time, schedule.task.id, remaining_task_days, updated
+            )
+
 class TaskTestCase(TestCase):
     def setUp(self):
         self.client = APIClient()
@@ -543,3 +780,883 @@ class TestCalculateRemainingTaskDays(ScheduleTestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertFalse(Schedule.objects.filter(id=schedule.id).exists())
         self.assertEqual(response.data['updated'], [])
+
+
+class ScheduleListTestCase(ScheduleTestCase):
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.timeline = PublicTimeline.objects.create(
+            name='timeline', start_time=date(2023, 1, 1), end_time=date(2023, 12, 31)
+        )
+        self.timeline.projects.add(self.project)
+        other_project = Project.objects.create(name='other', is_active=True)
+        self.other_timeline = PublicTimeline.objects.create(
+            name='other', start_time=date(2023, 1, 1), end_time=date(2023, 12, 31)
+        )
+        self.other_timeline.projects.add(other_project)
+        self.window = schedule_list_window()
+
+    def _key(self, timeline_id=None):
+        return schedule_list_key(timeline_id, *self.window)
+
+    def _create_schedule(self, day, slot=True):
+        start_time = datetime.combine(date.today(), datetime.min.time(), tzinfo=utc) + timedelta(days=day)
+        return Schedule.objects.create(
+            user_project=self.user_project if slot else None,
+            user=None if slot else self.user,
+            start_time=start_time,
+            end_time=start_time
+        )
+
+
+@override_settings(SCHEDULE_CACHE_WARMUP_DELAY=0)
+class TestScheduleListCache(ScheduleListTestCase):
+
+    def test_list_is_served_from_cache(self):
+        self._create_schedule(1)
+        url = reverse('schedules') + f'?timelineId={self.timeline.id}'
+        first = self.client.get(url)
+        with patch('schedule.api_views.schedule.ScheduleSerializer') as mock_serializer:
+            second = self.client.get(url)
+        mock_serializer.assert_not_called()
+        self.assertEqual(len(first.data), 1)
+        self.assertEqual(second.data, first.data)
+
+    def test_save_invalidates_only_affected_lists(self):
+        cache.set('unrelated', 1)
+        keys = [self._key(), self._key(self.timeline.id), self._key(self.other_timeline.id)]
+
+        self._create_schedule(1)
+        self.assertNotEqual(self._key(), keys[0])
+        self.assertNotEqual(self._key(self.timeline.id), keys[1])
+        self.assertEqual(self._key(self.other_timeline.id), keys[2])
+        self.assertEqual(cache.get('unrelated'), 1)
+
+        keys = [self._key(), self._key(self.timeline.id)]
+        self._create_schedule(2, slot=False)
+        self.assertNotEqual(self._key(), keys[0])
+        self.assertEqual(self._key(self.timeline.id), keys[1])
+
+    def test_batch_invalidates_once_on_exit(self):
+        key = self._key()
+        with patch('schedule.cache._bump', wraps=schedule_cache._bump) as mock_bump:
+            with schedule_cache_batch():
+                with schedule_cache_batch():
+                    for day in range(1, 6):
+                        self._create_schedule(day)
+                Schedule.objects.filter(user_project=self.user_project).delete()
+                self.assertEqual(self._key(), key)
+                mock_bump.assert_not_called()
+        self.assertNotEqual(self._key(), key)
+        self.assertEqual(
+            sorted(call.args[0] for call in mock_bump.call_args_list),
+            ['all', f'timeline:{self.timeline.id}']
+        )
+
+    def test_batch_without_writes_keeps_cache(self):
+        key = self._key()
+        with schedule_cache_batch():
+            pass
+        self.assertEqual(self._key(), key)
+
+    @override_settings(SCHEDULE_CACHE_WARMUP_DELAY=1)
+    @patch('schedule.cache._warmer')
+    def test_warm_up_is_coalesced(self, mock_warmer):
+        with self.captureOnCommitCallbacks(execute=True):
+            for day in range(1, 6):
+                self._create_schedule(day)
+        mock_warmer.submit.assert_called_once_with(schedule_cache._warm_up)
+
+        with patch('schedule.cache.time.sleep'), \
+                patch('schedule.api_views.schedule.cached_schedule_list') as mock_render:
+            schedule_cache._warm_up()
+        self.assertEqual(
+            sorted(str(call.args[0]) for call in mock_render.call_args_list),
+            sorted(['None', str(self.timeline.id)])
+        )
+
+
+@override_settings(SCHEDULE_CACHE_WARMUP_DELAY=0)
+class TestScheduleListQuery(ScheduleListTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.other_user = get_user_model().objects.create(username='other')
+        self.other_slot = UserProjectSlot.objects.create(
+            project=self.timeline.projects.first(), user=self.other_user, active=True
+        )
+        self.client.force_authenticate(self.user)
+
+    def _ids(self, response):
+        return sorted(schedule['id'] for schedule in response.data)
+
+    def test_window_and_filters(self):
+        near = self._create_schedule(1)
+        far = self._create_schedule(30)
+        other = Schedule.objects.create(
+            user_project=self.other_slot,
+            start_time=near.start_time,
+            end_time=near.end_time
+        )
+        url = reverse('schedules')
+        day = date.today() + timedelta(days=1)
+
+        response = self.client.get(url, {'from': day.isoformat(), 'to': (day + timedelta(days=5)).isoformat()})
+        self.assertEqual(self._ids(response), sorted([near.id, other.id]))
+
+        response = self.client.get(url, {'user': self.user.id})
+        self.assertEqual(self._ids(response), sorted([near.id, far.id]))
+
+        response = self.client.get(url, {'project': self.project.id, 'from': day.isoformat()})
+        self.assertEqual(self._ids(response), sorted([near.id, far.id, other.id]))
+
+    def test_invalid_parameters(self):
+        url = reverse('schedules')
+        for params in ({'from': 'yesterday'}, {'since': '2023-13-40T00:00'}):
+            response = self.client.get(url, params)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+            self.assertIn('error', response.data)
+
+    @override_settings(SCHEDULE_DELTA_CURSOR_LAG_SECONDS=0)
+    def test_delta_since_cursor(self):
+        kept = self._create_schedule(1)
+        removed = self._create_schedule(2)
+        response = self.client.get(reverse('schedules'), {'since': '2000-01-01T00:00:00Z'})
+        cursor = response.data['cursor']
+        self.assertEqual(
+            sorted(schedule['id'] for schedule in response.data['schedules']),
+            sorted([kept.id, removed.id])
+        )
+
+        removed_id = removed.id
+        removed.delete()
+        added = self._create_schedule(400)
+        response = self.client.get(reverse('schedules'), {'since': cursor})
+        self.assertEqual([schedule['id'] for schedule in response.data['schedules']], [added.id])
+        self.assertEqual(response.data['deleted'], [removed_id])
+        self.assertTrue(ScheduleTombstone.objects.filter(schedule_id=removed_id).exists())
+        self.assertFalse(response.data['reset'])
+
+    @override_settings(SCHEDULE_DELTA_CURSOR_LAG_SECONDS=60)
+    def test_delta_cursor_trails_recent_saves(self):
+        since = (timezone.now() - timedelta(minutes=5)).isoformat()
+        recent = self._create_schedule(1)
+        response = self.client.get(reverse('schedules'), {'since': since})
+        self.assertEqual(response.data['schedules'], [])
+
+        Schedule.objects.filter(id=recent.id).update(updated_at=timezone.now() - timedelta(minutes=2))
+        response = self.client.get(reverse('schedules'), {'since': since})
+        self.assertEqual([schedule['id'] for schedule in response.data['schedules']], [recent.id])
+        self.assertLess(parse_datetime(response.data['cursor']), timezone.now() - timedelta(seconds=59))
+
+    @override_settings(SCHEDULE_DELTA_CURSOR_LAG_SECONDS=0)
+    def test_delta_deletions_are_filtered_like_schedules(self):
+        since = (timezone.now() - timedelta(minutes=5)).isoformat()
+        other_project = self.other_timeline.projects.first()
+        other_project_slot = UserProjectSlot.objects.create(
+            project=other_project, user=self.other_user, active=True
+        )
+        mine = self._create_schedule(1)
+        theirs = Schedule.objects.create(
+            user_project=self.other_slot, start_time=mine.start_time, end_time=mine.end_time
+        )
+        elsewhere = Schedule.objects.create(
+            user_project=other_project_slot, start_time=mine.start_time, end_time=mine.end_time
+        )
+        ids = {'mine': mine.id, 'theirs': theirs.id, 'elsewhere': elsewhere.id}
+        mine.delete()
+        delete_schedules(Schedule.objects.filter(id__in=[theirs.id, elsewhere.id]))
+        ScheduleTombstone.objects.create(schedule_id=999)
+
+        def deleted(**params):
+            response = self.client.get(reverse('schedules'), {'since': since, **params})
+            return sorted(response.data['deleted'])
+
+        self.assertEqual(deleted(), sorted([*ids.values(), 999]))
+        self.assertEqual(deleted(timelineId=self.timeline.id), sorted([ids['mine'], ids['theirs'], 999]))
+        self.assertEqual(deleted(user=self.user.id), sorted([ids['mine'], 999]))
+        self.assertEqual(deleted(project=other_project.id), sorted([ids['elsewhere'], 999]))
+
+    def test_delta_older_than_window_asks_for_reset(self):
+        response = self.client.get(reverse('schedules'), {'since': '2000-01-01T00:00:00Z'})
+        self.assertTrue(response.data['reset'])
+
+    def test_bulk_delete_writes_tombstones_without_per_row_queries(self):
+        query_counts = []
+        for count in (2, 6):
+            schedules = [self._create_schedule(day) for day in range(1, count + 1)]
+            ids = [schedule.id for schedule in schedules]
+            with CaptureQueriesContext(connection) as queries:
+                self.assertEqual(delete_schedules(Schedule.objects.filter(id__in=ids)), count)
+            query_counts.append(len(queries.captured_queries))
+            self.assertFalse(Schedule.objects.filter(id__in=ids).exists())
+            self.assertEqual(ScheduleTombstone.objects.filter(schedule_id__in=ids).count(), count)
+        self.assertEqual(query_counts[0], query_counts[1])
+
+    @override_settings(SCHEDULE_DELTA_WINDOW_DAYS=7)
+    def test_prune_drops_tombstones_older_than_window(self):
+        old = ScheduleTombstone.objects.create(schedule_id=1)
+        recent = ScheduleTombstone.objects.create(schedule_id=2)
+        ScheduleTombstone.objects.filter(id=old.id).update(deleted_at=timezone.now() - timedelta(days=8))
+
+        self.assertEqual(ScheduleTombstone.prune(), 1)
+        self.assertEqual(list(ScheduleTombstone.objects.values_list('id', flat=True)), [recent.id])
+
+    def test_serializer_does_not_query_per_row(self):
+        url = reverse('schedules')
+        # First request loads per-process state (preferences etc.)
+        self.client.get(url, {'user': self.user.id})
+        query_counts = []
+        for day in range(1, 7):
+            schedule = self._create_schedule(day)
+            schedule.task = self.task
+            schedule.save()
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(url, {'user': self.user.id})
+            self.assertEqual(len(response.data), day)
+            query_counts.append(len(queries.captured_queries))
+        self.assertEqual(len(set(query_counts)), 1)
+
+@override_settings(SCHEDULE_CACHE_WARMUP_DELAY=0)
+class TestConditionalGet(ScheduleListTestCase):
+
+    def _revalidate(self, url, response):
+        return self.client.get(
+            url,
+            HTTP_IF_NONE_MATCH=response['ETag'],
+            HTTP_IF_MODIFIED_SINCE=response['Last-Modified']
+        )
+
+    def test_schedule_list_not_modified(self):
+        schedule = self._create_schedule(1)
+        url = reverse('schedules') + f'?timelineId={self.timeline.id}'
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotIn('no-store', response['Cache-Control'])
+
+        with patch('schedule.api_views.schedule.ScheduleSerializer') as mock_serializer:
+            not_modified = self._revalidate(url, response)
+        self.assertEqual(not_modified.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(not_modified['ETag'], response['ETag'])
+        mock_serializer.assert_not_called()
+
+        schedule.delete()
+        self.assertEqual(self._revalidate(url, response).status_code, status.HTTP_200_OK)
+
+    def test_schedule_list_etag_follows_filters(self):
+        self._create_schedule(1)
+        self.client.force_authenticate(self.user)
+        url = reverse('schedules')
+        response = self.client.get(url, {'user': self.user.id})
+        other = self.client.get(url, {'user': self.user.id + 1})
+        self.assertNotEqual(response['ETag'], other['ETag'])
+
+    def test_user_project_list_not_modified(self):
+        url = reverse('user-project-slots') + f'?timelineId={self.timeline.id}'
+        response = self.client.get(url)
+        self.assertEqual(len(response.data), 1)
+        self.assertEqual(self._revalidate(url, response).status_code, status.HTTP_304_NOT_MODIFIED)
+
+        self.user_project.active = False
+        self.user_project.save()
+        response = self._revalidate(url, response)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data[0]['slotted_projects'], [])
+
+
+@override_settings(SCHEDULE_CACHE_WARMUP_DELAY=0)
+class TestColumnarFormat(ScheduleListTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(self.user)
+
+    def _decode(self, data):
+        """Rebuild the row dicts from a columnar payload."""
+        rows = []
+        for index in range(data['count']):
+            row = {
+                field: values[index] for field, values in data['columns'].items()
+                if field not in data['lookups']
+            }
+            for name, table in data['lookups'].items():
+                position = data['columns'][name][index]
+                if position is not None:
+                    row.update({field: values[position] for field, values in table.items()})
+            rows.append(row)
+        return rows
+
+    def test_columnar_rows_round_trip(self):
+        rows = [
+            {'id': 1, 'user': 'a', 'project_id': 1, 'project_name': 'p', 'notes': ''},
+            {'id': 2, 'user': 'a', 'project_id': 2, 'project_name': 'q', 'notes': 'x'},
+            {'id': 3, 'user': 'b', 'project_id': 1, 'project_name': 'p', 'notes': ''},
+        ]
+        data = columnar_rows(rows)
+        self.assertEqual(data['lookups']['user'], {'user': ['a', 'b']})
+        self.assertEqual(data['columns']['project'], [0, 1, 0])
+        self.assertNotIn('task', data['lookups'])
+        self.assertEqual(self._decode(data), rows)
+
+    def test_schedule_list_columnar(self):
+        for day in range(1, 4):
+            self._create_schedule(day)
+        url = reverse('schedules')
+        rows = self.client.get(url).data
+        data = self.client.get(url, {'format': 'columnar'}).json()
+        self.assertEqual(data['count'], 3)
+        self.assertEqual(data['lookups']['project']['project_name'], ['project'])
+        self.assertEqual(self._decode(data), [dict(row) for row in rows])
+
+        response = self.client.get(
+            url, {'format': 'columnar'}, HTTP_ACCEPT='application/msgpack'
+        )
+        self.assertEqual(response['Content-Type'], 'application/msgpack')
+        self.assertEqual(msgpack.unpackb(response.content), data)
+
+    def test_weekly_and_export_columnar(self):
+        today = datetime.combine(date.today(), datetime.min.time(), tzinfo=utc)
+        monday = today - timedelta(days=today.weekday())
+        Schedule.objects.create(
+            user_project=self.user_project, start_time=monday, end_time=monday
+        )
+        response = self.client.get(reverse('weekly-schedules'), {'format': 'columnar'})
+        self.assertEqual(response.data['schedules']['count'], 2)
+        self.assertEqual(response.data['schedules']['columns']['duration'], [1, 4])
+
+        response = self.client.get(
+            reverse('schedule-csv-export', kwargs={'project_id': self.project.id}),
+            {'format': 'columnar'}
+        )
+        self.assertEqual(response.data['count'], 1)
+        self.assertEqual(response.data['lookups']['user']['user'], ['test test'])
+
+
+@override_settings(SCHEDULE_CACHE_WARMUP_DELAY=0)
+class TestUserProjectList(ScheduleListTestCase):
+
+    def _add_user(self, index):
+        user = get_user_model().objects.create(username=f'user{index}')
+        UserProjectSlot.objects.create(project=self.project, user=user, active=True)
+        UserProjectSlot.objects.create(project=self.project, user=user, active=False)
+        return user
+
+    def test_queries_do_not_grow_with_users(self):
+        url = reverse('user-project-slots') + f'?timelineId={self.timeline.id}'
+        self.client.get(url)
+        query_counts = []
+        for index in range(3):
+            self._add_user(index)
+            cache.clear()
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(url)
+            self.assertEqual(len(response.data), index + 2)
+            query_counts.append(len(queries.captured_queries))
+        self.assertEqual(len(set(query_counts)), 1)
+        self.assertEqual(
+            [len(user_data['slotted_projects']) for user_data in response.data],
+            [1, 1, 1, 1]
+        )
+
+    def test_cached_per_timeline_and_invalidated_by_slots(self):
+        other = self._add_user(0)
+        self.client.force_authenticate(other)
+        url = reverse('user-project-slots') + f'?timelineId={self.timeline.id}'
+        response = self.client.get(url)
+        self.assertEqual([user_data['user_id'] for user_data in response.data], [other.id, self.user.id])
+        with patch('schedule.api_views.user_projects.UserProjectSerializer') as mock_serializer:
+            cached = self.client.get(url)
+        mock_serializer.assert_not_called()
+        self.assertEqual(cached.data, response.data)
+
+        self.user_project.active = False
+        self.user_project.save()
+        response = self.client.get(url)
+        self.assertEqual(response.data[1]['slotted_projects'], [])
+
+        self.user.first_name = 'Renamed'
+        self.user.save()
+        response = self.client.get(url)
+        self.assertEqual(response.data[1]['user_name'], 'Renamed')
+
+    def test_invalidated_by_timeline_projects_and_project_rename(self):
+        url = reverse('user-project-slots') + f'?timelineId={self.timeline.id}'
+        response = self.client.get(url)
+        self.assertEqual([user_data['user_id'] for user_data in response.data], [self.user.id])
+        etag = response['ETag']
+
+        self.timeline.projects.remove(self.project)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, [])
+
+        self.project.publictimeline_set.add(self.timeline)
+        response = self.client.get(url)
+        self.assertEqual(response.data[0]['slotted_projects'][0]['project_name'], self.project.name)
+
+        self.project.name = 'Renamed project'
+        self.project.save()
+        response = self.client.get(url)
+        self.assertEqual(response.data[0]['slotted_projects'][0]['project_name'], 'Renamed project')
+
+    def test_timeline_schedule_list_invalidated_by_timeline_projects(self):
+        key = self._key(self.timeline.id)
+        self.timeline.projects.remove(self.project)
+        self.assertNotEqual(self._key(self.timeline.id), key)
+        other_key = self._key(self.other_timeline.id)
+        self.project.publictimeline_set.add(self.other_timeline)
+        self.assertNotEqual(self._key(self.other_timeline.id), other_key)
+
+
+class TestScheduleCSVExport(ScheduleListTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(self.user)
+        self.other_project = self.other_timeline.projects.first()
+        self.other_slot = UserProjectSlot.objects.create(
+            project=self.other_project, user=self.user, active=True
+        )
+        activity = Activity.objects.create(name='Leave')
+        start_time = datetime(2023, 3, 1, 22, tzinfo=utc)
+        self.schedules = [
+            Schedule.objects.create(
+                user_project=self.user_project, task=self.task, notes='a, "b"',
+                start_time=start_time, end_time=start_time + timedelta(days=2),
+                hours_per_day=3.5
+            ),
+            Schedule.objects.create(
+                user_project=self.user_project, activity=activity,
+                start_time=start_time + timedelta(days=40),
+                end_time=start_time + timedelta(days=40)
+            ),
+            Schedule.objects.create(
+                user_project=self.other_slot,
+                start_time=start_time + timedelta(days=400),
+                end_time=start_time + timedelta(days=401)
+            ),
+        ]
+
+    def _rows(self, url, params=None):
+        response = self.client.get(url, params or {})
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        return list(csv.reader(io.StringIO(
+            b''.join(response.streaming_content).decode()
+        )))
+
+    def _serialized_rows(self, schedules):
+        """Rows the way the export built them from ScheduleSerializer."""
+        rows = [CSV_EXPORT_HEADER]
+        for schedule in ScheduleSerializer(schedules, many=True).data:
+            date1 = datetime.fromisoformat(schedule['start_time'].replace('Z', '+00:00'))
+            date2 = datetime.fromisoformat(schedule['end_time'].replace('Z', '+00:00'))
+            rows.append([str(value) for value in [
+                schedule['project_name'],
+                schedule['user'],
+                schedule['task_name'],
+                schedule['start_time'].split('T')[0],
+                schedule['end_time'].split('T')[0],
+                (date2 - date1).days + 1,
+                schedule['notes'],
+                schedule['hours_per_day'] if schedule['hours_per_day'] else '7'
+            ]])
+        return rows
+
+    def test_matches_serializer_output(self):
+        url = reverse('schedule-csv-export', kwargs={'project_id': self.project.id})
+        self.assertEqual(self._rows(url), self._serialized_rows(self.schedules[:2]))
+
+        url = reverse('schedule-csv-export-user', kwargs={
+            'project_id': self.project.id, 'user_id': self.user.id + 1
+        })
+        self.assertEqual(self._rows(url), [CSV_EXPORT_HEADER])
+
+    def test_project_and_date_filters(self):
+        url = reverse('schedule-csv-export-all')
+        self.assertEqual(len(self._rows(url)), 4)
+        rows = self._rows(url, {'projects': f'{self.other_project.id}'})
+        self.assertEqual([row[0] for row in rows[1:]], ['other'])
+        rows = self._rows(url, {
+            'projects': f'{self.project.id},{self.other_project.id}',
+            'from': '2023-03-02', 'to': '2024-12-31'
+        })
+        self.assertEqual([row[2] for row in rows[1:]], ['Leave', '-'])
+
+        response = self.client.get(url, {'projects': 'one'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.get(url, {'to': '2023-02-30'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class TestIntervals(TestCase):
+
+    def test_merge_and_free(self):
+        busy = merge_intervals([
+            Interval(date(2023, 3, 8), date(2023, 3, 8)),
+            Interval(date(2023, 3, 1), date(2023, 3, 2)),
+            Interval(date(2023, 3, 3), date(2023, 3, 3)),
+            Interval(date(2023, 3, 2), date(2023, 3, 2)),
+        ])
+        self.assertEqual(busy, [
+            Interval(date(2023, 3, 1), date(2023, 3, 3)),
+            Interval(date(2023, 3, 8), date(2023, 3, 8)),
+        ])
+        window = Interval(date(2023, 2, 27), date(2023, 3, 17))
+        self.assertEqual(free_intervals(busy, window), [
+            Interval(date(2023, 2, 27), date(2023, 2, 28)),
+            Interval(date(2023, 3, 4), date(2023, 3, 7)),
+            Interval(date(2023, 3, 9), date(2023, 3, 17)),
+        ])
+        self.assertEqual(free_intervals(busy, window, workdays_only=True), [
+            Interval(date(2023, 2, 27), date(2023, 2, 28)),
+            Interval(date(2023, 3, 6), date(2023, 3, 7)),
+            Interval(date(2023, 3, 9), date(2023, 3, 10)),
+            Interval(date(2023, 3, 13), date(2023, 3, 17)),
+        ])
+
+
+class TestAvailability(ScheduleTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(self.user)
+        self.monday = datetime.combine(date.today(), datetime.min.time(), tzinfo=utc)
+        self.monday -= timedelta(days=self.monday.weekday())
+
+    def _schedule(self, day, days=1, **kwargs):
+        kwargs.setdefault('user_project', self.user_project)
+        return Schedule.objects.create(
+            start_time=self.monday + timedelta(days=day),
+            end_time=self.monday + timedelta(days=day + days - 1),
+            **kwargs
+        )
+
+    def test_weekly_schedules_with_free_days(self):
+        first = self._schedule(1, 2)
+        second = self._schedule(2)
+        response = self.client.get(reverse('weekly-schedules'))
+        self.assertEqual(response.data['dates'][0], str(self.monday.date()))
+        self.assertEqual(
+            [(row['id'], row['duration']) for row in response.data['schedules']],
+            [(None, 1), (first.id, 2), (second.id, 1), (None, 2)]
+        )
+
+    def test_team_availability(self):
+        other = get_user_model().objects.create(username='other', first_name='Ann')
+        self._schedule(0, 2)
+        self._schedule(8, user_project=None, user=self.user)
+        url = reverse('team-availability')
+        params = {
+            'users': f'{self.user.id},{other.id}',
+            'from': str(self.monday.date()),
+            'to': str((self.monday + timedelta(days=13)).date())
+        }
+        self.client.get(url, params)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, params)
+        # One query for the users and one for all of their schedules
+        self.assertEqual(len([
+            query for query in queries.captured_queries
+            if 'preferences' not in query['sql']
+        ]), 2)
+        users = {user['user_id']: user for user in response.data['users']}
+        self.assertEqual(
+            [(busy['start'], busy['days']) for busy in users[self.user.id]['busy']],
+            [(self.monday.date(), 2), ((self.monday + timedelta(days=8)).date(), 1)]
+        )
+        self.assertEqual([free['days'] for free in users[self.user.id]['free']], [3, 1, 3])
+        self.assertEqual([free['days'] for free in users[other.id]['free']], [5, 5])
+
+        response = self.client.get(url, {'from': '2023-01-10', 'to': '2023-01-01'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+@override_settings(SCHEDULE_CACHE_WARMUP_DELAY=0)
+class TestCapacityMatrix(ScheduleTestCase):
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.client.force_authenticate(self.user)
+        # Monday
+        self.start = datetime(2023, 3, 6, tzinfo=utc)
+        Schedule.objects.create(
+            user_project=self.user_project, hours_per_day=3,
+            start_time=self.start, end_time=self.start + timedelta(days=6)
+        )
+        Schedule.objects.create(
+            user_project=self.user_project,
+            start_time=self.start + timedelta(days=1),
+            end_time=self.start + timedelta(days=1)
+        )
+        leave = Activity.objects.create(name='Leave - Paid')
+        holiday = Activity.objects.create(name='Public holiday')
+        Schedule.objects.create(
+            user=self.user, activity=leave,
+            start_time=self.start + timedelta(days=2), end_time=self.start + timedelta(days=2)
+        )
+        Schedule.objects.create(
+            user=self.user, activity=holiday,
+            start_time=self.start + timedelta(days=7), end_time=self.start + timedelta(days=7)
+        )
+
+    def _get(self, **params):
+        params = {'from': '2023-03-06', 'to': '2023-03-14', **params}
+        return self.client.get(reverse('capacity'), params)
+
+    def test_matrix(self):
+        response = self._get()
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['days']), 9)
+        row = response.data['users'][0]
+        self.assertEqual(row['user_id'], self.user.id)
+        self.assertEqual(row['allocated'], [3, 10, 3, 3, 3, 0, 0, 0, 0])
+        self.assertEqual(row['leave'], [False, False, True] + [False] * 6)
+        self.assertEqual(row['holiday'], [False] * 7 + [True, False])
+        self.assertEqual(row['free'], [4, 0, 0, 4, 4, 0, 0, 0, 7])
+
+    def test_weeks_are_cached_until_schedules_change(self):
+        self._get()
+        with CaptureQueriesContext(connection) as queries:
+            self._get()
+        self.assertFalse(any('schedule_schedule' in query['sql'] for query in queries.captured_queries))
+
+        # Uncached weeks are read together in one query
+        with CaptureQueriesContext(connection) as queries:
+            self._get(**{'from': '2023-01-02', 'to': '2023-12-31'})
+        self.assertEqual(
+            len([query for query in queries.captured_queries if 'schedule_schedule' in query['sql']]),
+            1
+        )
+
+        Schedule.objects.create(
+            user_project=self.user_project,
+            start_time=self.start + timedelta(days=8),
+            end_time=self.start + timedelta(days=8)
+        )
+        self.assertEqual(self._get().data['users'][0]['allocated'][-1], 7)
+
+    def test_filters(self):
+        department = Department.objects.create(erp_id='dev', name='Dev')
+        Profile.objects.update_or_create(user=self.user, defaults={'department': department})
+        self.assertEqual(len(self._get(department=department.id).data['users']), 1)
+        self.assertEqual(len(self._get(department=department.id + 1).data['users']), 0)
+        self.assertEqual(len(self._get(business_unit=1).data['users']), 0)
+        self.assertEqual(self._get(department='x').status_code, status.HTTP_400_BAD_REQUEST)
+
+
+BASE_DAY = datetime(2023, 3, 1, tzinfo=utc)
+
+# Schedule blocks as (start day offset, duration in days); start days are unique
+# so the legacy queries' ordering is unambiguous.
+blocks = st.lists(
+    st.tuples(st.integers(0, 90), st.integers(0, 8)),
+    max_size=8,
+    unique_by=lambda block: block[0]
+)
+task_hours = st.tuples(st.integers(0, 600), st.integers(0, 600))
+day = st.integers(-10, 100)
+
+
+@override_settings(SCHEDULE_CACHE_WARMUP_DELAY=0)
+class TestTaskCountdownMatchesLegacy(HypothesisTestCase):
+    """TaskCountdown must number schedules exactly like the per-row functions."""
+
+    def _setup(self, hours, last_update_day, schedule_blocks):
+        project = Project.objects.create(name='project', is_active=True)
+        self.task = Task.objects.create(
+            name='test',
+            expected_time=hours[0],
+            actual_time=hours[1],
+            project=project
+        )
+        self.task.last_update = BASE_DAY + timedelta(days=last_update_day)
+        self.task.save(disable_auto_update=True)
+        user = get_user_model().objects.create(username='test')
+        user_project = UserProjectSlot.objects.create(
+            project=project, user=user, active=True
+        )
+        self.schedules = [
+            Schedule.objects.create(
+                task=self.task,
+                user_project=user_project,
+                start_time=BASE_DAY + timedelta(days=start),
+                end_time=BASE_DAY + timedelta(days=start + duration),
+                first_day_number=0,
+                last_day_number=0
+            )
+            for start, duration in schedule_blocks
+        ]
+
+    def _numbers(self):
+        return dict(
+            (schedule_id, (first, last)) for schedule_id, first, last in
+            Schedule.objects.values_list('id', 'first_day_number', 'last_day_number')
+        )
+
+    def _reset(self):
+        Schedule.objects.update(first_day_number=0, last_day_number=0)
+
+    @settings(max_examples=60, deadline=None)
+    @given(task_hours, day, blocks, day, st.integers(0, 8), st.booleans())
+    def test_remaining_days(self, hours, last_update_day, schedule_blocks,
+                            start_day, duration, exclude_first):
+        self._setup(hours, last_update_day, schedule_blocks)
+        start_time = BASE_DAY + timedelta(days=start_day)
+        end_time = start_time + timedelta(days=duration)
+        excluded = self.schedules[0] if exclude_first and self.schedules else None
+
+        self.assertEqual(
+            TaskCountdown(self.task).remaining_days(start_time, end_time, excluded),
+            calculate_remaining_task_days(self.task, start_time, end_time, excluded)
+        )
+
+    @settings(max_examples=60, deadline=None)
+    @given(task_hours, day, blocks, day, st.integers(-50, 50), st.booleans())
+    def test_update_subsequent_and_previous(self, hours, last_update_day, schedule_blocks,
+                                            start_day, day_number, exclude_first):
+        self._setup(hours, last_update_day, schedule_blocks)
+        start_time = BASE_DAY + timedelta(days=start_day)
+        excluded = self.schedules[0] if exclude_first and self.schedules else None
+
+        legacy_ids = update_subsequent_schedules(start_time, self.task.id, day_number, excluded)
+        legacy = self._numbers()
+        self._reset()
+        countdown = TaskCountdown(self.task)
+        self.assertEqual(countdown.update_subsequent(start_time, day_number, excluded), legacy_ids)
+        countdown.save()
+        self.assertEqual(self._numbers(), legacy)
+
+        self._reset()
+        excluded_ids = [excluded.id] if excluded else None
+        legacy_ids = update_previous_schedules(start_time, self.task.id, day_number, excluded_ids)
+        legacy = self._numbers()
+        self._reset()
+        countdown = TaskCountdown(self.task)
+        self.assertEqual(countdown.update_previous(start_time, day_number, excluded_ids or ()), legacy_ids)
+        countdown.save()
+        self.assertEqual(self._numbers(), legacy)
+
+    @settings(max_examples=60, deadline=None)
+    @given(task_hours, day, blocks.filter(bool), st.data())
+    def test_recount(self, hours, last_update_day, schedule_blocks, data):
+        self._setup(hours, last_update_day, schedule_blocks)
+        schedule = data.draw(st.sampled_from(self.schedules))
+
+        # The chain UpdateSchedule used to run, one query and save per schedule
+        start_time = schedule.start_time
+        remaining_task_days = calculate_remaining_task_days(
+            self.task, schedule.start_time, schedule.end_time
+        )
+        schedule.first_day_number = remaining_task_days
+        schedule.last_day_number = (
+            remaining_task_days - (schedule.end_time - schedule.start_time).days
+        )
+        schedule.save()
+        legacy_ids = update_subsequent_schedules(
+            start_time, self.task.id, schedule.last_day_number, schedule
+        )
+        if _naive(start_time) < _naive(self.task.last_update):
+            legacy_ids.append(schedule.id)
+            legacy_ids += update_previous_schedules(
+                start_time, self.task.id, remaining_task_days, legacy_ids
+            )
+        legacy = self._numbers()
+
+        self._reset()
+        countdown = TaskCountdown(self.task)
+        recounted = next(item for item in countdown.schedules if item.id == schedule.id)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(countdown.recount(recounted), legacy_ids)
+            countdown.save()
+        # The bulk update and the lookup of timelines to invalidate
+        self.assertLessEqual(len(queries), 2)
+        self.assertEqual(self._numbers(), legacy)
+
+
+@override_settings(SCHEDULE_CACHE_WARMUP_DELAY=0)
+@patch('schedule.countdown.invalidate_schedule_cache')
+class TestRecountTasks(ScheduleTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.other_user = get_user_model().objects.create(username='other')
+        self.other_slot = UserProjectSlot.objects.create(
+            project=self.project, user=self.other_user, active=True
+        )
+        self.other_task = Task.objects.create(
+            name='other', expected_time=70, actual_time=0, project=self.project
+        )
+
+    def create_schedule(self, slot, start_day, end_day, task=None):
+        return Schedule.objects.create(
+            task=task or self.task,
+            user_project=slot,
+            start_time=datetime(2022, 12, 1, tzinfo=utc) + timedelta(days=start_day),
+            end_time=datetime(2022, 12, 1, tzinfo=utc) + timedelta(days=end_day),
+            first_day_number=0,
+            last_day_number=0
+        )
+
+    def test_countdown_tasks(self, mock_invalidate):
+        self.create_schedule(self.user_project, 0, 2)
+        self.create_schedule(self.other_slot, 3, 4, task=self.other_task)
+        Task.objects.filter(id=self.task.id).update(last_update=datetime(2022, 1, 1, tzinfo=utc))
+
+        self.assertEqual(countdown_tasks(), sorted([self.task.id, self.other_task.id]))
+        self.assertEqual(countdown_tasks(user=self.other_user), [self.other_task.id])
+        self.assertEqual(
+            countdown_tasks(since=datetime(2022, 6, 1, tzinfo=utc)),
+            [self.other_task.id]
+        )
+
+    def test_shared_task_is_recounted_once_from_earliest_user_latest_schedule(self, mock_invalidate):
+        schedules = [
+            self.create_schedule(self.user_project, 0, 3),
+            self.create_schedule(self.other_slot, 20, 22),
+            self.create_schedule(self.user_project, 35, 38),
+            self.create_schedule(self.other_slot, 45, 46),
+        ]
+        expected = TaskCountdown(self.task)
+        anchor = next(item for item in expected.schedules if item.id == schedules[2].id)
+        expected.recount(anchor)
+
+        # Task and schedule loads, then one bulk update
+        with self.assertNumQueries(3):
+            updated = recount_tasks([self.task.id])
+
+        self.assertEqual(updated, len(expected.changed()))
+        self.assertEqual(
+            dict(Schedule.objects.values_list('id', 'last_day_number')),
+            {schedule.id: schedule.last_day_number for schedule in expected.schedules}
+        )
+        mock_invalidate.assert_called_once_with()
+
+    def test_matches_legacy_per_user_countdown(self, mock_invalidate):
+        # This user's only block is early, the other user's latest late: recounting
+        # only from the task's latest block would leave the earlier blocks stale.
+        Task.objects.filter(id=self.task.id).update(last_update=datetime(2022, 11, 1, tzinfo=utc))
+        self.create_schedule(self.user_project, 0, 2)
+        self.create_schedule(self.other_slot, 4, 6)
+        self.create_schedule(self.other_slot, 10, 13)
+        self.create_schedule(self.other_slot, 20, 21)
+
+        for user in get_user_model().objects.order_by('pk'):
+            update_schedule_countdown(user)
+        legacy = dict(Schedule.objects.values_list('id', 'first_day_number'))
+        Schedule.objects.update(first_day_number=0, last_day_number=0)
+
+        recount_tasks([self.task.id])
+        self.assertEqual(dict(Schedule.objects.values_list('id', 'first_day_number')), legacy)
+        self.assertNotIn(0, legacy.values())
+
+    def test_unchanged_tasks_are_not_written(self, mock_invalidate):
+        self.create_schedule(self.user_project, 0, 3)
+        recount_tasks([self.task.id])
+        mock_invalidate.reset_mock()
+
+        with self.assertNumQueries(2):
+            self.assertEqual(recount_tasks([self.task.id]), 0)
+        mock_invalidate.assert_not_called()
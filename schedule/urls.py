@@ -1,4 +1,5 @@
 from django.urls import path
+from schedule.api_views.availability import CapacityMatrix, TeamAvailability
 from schedule.api_views.user_projects import (
     UserProjectList,
     AddUserProjectSlot, RemoveUserProject
@@ -21,6 +22,12 @@ urlpatterns = [
     path('api/weekly-schedules/',
          WeeklyScheduleList.as_view(),
          name='weekly-schedules'),
+    path('api/team-availability/',
+         TeamAvailability.as_view(),
+         name='team-availability'),
+    path('api/capacity/',
+         CapacityMatrix.as_view(),
+         name='capacity'),
     path('api/add-user-project-slot/',
          AddUserProjectSlot.as_view(),
          name='add-user-project-slot'),
@@ -42,4 +49,7 @@ urlpatterns = [
     path('api/schedule/csv/<int:project_id>/',
          ScheduleCSVExport.as_view(),
          name='schedule-csv-export'),
+    path('api/schedule/csv/',
+         ScheduleCSVExport.as_view(),
+         name='schedule-csv-export-all'),
 ]
@@ -15,12 +15,13 @@ from timesheet.models.project_member import ProjectMember
 from timesheet.models.clock import Clock
 from timesheet.utils.erp import (
     push_timesheet_to_erp, pull_projects_from_erp, pull_user_data_from_erp,
-    pull_leave_data_from_erp, pull_holiday_list, generate_api_key as generate_api_key_from_erp
+    pull_leave_data_from_erp, pull_holiday_list, generate_api_key as generate_api_key_from_erp,
+    HolidayListCache
 )
 from timesheet.models.profile import Profile
 from timesheet.models.user_project import UserProject
 from timesheet.forms import ProfileForm
-from timesheet.utils.timelogs import split_timelog_by_description
+from timesheet.utils.timelogs import split_timelogs_by_description
 
 
 class TimesheetPreferencesForm(forms.ModelForm):
@@ -63,18 +64,19 @@ def generate_api_key(modeladmin, request, queryset: get_user_model()):
 
 @admin.action(description='Pull leave data')
 def pull_leave_data(modeladmin, request, queryset: get_user_model()):
+    holiday_lists = HolidayListCache()
     for user in queryset:
         if not user.profile.token and not user.profile.erpnext_oauth_token:
             continue
         pull_leave_data_from_erp(user)
-        pull_holiday_list(user)
+        pull_holiday_list(user, holiday_lists)
 
 
 @admin.action(description='Break timesheet')
 def trigger_break_timesheet_api(modeladmin, request, queryset):
-    total_created = 0
-    for timelog in queryset:
-        total_created += split_timelog_by_description(timelog)
+    total_created = len(
+        split_timelogs_by_description(queryset.select_related('parent'))
+    )
     messages.success(
         request,
         f"Split timelog successfully. {total_created} child timelog(s) created."
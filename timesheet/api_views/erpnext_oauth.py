@@ -14,6 +14,8 @@ from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
+from timesheet.utils.erp_client import get_erp_client
+
 User = get_user_model()
 
 logger = logging.getLogger(__name__)
@@ -80,7 +82,7 @@ class ERPNextOAuthCallbackView(APIView):
         }
 
         try:
-            response = requests.post(token_url, data=data)
+            response = get_erp_client().post(token_url, data=data)
         except requests.RequestException:
             logger.exception('Failed to exchange OAuth code')
             return Response(
@@ -132,7 +134,7 @@ class ERPNextOAuthDisconnectView(APIView):
                 f'/api/method/frappe.integrations.oauth2.revoke_token'
             )
             try:
-                requests.post(revoke_url, data={
+                get_erp_client().post(revoke_url, data={
                     'token': profile.erpnext_oauth_access_token,
                 })
             except requests.RequestException:
@@ -213,7 +215,7 @@ class ERPNextOAuthLoginCallbackView(APIView):
         )
 
         try:
-            response = requests.post(token_url, data=data)
+            response = get_erp_client().post(token_url, data=data)
         except requests.RequestException:
             logger.exception('Failed to exchange OAuth code for login')
             return Response(
@@ -244,7 +246,7 @@ class ERPNextOAuthLoginCallbackView(APIView):
             f'/api/method/frappe.integrations.oauth2.openid_profile'
         )
         try:
-            profile_response = requests.get(
+            profile_response = get_erp_client().get(
                 profile_url,
                 headers={'Authorization': f'Bearer {access_token}'},
             )
@@ -324,7 +326,7 @@ class ERPNextOAuthLoginCallbackView(APIView):
         )
         headers = {'Authorization': f'Bearer {access_token}'}
         try:
-            resp = requests.get(url, headers=headers)
+            resp = get_erp_client().get(url, headers=headers)
         except requests.RequestException:
             logger.exception('Failed to fetch employee data')
             return
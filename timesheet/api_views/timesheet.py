@@ -1,7 +1,6 @@
 import time
 from datetime import timedelta, datetime
 import pytz
-from bs4 import BeautifulSoup
 
 from django.contrib.auth import get_user_model
 from django.http import Http404, JsonResponse
@@ -18,22 +17,10 @@ from drf_spectacular.types import OpenApiTypes
 
 from timesheet.models import Timelog, Task, Activity, Project
 from timesheet.serializers.timesheet import TimelogSerializer
+from timesheet.utils.description import clean_description
 from timesheet.utils.erp import push_timesheet_to_erp
 from timesheet.utils.time import convert_time_to_user_timezone
-from timesheet.utils.timelogs import split_timelog_by_description
-
-
-def remove_empty_paragraphs(html):
-    """
-    Removes empty paragraphs (e.g., <p><br></p> or paragraphs that only contain whitespace)
-    from the given HTML string.
-    """
-    soup = BeautifulSoup(html, "html.parser")
-    for p in soup.find_all("p"):
-        # If the paragraph contains no non-whitespace text, remove it.
-        if not p.get_text(strip=True):
-            p.decompose()
-    return str(soup)
+from timesheet.utils.timelogs import split_timelog_by_description, split_timelogs_by_description
 
 
 class UserSerializer(serializers.Serializer):
@@ -92,7 +79,7 @@ class TimesheetSerializer(serializers.ModelSerializer):
         activity = validated_data.pop('activity')
         raw_description = validated_data.pop('description', None)
         if raw_description is not None:
-            instance.description = remove_empty_paragraphs(raw_description)
+            instance.description = clean_description(raw_description)
         project_data = validated_data.pop('project')
         task_id = task.get('id')
         instance.project = Project.objects.get(
@@ -128,6 +115,7 @@ class TimesheetSerializer(serializers.ModelSerializer):
                         ).update(
                             parent=first_child
                         )
+                        Timelog.rebuild_roots(instance.root_id or instance.id)
 
         if date_changed:
             return instance
@@ -146,6 +134,7 @@ class TimesheetSerializer(serializers.ModelSerializer):
                 id__in=related
             ).update(
                 description=instance.description,
+                description_text=instance.description_text,
                 task=instance.task,
                 activity=instance.activity
             )
@@ -160,7 +149,7 @@ class TimesheetSerializer(serializers.ModelSerializer):
         end_time = validated_data.get('end_time', None)
         activity = validated_data.pop('activity')
         raw_description = validated_data.pop('description', '')
-        description = remove_empty_paragraphs(raw_description)
+        description = clean_description(raw_description)
         parent = validated_data.pop('parent', None)
         _timezone = validated_data.pop('timezone', '')
 
@@ -349,7 +338,10 @@ When you create a timesheet without `end_time`, it starts a running timer that c
         self.perform_create(serializer)
         headers = self.get_success_headers(serializer.data)
         return Response(
-            TimelogSerializer(instance=serializer.instance, many=False).data,
+            TimelogSerializer(
+                instance=Timelog.objects.for_serializer().get(pk=serializer.instance.pk),
+                many=False
+            ).data,
             status=status.HTTP_201_CREATED,
             headers=headers)
 
@@ -369,7 +361,10 @@ When you create a timesheet without `end_time`, it starts a running timer that c
             # forcibly invalidate the prefetch cache on the instance.
             instance._prefetched_objects_cache = {}
         return Response(
-            TimelogSerializer(instance=serializer.instance, many=False).data)
+            TimelogSerializer(
+                instance=Timelog.objects.for_serializer().get(pk=serializer.instance.pk),
+                many=False
+            ).data)
 
     def get_serializer_context(self):
         """
@@ -403,7 +398,7 @@ class TimesheetViewSet(viewsets.ViewSet):
         start_of_week = today - timedelta(days=today.weekday())
         start_of_last_week = start_of_week - timedelta(days=7)
 
-        queryset = Timelog.objects.filter(
+        queryset = Timelog.objects.for_serializer().filter(
             user=self.request.user,
         ).order_by('-start_time')
         serializer = TimelogSerializer(queryset[:MAX_TIMELOGS], many=True)
@@ -441,6 +436,7 @@ class TimeLogDeleteAPIView(APIView):
                 timelog.children.all().exclude(
                     id=new_parent.id
                 ).update(parent=new_parent)
+                Timelog.rebuild_roots(timelog.root_id or timelog.id)
         timelog.delete()
         return Response(status=200)
 
@@ -527,6 +523,77 @@ class BreakTimesheet(APIView):
         )
 
 
+class BulkBreakTimesheet(APIView):
+    """
+    API endpoint for splitting many timesheet entries at once.
+    """
+    permission_classes = [IsAuthenticated]
+
+    @extend_schema(
+        summary="Break many timesheets into multiple entries",
+        description=(
+            "Splits the given timesheet entries, or every unsubmitted entry of this week, "
+            "into multiple entries based on bullet points in their descriptions. "
+            "All entries are split in one transaction."
+        ),
+        request={
+            'type': 'object',
+            'properties': {
+                'timelog_ids': {'type': 'array', 'items': {'type': 'integer'}},
+                'this_week': {'type': 'boolean', 'description': 'Split every unsubmitted timelog of this week'}
+            }
+        },
+        responses={
+            200: TimelogSerializer(many=True),
+            400: {
+                'type': 'object',
+                'properties': {
+                    'detail': {'type': 'string', 'description': 'Error message'}
+                }
+            }
+        }
+    )
+    def post(self, request):
+        timelogs = Timelog.objects.filter(
+            user=request.user
+        ).select_related('parent')
+        if request.data.get('this_week'):
+            today = timezone.localdate()
+            monday = today - timedelta(days=today.weekday())
+            timelogs = timelogs.filter(
+                submitted=False,
+                start_time__date__gte=monday,
+                start_time__date__lte=monday + timedelta(days=6)
+            )
+        else:
+            timelog_ids = request.data.get('timelog_ids')
+            try:
+                timelog_ids = [int(timelog_id) for timelog_id in timelog_ids]
+            except (TypeError, ValueError):
+                return Response(
+                    {"detail": "Provide timelog_ids as a list of ids, or this_week."},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            timelogs = timelogs.filter(id__in=timelog_ids)
+
+        created = split_timelogs_by_description(timelogs.order_by('start_time'))
+        if not created:
+            return Response(
+                {"detail": "Not enough bullet points found to split timelogs."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        return Response(
+            TimelogSerializer(
+                Timelog.objects.for_serializer().filter(
+                    id__in=[timelog.id for timelog in created]
+                ).order_by('start_time', 'id'),
+                many=True
+            ).data,
+            status=status.HTTP_200_OK
+        )
+
+
 class SubmitTimeLogsAPIView(APIView):
     """
     API endpoint for submitting time logs to ERP system.
@@ -534,9 +601,18 @@ class SubmitTimeLogsAPIView(APIView):
     @extend_schema(
         tags=['Timesheet'],
         summary="Submit time logs to ERP",
-        description="Submits all unsubmitted time logs for the authenticated user to the ERP system.",
+        description=(
+            "Submits all unsubmitted time logs for the authenticated user to the ERP system, "
+            "one Timesheet per project and week, and returns a per-project report."
+        ),
         responses={
             200: OpenApiResponse(description='Submitted successfully'),
+            502: OpenApiResponse(
+                description='Some time logs were not accepted by the ERP system',
+                response={'type': 'object', 'properties': {
+                    'failed': {'type': 'integer'}, 'report': {'type': 'object'}
+                }},
+            ),
             403: OpenApiResponse(
                 description='Submission unavailable',
                 response={'type': 'object', 'properties': {'error': {'type': 'string'}}},
@@ -558,8 +634,12 @@ class SubmitTimeLogsAPIView(APIView):
             user=self.request.user,
             submitted=False
         )
-        push_timesheet_to_erp(queryset, request.user)
-        return Response(status=200)
+        report = push_timesheet_to_erp(queryset, request.user)
+        failed = sum(project['failed'] for project in report.values())
+        return Response(
+            {'failed': failed, 'report': report},
+            status=status.HTTP_502_BAD_GATEWAY if failed else status.HTTP_200_OK
+        )
 
 
 @extend_schema(tags=['Timesheet'])
@@ -642,7 +722,7 @@ class PauseTimesheetAPIView(APIView):
         raw_description = request.data.get('description', None)
         description = None
         if raw_description is not None:
-            description = remove_empty_paragraphs(raw_description)
+            description = clean_description(raw_description)
 
         now = convert_time_to_user_timezone(
             timezone.now(), timelog.timezone
@@ -668,7 +748,8 @@ class PauseTimesheetAPIView(APIView):
                 descendant.id for descendant in root.get_all_descendants()
             ]
             Timelog.objects.filter(id__in=related_ids).update(
-                description=description
+                description=description,
+                description_text=timelog.description_text
             )
             root.refresh_from_db()
         root.is_paused = True
@@ -676,7 +757,8 @@ class PauseTimesheetAPIView(APIView):
 
         return Response(
             TimelogSerializer(
-                instance=root, many=False
+                instance=Timelog.objects.for_serializer().get(pk=root.pk),
+                many=False
             ).data,
             status=status.HTTP_200_OK
         )
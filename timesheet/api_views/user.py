@@ -16,7 +16,7 @@ from django.core.cache import cache
 from schedule.models import Schedule
 from timesheet.models.profile import Profile
 from timesheet.models.timelog import Timelog
-from timesheet.utils.erp import get_detailed_report_data
+from timesheet.utils.report_rows import get_detailed_report_rows
 from timesheet.utils.time import convert_time, convert_time_to_user_timezone
 
 CACHE_DURATION = 10
@@ -292,9 +292,10 @@ class UserLeaderBoard(APIView):
         start_date = str((end_date - timedelta(days=6))).split(' ')[0]
         end_date = str(end_date).split(' ')[0]
 
-        filters = f'{{"start_date":"{start_date}", "end_date": "{end_date}"}}'
-        detailed_report = get_detailed_report_data('', filters, self.request.user)[:-1]
-        for report in detailed_report[:-1]:
+        detailed_report = get_detailed_report_rows(
+            start_date=start_date, end_date=end_date, user=self.request.user
+        )
+        for report in detailed_report:
             employee = report['Employee Name']
             if employee not in active_employee_names:
                 continue
@@ -0,0 +1,86 @@
+import json
+import time
+
+import html2text
+from bs4 import BeautifulSoup
+from django.core.management.base import BaseCommand, CommandError
+
+from timesheet.models import Timelog
+from timesheet.utils.description import (
+    clean_description,
+    description_items,
+    description_to_text,
+)
+
+
+def _parse_per_read(html):
+    # What every ERP submission did per row before descriptions were pre-rendered
+    soup = BeautifulSoup(html, 'html.parser')
+    for p in soup.find_all('p'):
+        if not p.get_text(strip=True):
+            p.decompose()
+    converter = html2text.HTML2Text()
+    converter.ignore_links = False
+    return converter.handle(str(soup))
+
+
+class Command(BaseCommand):
+    help = (
+        'Time timelog description processing over a corpus of real descriptions: '
+        'parsing on every read against rendering once on save.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--file',
+            help='JSON file with a list of HTML descriptions. Defaults to the descriptions in the database.',
+        )
+        parser.add_argument(
+            '--limit',
+            type=int,
+            default=5000,
+            help='Number of descriptions to read from the database (default 5000).',
+        )
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=3,
+            help='Runs per measurement; the fastest is reported (default 3).',
+        )
+
+    def handle(self, *args, **options):
+        if options['file']:
+            try:
+                with open(options['file']) as corpus_file:
+                    corpus = [html for html in json.load(corpus_file) if html]
+            except (OSError, ValueError) as e:
+                raise CommandError(f'Could not read {options["file"]}: {e}')
+        else:
+            corpus = list(
+                Timelog.objects.exclude(description__isnull=True).exclude(
+                    description=''
+                ).order_by('-id').values_list('description', flat=True)[:options['limit']]
+            )
+        if not corpus:
+            raise CommandError('No descriptions to benchmark')
+        rendered = [description_to_text(html) for html in corpus]
+
+        timings = [
+            ('parse on read (before)', lambda: [_parse_per_read(html) for html in corpus]),
+            ('stored text on read', lambda: [text or '-' for text in rendered]),
+            ('clean on save', lambda: [clean_description(html) for html in corpus]),
+            ('render on save', lambda: [description_to_text(html) for html in corpus]),
+            ('split items', lambda: [description_items(html) for html in corpus]),
+        ]
+        size = sum(len(html) for html in corpus)
+        self.stdout.write(f'{len(corpus)} descriptions, {size / 1024:.0f} KiB')
+        for name, run in timings:
+            best = None
+            for _ in range(max(options['repeat'], 1)):
+                start = time.perf_counter()
+                run()
+                elapsed = time.perf_counter() - start
+                best = elapsed if best is None else min(best, elapsed)
+            self.stdout.write(
+                f'{name:<24} {best * 1000:9.1f} ms  {best * 1e6 / len(corpus):8.1f} us/description'
+            )
@@ -1,68 +1,42 @@
-from django.contrib.auth import get_user_model
-from django.core.management.base import BaseCommand
+from datetime import datetime
 
-from schedule.models import Schedule
-from schedule.api_views.schedule import (
-    update_previous_schedules, calculate_remaining_task_days,
-    update_subsequent_schedules, _naive
-)
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from schedule.countdown import countdown_tasks, recount_tasks
 
 
 class Command(BaseCommand):
     help = 'Update schedule countdown'
 
-    def update_schedule_countdown(self, user):
-        schedules = Schedule.objects.filter(
-            user_project__user=user
-        ).order_by('-start_time')
-        updated_tasks = []
-        for schedule in schedules:
-            if not schedule.task:
-                continue
-            if schedule.task.id in updated_tasks:
-                continue
-            updated_tasks.append(
-                schedule.task.id
-            )
-            start_time = _naive(schedule.start_time)
-            end_time = _naive(schedule.end_time)
-            last_update = _naive(schedule.task.last_update)
-
-            remaining_task_days = calculate_remaining_task_days(
-                schedule.task,
-                start_time,
-                end_time
-            )
-            print('updating schedule {user} : {task} - {remaining_days}'.format(
-                user=user.username,
-                task=schedule.task.name,
-                remaining_days=remaining_task_days
-            ))
-            last_day_number = (
-                remaining_task_days - (schedule.end_time - schedule.start_time).days
-            )
-            schedule.first_day_number = remaining_task_days
-            schedule.last_day_number = last_day_number
-            schedule.save()
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--since',
+            metavar='DATETIME',
+            help='Only recount tasks whose last_update is at or after this date or datetime.',
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=1,
+            help='Number of processes to recount tasks in. Defaults to 1.',
+        )
 
-            updated = update_subsequent_schedules(
-                start_time=start_time,
-                task_id=schedule.task.id,
-                last_day_number=last_day_number,
-                excluded_schedule=schedule
-            )
-            if start_time < last_update:
-                excluded_schedules = updated
-                excluded_schedules.append(schedule.id)
-                updated_previous = update_previous_schedules(
-                    start_time,
-                    schedule.task.id,
-                    remaining_task_days,
-                    excluded_schedules=excluded_schedules
-                )
-                updated += updated_previous
+    def _parse_since(self, value):
+        if not value:
+            return None
+        since = parse_datetime(value)
+        if since is None:
+            day = parse_date(value)
+            if day is None:
+                raise CommandError(f'Invalid --since value "{value}".')
+            since = datetime.combine(day, datetime.min.time())
+        if timezone.is_naive(since):
+            since = timezone.make_aware(since)
+        return since
 
     def handle(self, *args, **options):
-        users = get_user_model().objects.all()
-        for user in users:
-            self.update_schedule_countdown(user)
+        task_ids = countdown_tasks(since=self._parse_since(options['since']))
+        updated = recount_tasks(task_ids, workers=options['workers'])
+        self.stdout.write(f'{updated} schedule(s) updated across {len(task_ids)} task(s)')
@@ -1,25 +1,47 @@
 import logging
 import time
+from datetime import timedelta
+from functools import partial
 
+from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.core.management.base import BaseCommand, CommandError
 from django.utils import timezone
 
+from schedule.countdown import countdown_tasks, recount_tasks
+from schedule.cache import invalidate_schedule_cache, schedule_cache_batch
+from schedule.models import ScheduleTombstone
+from timesheet.enums.doctype import DocType
+from timesheet.models.erp_sync import ErpSyncState
 from timesheet.models.project import Project
 from timesheet.models.project_member import ProjectMember
 from timesheet.models.user_project import UserProject
-from pmo_dashboard.billable_sync import fetch_and_save_billable_hours
+from pmo_dashboard.billable_sync import sync_company_billable_hours
 from timesheet.utils.erp import (
+    HolidayListCache,
     ProjectsNotFound,
-    pull_department_from_erp,
-    pull_holiday_list,
-    pull_leave_data_from_erp,
+    fetch_departments,
+    fetch_employee_data,
+    fetch_leave_data,
+    fetch_public_holidays,
+    leave_watermark,
     pull_project_members_from_erp,
     pull_projects_only_from_erp,
     pull_tasks_from_erp,
-    pull_user_data_from_erp,
-    update_schedule_countdown,
+    save_departments,
+    save_leave_data,
+    save_public_holidays,
+    save_user_data,
 )
+from timesheet.utils.erpnext_oauth import get_valid_oauth_token
+from timesheet.utils.report_rows import (
+    REPORT_NAME,
+    fetch_report_sync,
+    report_full_sync_due,
+    report_rows_synced,
+    save_report_rows,
+)
+from timesheet.utils.sync_graph import PhaseSkipped, SyncGraph
 
 logger = logging.getLogger(__name__)
 User = get_user_model()
@@ -34,11 +56,61 @@ class Command(BaseCommand):
             metavar='USERNAME',
             help='Django username whose ERPNext token to use for PMO sync. Defaults to the global ERPNEXT_TOKEN.',
         )
+        parser.add_argument(
+            '--incremental',
+            action='store_true',
+            help=(
+                'Only fetch projects, tasks and leave modified since the last successful sync. '
+                'Falls back to a full sync every ERPNEXT_FULL_SYNC_INTERVAL_HOURS.'
+            ),
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=settings.ERPNEXT_SYNC_WORKERS,
+            help='Maximum number of concurrent ERPNext fetches. Defaults to ERPNEXT_SYNC_WORKERS.',
+        )
+        parser.add_argument(
+            '--countdown-workers',
+            type=int,
+            default=1,
+            help='Number of processes to recount schedule countdowns in. Defaults to 1 (in-process).',
+        )
 
     def handle(self, *args, **options):
         pmo_user = self._resolve_user(options['user'])
-        self._sync_pmo(pmo_user)
-        self._sync_per_user()
+        if pmo_user:
+            get_valid_oauth_token(pmo_user)
+        incremental = options['incremental'] and not self._full_sync_due()
+        if options['incremental'] and not incremental:
+            self.stdout.write('Full reconciliation due — running a full sync.')
+
+        # Network fetches run concurrently; every DB write is applied on this thread.
+        graph = SyncGraph(max_workers=options['workers'])
+        self._add_pmo_phases(graph, pmo_user, incremental)
+        self._add_per_user_phases(graph, incremental)
+        self._add_report_rows_phase(graph)
+        since = timezone.now() if incremental else None
+
+        t0 = time.perf_counter()
+        # Leave, holiday and countdown writes touch thousands of schedules; flush the cache once.
+        with schedule_cache_batch():
+            timings = graph.run()
+            # Only recount once the graph has drained: forking countdown workers
+            # while fetch threads still hold locks can deadlock.
+            timings['countdown'] = self._run_countdown(since, options['countdown_workers'])
+        pruned = ScheduleTombstone.prune()
+        if pruned:
+            self.stdout.write(f'  tombstones {pruned} pruned')
+        self._write_timings(timings)
+        self.stdout.write(self.style.SUCCESS(f'ERP sync done in {time.perf_counter() - t0:.2f}s'))
+
+    def _full_sync_due(self):
+        interval = timedelta(hours=settings.ERPNEXT_FULL_SYNC_INTERVAL_HOURS)
+        return any(
+            ErpSyncState.full_sync_due(doctype.value, interval)
+            for doctype in (DocType.PROJECT, DocType.TASK)
+        )
 
     def _resolve_user(self, username):
         if not username:
@@ -48,44 +120,142 @@ class Command(BaseCommand):
         except User.DoesNotExist:
             raise CommandError(f'User "{username}" does not exist.')
 
-    def _sync_pmo(self, user):
-        self.stdout.write('── PMO sync ──────────────────────────────────────')
-        t0 = time.perf_counter()
+    def _add_pmo_phases(self, graph, user, incremental):
+        synced = {'projects': []}
 
-        try:
-            updated_ids = pull_projects_only_from_erp(user, filters='[["status", "=", "Open"]]')
-        except ProjectsNotFound:
-            self.stdout.write(self.style.WARNING('No open projects returned from ERPNext — skipping PMO sync.'))
-            return
+        def projects():
+            if incremental:
+                updated_ids = pull_projects_only_from_erp(user, incremental=True)
+                self.stdout.write(f'  projects   {len(updated_ids)} changed')
+                synced['projects'] = list(Project.objects.filter(id__in=updated_ids, is_active=True))
+            else:
+                try:
+                    updated_ids = pull_projects_only_from_erp(
+                        user, filters='[["status", "=", "Open"]]', record_watermark=True
+                    )
+                except ProjectsNotFound:
+                    self.stdout.write(self.style.WARNING('No open projects returned from ERPNext — skipping PMO sync.'))
+                    raise PhaseSkipped
+                stale = Project.objects.filter(is_active=True).exclude(id__in=updated_ids).update(is_active=False)
+                self.stdout.write(f'  projects   {len(updated_ids)} updated, {stale} deactivated')
+                synced['projects'] = list(Project.objects.filter(is_active=True))
+            Project.objects.filter(id__in=updated_ids).update(last_synced_at=timezone.now())
+
+            # Billable hours accrue from timesheets, not project edits, so every active
+            # project is refreshed, even incrementally: summed from the cached report
+            # rows once this run's report_rows phase has brought them up to date.
+            active_projects = list(Project.objects.filter(is_active=True))
+            graph.add(
+                'billable',
+                apply=partial(self._save_billable_hours, projects=active_projects),
+                requires=('tasks',),
+                after=('report_rows',),
+            )
+
+        def tasks():
+            if incremental:
+                counts = pull_tasks_from_erp(user, synced['projects'], incremental=True)
+            else:
+                counts = pull_tasks_from_erp(user, synced['projects'], record_watermark=True)
+            self.stdout.write(
+                f"  tasks      {counts['created']} created, {counts['updated']} updated, "
+                f"{counts['deactivated']} deactivated"
+            )
+            if counts['created'] or counts['updated'] or counts['deactivated']:
+                # Schedule lists show task names and hours
+                invalidate_schedule_cache()
+
+        def members():
+            if incremental:
+                pull_project_members_from_erp(user, incremental=True)
+            else:
+                pull_project_members_from_erp(
+                    user, project_names=[p.name for p in synced['projects']], record_watermark=True
+                )
+
+        graph.add('projects', apply=projects)
+        graph.add('tasks', apply=tasks, requires=('projects',))
+        graph.add('members', apply=members, requires=('projects',))
+        graph.add('user_projects', apply=self._sync_user_projects_from_members, requires=('members',))
 
-        stale = Project.objects.filter(is_active=True).exclude(id__in=updated_ids).update(is_active=False)
-        Project.objects.filter(id__in=updated_ids).update(last_synced_at=timezone.now())
-        t1 = time.perf_counter()
-        self.stdout.write(f'  projects   {len(updated_ids)} updated, {stale} deactivated  ({t1 - t0:.2f}s)')
+    def _save_billable_hours(self, projects):
+        if not report_rows_synced():
+            self.stdout.write(self.style.WARNING('Report rows not cached yet — skipping billable hours.'))
+            raise PhaseSkipped
+        updated = sync_company_billable_hours(projects)
+        self.stdout.write(f'  billable   {updated} task(s) updated across {len(projects)} project(s)')
+
+    def _add_per_user_phases(self, graph, incremental=False):
+        # Resolve OAuth tokens here, before any fetch starts, so expired tokens are
+        # refreshed (and saved) on this thread rather than by the fetch workers.
+        users = [
+            user for user in User.objects.filter(is_active=True).select_related('profile')
+            if user.profile.api_secret or get_valid_oauth_token(user)
+        ]
+        if not users:
+            return
 
-        active_projects = list(Project.objects.filter(is_active=True))
+        graph.add('departments', fetch=partial(fetch_departments, users[0]), apply=save_departments)
+        holiday_lists = HolidayListCache()
 
-        pull_tasks_from_erp(user, active_projects)
-        t2 = time.perf_counter()
-        self.stdout.write(f'  tasks      {t2 - t1:.2f}s')
+        for user in users:
+            key = user.username
+            since = leave_watermark(user) if incremental else ''
+            graph.add(
+                f'user_data:{key}',
+                fetch=partial(fetch_employee_data, user),
+                apply=partial(save_user_data, user),
+                after=('departments',),
+                group='user_data',
+            )
+            graph.add(
+                f'leave:{key}',
+                fetch=partial(fetch_leave_data, user, since=since),
+                apply=partial(save_leave_data, user, since=since),
+                after=(f'user_data:{key}',),
+                group='leave',
+            )
+            graph.add(
+                f'holidays:{key}',
+                fetch=partial(fetch_public_holidays, user, holiday_lists),
+                apply=partial(save_public_holidays, user),
+                after=(f'user_data:{key}',),
+                group='holidays',
+            )
 
-        for project in active_projects:
-            try:
-                fetch_and_save_billable_hours(project.name)
-            except Exception:
-                logger.warning('billable sync failed for %s', project.name, exc_info=True)
-        t3 = time.perf_counter()
-        self.stdout.write(f'  billable   {t3 - t2:.2f}s')
+    def _run_countdown(self, since=None, workers=1):
+        # Each task's chain is recounted once, however many users share it
+        start = time.perf_counter()
+        task_ids = countdown_tasks(since=since)
+        updated = recount_tasks(task_ids, workers=workers)
+        self.stdout.write(f'  countdown  {updated} schedule(s) updated across {len(task_ids)} task(s)')
+        return start, time.perf_counter(), 1
 
-        pull_project_members_from_erp(user, project_names=[p.name for p in active_projects])
-        t4 = time.perf_counter()
-        self.stdout.write(f'  members    {t4 - t3:.2f}s')
+    def _add_report_rows_phase(self, graph):
+        # Refresh the trailing window, stretched back to any Timesheet edited in
+        # ERPNext since the last run; backfill the whole history when due.
+        graph.add(
+            'report_rows',
+            fetch=partial(
+                fetch_report_sync,
+                full=report_full_sync_due(),
+                since=ErpSyncState.get_watermark(REPORT_NAME),
+            ),
+            apply=self._save_report_rows,
+        )
 
-        self._sync_user_projects_from_members()
-        t5 = time.perf_counter()
-        self.stdout.write(f'  user_projects  {t5 - t4:.2f}s')
+    def _save_report_rows(self, sync):
+        saved = save_report_rows(
+            sync['rows'], sync['start_date'], sync['end_date'],
+            full=sync['full'],
+            last_modified=sync['last_modified'],
+        )
+        self.stdout.write(f"  report     {saved} row(s) cached for {sync['start_date']}..{sync['end_date']}")
 
-        self.stdout.write(self.style.SUCCESS(f'PMO sync done in {t5 - t0:.2f}s'))
+    def _write_timings(self, timings):
+        self.stdout.write('── Timings ───────────────────────────────────────')
+        for group, (start, end, count) in timings.items():
+            self.stdout.write(f'  {group:<14} {count:>4} phase(s)  {end - start:.2f}s')
 
     def _sync_user_projects_from_members(self):
         """Create UserProject records to mirror ProjectMember assignments."""
@@ -99,25 +269,3 @@ class Command(BaseCommand):
                 created += 1
         if created:
             self.stdout.write(f'    created {created} new UserProject record(s) from member assignments')
-
-    def _sync_per_user(self):
-        self.stdout.write('── Per-user sync ─────────────────────────────────')
-        users = User.objects.filter(is_active=True)
-        department_synced = False
-
-        for user in users:
-            if not (user.profile.api_secret or user.profile.erpnext_oauth_token):
-                continue
-
-            self.stdout.write(f'  {user.username}')
-
-            if not department_synced:
-                pull_department_from_erp(user)
-                department_synced = True
-
-            pull_leave_data_from_erp(user)
-            pull_holiday_list(user)
-            update_schedule_countdown(user)
-            pull_user_data_from_erp(user)
-
-        self.stdout.write(self.style.SUCCESS('Per-user sync done'))
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('timesheet', '0041_add_billable_hours_to_task'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ErpSyncState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('doctype', models.CharField(max_length=100)),
+                ('scope', models.CharField(blank=True, default='', help_text='Optional sub-key for per-user doctypes, e.g. a user id', max_length=255)),
+                ('last_modified', models.CharField(blank=True, default='', help_text='Highest ERPNext modified value synced, as returned by ERPNext', max_length=32)),
+                ('last_synced_at', models.DateTimeField(blank=True, null=True)),
+                ('last_full_sync_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'unique_together': {('doctype', 'scope')},
+            },
+        ),
+    ]
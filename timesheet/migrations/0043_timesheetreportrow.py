@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('timesheet', '0042_erpsyncstate'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TimesheetReportRow',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('employee_id', models.CharField(blank=True, default='', max_length=255)),
+                ('employee_name', models.CharField(blank=True, default='', max_length=255)),
+                ('project', models.CharField(blank=True, default='', help_text='ERPNext project name', max_length=512)),
+                ('task', models.CharField(blank=True, default='', help_text='ERPNext task ID', max_length=256)),
+                ('activity', models.CharField(blank=True, default='', max_length=255)),
+                ('hours', models.FloatField(default=0.0)),
+                ('billable_hours', models.FloatField(default=0.0)),
+                ('costing', models.FloatField(default=0.0)),
+                ('billing', models.FloatField(default=0.0)),
+                ('description', models.TextField(blank=True, default='')),
+                ('data', models.JSONField(help_text='The report row exactly as returned by ERPNext')),
+            ],
+            options={
+                'ordering': ['date', 'id'],
+                'indexes': [models.Index(fields=['project', 'date'], name='timesheet_t_project_3bbbe4_idx'), models.Index(fields=['employee_id', 'date'], name='timesheet_t_employe_d9004b_idx'), models.Index(fields=['date'], name='timesheet_t_date_5b7041_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:39
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def set_timelog_roots(apps, schema_editor):
+    Timelog = apps.get_model('timesheet', 'Timelog')
+    parents = dict(Timelog.objects.values_list('id', 'parent_id'))
+    roots = {}
+    for timelog_id in parents:
+        chain = []
+        node_id = timelog_id
+        while node_id not in roots:
+            parent_id = parents.get(node_id)
+            if parent_id is None or parent_id in chain or parent_id == node_id:
+                roots[node_id] = node_id
+                break
+            chain.append(node_id)
+            node_id = parent_id
+        for chained_id in chain:
+            roots[chained_id] = roots[node_id]
+    Timelog.objects.bulk_update([
+        Timelog(id=timelog_id, root_id=root_id)
+        for timelog_id, root_id in roots.items() if root_id != timelog_id
+    ], ['root'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('timesheet', '0043_timesheetreportrow'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='timelog',
+            name='root',
+            field=models.ForeignKey(blank=True, help_text='Parentless ancestor of this timelog, empty for roots', null=True, on_delete=django.db.models.deletion.CASCADE, related_name='tree', to='timesheet.timelog'),
+        ),
+        migrations.RunPython(set_timelog_roots, migrations.RunPython.noop),
+    ]
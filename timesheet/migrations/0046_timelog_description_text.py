@@ -0,0 +1,52 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:49
+
+import html2text
+from django.db import migrations, models
+
+
+def description_to_text(html):
+    # Frozen copy of timesheet.utils.description.description_to_text, so later
+    # changes to the helper don't change what this migration writes.
+    if not html:
+        return ''
+    converter = html2text.HTML2Text()
+    converter.ignore_links = False
+    return converter.handle(html)
+
+
+def render_descriptions(apps, schema_editor):
+    Timelog = apps.get_model('timesheet', 'Timelog')
+    # Logs split from one description share it, render each text once
+    rendered = {}
+    batch = []
+    timelogs = Timelog.objects.exclude(
+        description__isnull=True
+    ).exclude(description='').only('id', 'description')
+    for timelog in timelogs.iterator(chunk_size=2000):
+        if len(rendered) > 10000:
+            rendered.clear()
+        if timelog.description not in rendered:
+            rendered[timelog.description] = description_to_text(timelog.description)
+        timelog.description_text = rendered[timelog.description]
+        batch.append(timelog)
+        if len(batch) >= 500:
+            Timelog.objects.bulk_update(batch, ['description_text'])
+            batch = []
+    if batch:
+        Timelog.objects.bulk_update(batch, ['description_text'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('timesheet', '0045_timesheetsubmission'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='timelog',
+            name='description_text',
+            field=models.TextField(blank=True, default='', editable=False, help_text='Plain text (markdown) rendering of the description, kept in sync on save'),
+        ),
+        migrations.RunPython(render_descriptions, migrations.RunPython.noop),
+    ]
@@ -7,3 +7,5 @@ from timesheet.models.preferences import *
 from timesheet.models.clock import *
 from timesheet.models.summary import *
 from timesheet.models.department import Department
+from timesheet.models.erp_sync import ErpSyncState, TimesheetSubmission
+from timesheet.models.report_row import TimesheetReportRow
@@ -0,0 +1,145 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import models
+from django.utils import timezone
+
+
+class ErpSyncState(models.Model):
+    """High-water mark of the ERPNext `modified` timestamp synced per doctype."""
+
+    doctype = models.CharField(
+        max_length=100
+    )
+
+    scope = models.CharField(
+        help_text='Optional sub-key for per-user doctypes, e.g. a user id',
+        max_length=255,
+        default='',
+        blank=True
+    )
+
+    last_modified = models.CharField(
+        help_text='Highest ERPNext modified value synced, as returned by ERPNext',
+        max_length=32,
+        default='',
+        blank=True
+    )
+
+    last_synced_at = models.DateTimeField(
+        null=True,
+        blank=True
+    )
+
+    last_full_sync_at = models.DateTimeField(
+        null=True,
+        blank=True
+    )
+
+    @classmethod
+    def get_watermark(cls, doctype: str, scope: str = '') -> str:
+        state = cls.objects.filter(doctype=doctype, scope=scope).first()
+        return state.last_modified if state else ''
+
+    @classmethod
+    def advance(cls, doctype: str, last_modified: str = '', scope: str = '', full: bool = False):
+        """Record a successful sync, moving the watermark forward only."""
+        state, _ = cls.objects.get_or_create(doctype=doctype, scope=scope)
+        if last_modified and last_modified > state.last_modified:
+            state.last_modified = last_modified
+        state.last_synced_at = timezone.now()
+        if full:
+            state.last_full_sync_at = state.last_synced_at
+        state.save()
+        return state
+
+    @classmethod
+    def full_sync_due(cls, doctype: str, interval: timedelta, scope: str = '') -> bool:
+        state = cls.objects.filter(doctype=doctype, scope=scope).first()
+        if not state or not state.last_full_sync_at or not state.last_modified:
+            return True
+        return state.last_full_sync_at <= timezone.now() - interval
+
+    def __str__(self):
+        if self.scope:
+            return f'{self.doctype} [{self.scope}] - {self.last_modified}'
+        return f'{self.doctype} - {self.last_modified}'
+
+    class Meta:
+        unique_together = ('doctype', 'scope')
+
+
+class TimesheetSubmission(models.Model):
+    """One Timesheet document pushed to ERPNext: a user's logs of a project in one week.
+
+    The key is derived from the user, project, week and timelog ids, and is
+    written into the document's note, so a retried submission of the same
+    batch is recognised instead of creating a second Timesheet.
+    """
+
+    PENDING = 'pending'
+    SUBMITTED = 'submitted'
+    FAILED = 'failed'
+    STATUS_CHOICES = (
+        (PENDING, 'Pending'),
+        (SUBMITTED, 'Submitted'),
+        (FAILED, 'Failed'),
+    )
+
+    key = models.CharField(
+        help_text='Idempotency key of the batch',
+        max_length=64,
+        unique=True
+    )
+
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE
+    )
+
+    project_name = models.CharField(
+        max_length=512,
+        default='',
+        blank=True
+    )
+
+    week = models.DateField(
+        help_text='Monday of the submitted week'
+    )
+
+    timelog_count = models.PositiveIntegerField(
+        default=0
+    )
+
+    status = models.CharField(
+        max_length=16,
+        choices=STATUS_CHOICES,
+        default=PENDING
+    )
+
+    erp_name = models.CharField(
+        help_text='Name of the Timesheet document in ERPNext',
+        max_length=255,
+        default='',
+        blank=True
+    )
+
+    error = models.TextField(
+        default='',
+        blank=True
+    )
+
+    attempts = models.PositiveIntegerField(
+        default=0
+    )
+
+    created_at = models.DateTimeField(
+        auto_now_add=True
+    )
+
+    updated_at = models.DateTimeField(
+        auto_now=True
+    )
+
+    def __str__(self):
+        return f'{self.user} - {self.project_name} - {self.week} ({self.status})'
@@ -0,0 +1,68 @@
+from django.db import models
+
+
+class TimesheetReportRow(models.Model):
+    """Local copy of one ERPNext "Timesheet Detailed Report" row.
+
+    Kept fresh by the report row sync so dashboards can range-query hours
+    instead of re-running the report on ERPNext for every page view.
+    """
+
+    date = models.DateField()
+
+    employee_id = models.CharField(
+        max_length=255,
+        default='',
+        blank=True
+    )
+
+    employee_name = models.CharField(
+        max_length=255,
+        default='',
+        blank=True
+    )
+
+    project = models.CharField(
+        help_text='ERPNext project name',
+        max_length=512,
+        default='',
+        blank=True
+    )
+
+    task = models.CharField(
+        help_text='ERPNext task ID',
+        max_length=256,
+        default='',
+        blank=True
+    )
+
+    activity = models.CharField(
+        max_length=255,
+        default='',
+        blank=True
+    )
+
+    hours = models.FloatField(default=0.0)
+    billable_hours = models.FloatField(default=0.0)
+    costing = models.FloatField(default=0.0)
+    billing = models.FloatField(default=0.0)
+
+    description = models.TextField(
+        default='',
+        blank=True
+    )
+
+    data = models.JSONField(
+        help_text='The report row exactly as returned by ERPNext'
+    )
+
+    def __str__(self):
+        return f'{self.date} {self.employee_name} - {self.project} ({self.hours}h)'
+
+    class Meta:
+        ordering = ['date', 'id']
+        indexes = [
+            models.Index(fields=['project', 'date']),
+            models.Index(fields=['employee_id', 'date']),
+            models.Index(fields=['date']),
+        ]
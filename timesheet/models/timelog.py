@@ -1,12 +1,28 @@
+from collections import defaultdict, deque
+
 from django.conf import settings
 from django.db import models
+from django.db.models import DEFERRED
 from django.utils import timezone
 
 import pytz
 
+from timesheet.utils.description import description_to_text
+
 TIMEZONES = tuple(zip(pytz.all_timezones, pytz.all_timezones))
 
 
+class TimelogQuerySet(models.QuerySet):
+    def for_serializer(self):
+        """
+        Join in everything TimelogSerializer reads per row. Tree aggregates
+        are loaded separately, once per list (see TimelogTree.of).
+        """
+        return self.select_related(
+            'user__profile', 'task__project', 'project', 'activity'
+        )
+
+
 class Timelog(models.Model):
 
     user = models.ForeignKey(
@@ -40,6 +56,13 @@ class Timelog(models.Model):
         blank=True
     )
 
+    description_text = models.TextField(
+        help_text='Plain text (markdown) rendering of the description, kept in sync on save',
+        default='',
+        blank=True,
+        editable=False
+    )
+
     start_time = models.DateTimeField(
         default=timezone.now
     )
@@ -74,30 +97,191 @@ class Timelog(models.Model):
         related_name='children'
     )
 
+    root = models.ForeignKey(
+        'self',
+        help_text='Parentless ancestor of this timelog, empty for roots',
+        null=True,
+        blank=True,
+        on_delete=models.CASCADE,
+        related_name='tree'
+    )
+
+    objects = TimelogQuerySet.as_manager()
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_root_id = instance.__dict__.get('root_id')
+        instance._loaded_description = instance.__dict__.get('description', DEFERRED)
+        return instance
+
+    def render_description(self):
+        """Refresh description_text if the description changed since it was loaded."""
+        if 'description' not in self.__dict__:
+            return False
+        if self.description == getattr(self, '_loaded_description', DEFERRED):
+            return False
+        self.description_text = description_to_text(self.description)
+        self._loaded_description = self.description
+        return True
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        rendered = self.render_description()
+        if update_fields is not None:
+            if rendered and 'description' in update_fields:
+                update_fields = kwargs['update_fields'] = {*update_fields, 'description_text'}
+            if 'parent' not in update_fields:
+                return super().save(*args, **kwargs)
+            kwargs['update_fields'] = {*update_fields, 'root'}
+        if self.parent_id:
+            self.root_id = self.parent.root_id or self.parent_id
+        else:
+            self.root_id = None
+        adding = self._state.adding
+        old_root_id = getattr(self, '_loaded_root_id', None)
+        super().save(*args, **kwargs)
+        if not adding and old_root_id != self.root_id:
+            # Move the descendants over to the new tree
+            Timelog.rebuild_roots(old_root_id or self.pk)
+        self._loaded_root_id = self.root_id
+
+    @classmethod
+    def rebuild_roots(cls, root_id):
+        """
+        Recompute the root pointers of a tree (the root and every timelog
+        pointing at it) after parent links in it changed, e.g. through
+        queryset.update(parent=...). Reads the tree in one query.
+        """
+        nodes = dict(
+            cls.objects.filter(
+                models.Q(root_id=root_id) | models.Q(id=root_id)
+            ).values_list('id', 'parent_id')
+        )
+        # Parents outside the tree already point at their own root
+        outside = dict(
+            cls.objects.filter(
+                id__in={parent_id for parent_id in nodes.values() if parent_id} - nodes.keys()
+            ).values_list('id', 'root_id')
+        )
+        roots = {
+            node_id: node_root or node_id for node_id, node_root in outside.items()
+        }
+
+        def resolve(node_id):
+            chain = []
+            while node_id not in roots:
+                parent_id = nodes[node_id]
+                if parent_id is None or parent_id in chain or parent_id == node_id:
+                    roots[node_id] = node_id
+                    break
+                chain.append(node_id)
+                node_id = parent_id
+            for chained_id in chain:
+                roots[chained_id] = roots[node_id]
+            return roots[node_id]
+
+        changed = []
+        for timelog in cls.objects.filter(id__in=nodes.keys()).only('id', 'root_id'):
+            new_root_id = resolve(timelog.id)
+            new_root_id = None if new_root_id == timelog.id else new_root_id
+            if timelog.root_id != new_root_id:
+                timelog.root_id = new_root_id
+                changed.append(timelog)
+        cls.objects.bulk_update(changed, ['root'])
+
     def get_root_ancestor(self):
-        """Walk up the parent chain to find the root (parentless) timelog."""
-        current = self
-        seen = {self.pk}
-        while current.parent is not None:
-            if current.parent.pk in seen:
-                break
-            seen.add(current.parent.pk)
-            current = current.parent
-        return current
+        """The root (parentless) timelog of this timelog's tree."""
+        if self.root_id:
+            return self.root
+        return self
+
+    def get_tree(self):
+        """Every timelog of this timelog's tree, root first, in one query."""
+        root_id = self.root_id or self.pk
+        return sorted(
+            Timelog.objects.filter(models.Q(id=root_id) | models.Q(root_id=root_id)),
+            key=lambda timelog: timelog.id != root_id
+        )
 
     def get_all_descendants(self):
         """Return a flat list of all descendant timelogs (recursive)."""
+        return TimelogTree(self.get_tree()).descendants(self.pk)
+
+    def __str__(self):
+        return f'{self.user} - {self.task}'
+
+
+class TimelogTree:
+    """
+    Timelogs of one or more trees loaded together, with the descendants and
+    tree-wide aggregates of any node computed in memory.
+    """
+
+    def __init__(self, timelogs):
+        self.timelogs = {timelog.pk: timelog for timelog in timelogs}
+        self.children = defaultdict(list)
+        for timelog in self.timelogs.values():
+            if timelog.parent_id in self.timelogs:
+                self.children[timelog.parent_id].append(timelog)
+        self._aggregates = {}
+
+    @classmethod
+    def of(cls, timelogs) -> 'TimelogTree':
+        """The full trees of the given timelogs, read in one query."""
+        root_ids = {timelog.root_id or timelog.pk for timelog in timelogs}
+        return cls(Timelog.objects.filter(
+            models.Q(id__in=root_ids) | models.Q(root_id__in=root_ids)
+        ).only('id', 'parent_id', 'root_id', 'start_time', 'end_time'))
+
+    def descendants(self, timelog_id) -> list:
+        """Descendants of a timelog, breadth first."""
         descendants = []
-        queue = list(self.children.all())
-        seen = {self.pk}
+        queue = deque(self.children[timelog_id])
+        seen = {timelog_id}
         while queue:
-            child = queue.pop(0)
+            child = queue.popleft()
             if child.pk in seen:
                 continue
             seen.add(child.pk)
             descendants.append(child)
-            queue.extend(list(child.children.all()))
+            queue.extend(self.children[child.pk])
         return descendants
 
-    def __str__(self):
-        return f'{self.user} - {self.task}'
+    def aggregates(self, timelog: Timelog) -> dict:
+        """
+        Earliest start, latest end, finished descendant count and total hours
+        of a timelog and its descendants, computed once per timelog.
+        """
+        if timelog.pk in self._aggregates:
+            return self._aggregates[timelog.pk]
+        earliest = timelog.start_time
+        latest = timelog.end_time
+        total_children = 0
+        total_seconds = 0
+        total_hours = 0.0
+        if timelog.end_time and timelog.start_time:
+            total_seconds = (timelog.end_time - timelog.start_time).total_seconds()
+            total_hours += total_seconds / 3600
+        for desc in self.descendants(timelog.pk):
+            if desc.start_time and (earliest is None or desc.start_time < earliest):
+                earliest = desc.start_time
+            if desc.end_time and (latest is None or desc.end_time > latest):
+                latest = desc.end_time
+            if desc.end_time is not None:
+                total_children += 1
+            if desc.end_time and desc.start_time:
+                desc_seconds = (desc.end_time - desc.start_time).total_seconds()
+                desc_hours = desc_seconds / 3600
+                if desc_seconds > 0 and desc_hours < 0.01:
+                    desc_hours = 0.01
+                total_hours += desc_hours
+        if total_seconds > 0 and total_hours == 0:
+            total_hours = 0.01
+        self._aggregates[timelog.pk] = {
+            'all_from_time': earliest,
+            'all_to_time': latest,
+            'total_children': total_children,
+            'all_hours': total_hours
+        }
+        return self._aggregates[timelog.pk]
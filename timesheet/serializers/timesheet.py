@@ -1,11 +1,21 @@
 import re
-import html2text
 
 from rest_framework import serializers
-from timesheet.models import Timelog, ProjectLink
+from timesheet.models import Timelog, TimelogTree, ProjectLink
+from timesheet.utils.description import description_to_text
 from timesheet.utils.time import localize_and_convert_to_erp_timezone
 
 
+class TimelogListSerializer(serializers.ListSerializer):
+
+    def to_representation(self, data):
+        # Load the trees of every timelog in one query for the tree aggregates
+        timelogs = list(data.all() if hasattr(data, 'all') else data)
+        if timelogs and 'timelog_tree' not in self._context:
+            self._context['timelog_tree'] = TimelogTree.of(timelogs)
+        return super().to_representation(timelogs)
+
+
 class TimelogSerializer(serializers.ModelSerializer):
     owner = serializers.SerializerMethodField()
     project_name = serializers.SerializerMethodField()
@@ -112,20 +122,20 @@ class TimelogSerializer(serializers.ModelSerializer):
     def get_activity_id(self, obj):
         return obj.activity.id if obj.activity else ''
 
+    def _tree_aggregates(self, obj: Timelog) -> dict:
+        tree = self.context.get('timelog_tree')
+        if tree is None or obj.pk not in tree.timelogs:
+            tree = self.context['timelog_tree'] = TimelogTree(obj.get_tree())
+        return tree.aggregates(tree.timelogs[obj.pk])
+
     def get_all_from_time(self, obj: Timelog):
-        earliest = obj.start_time
-        for desc in obj.get_all_descendants():
-            if desc.start_time and (earliest is None or desc.start_time < earliest):
-                earliest = desc.start_time
+        earliest = self._tree_aggregates(obj)['all_from_time']
         if earliest:
             return earliest.strftime('%Y-%m-%d %H:%M:%S')
         return ''
 
     def get_all_to_time(self, obj: Timelog):
-        latest = obj.end_time
-        for desc in obj.get_all_descendants():
-            if desc.end_time and (latest is None or desc.end_time > latest):
-                latest = desc.end_time
+        latest = self._tree_aggregates(obj)['all_to_time']
         if latest:
             return latest.strftime('%Y-%m-%d %H:%M:%S')
         return ''
@@ -142,31 +152,10 @@ class TimelogSerializer(serializers.ModelSerializer):
             return ''
 
     def get_total_children(self, obj: Timelog):
-        return len([
-            d for d in obj.get_all_descendants()
-            if d.end_time is not None
-        ])
+        return self._tree_aggregates(obj)['total_children']
 
     def get_all_hours(self, obj: Timelog):
-        total_hours = 0.0
-        total_seconds = 0
-
-        if obj.end_time and obj.start_time:
-            total_seconds = (obj.end_time - obj.start_time).total_seconds()
-            total_hours += total_seconds / 3600
-
-        for desc in obj.get_all_descendants():
-            if desc.end_time and desc.start_time:
-                desc_seconds = (desc.end_time - desc.start_time).total_seconds()
-                desc_hours = desc_seconds / 3600
-                if desc_seconds > 0 and desc_hours < 0.01:
-                    desc_hours = 0.01
-                total_hours += desc_hours
-
-        if total_seconds > 0 and total_hours == 0:
-            return 0.01
-
-        return total_hours
+        return self._tree_aggregates(obj)['all_hours']
 
     def get_hours(self, obj):
         if not obj.end_time:
@@ -182,6 +171,7 @@ class TimelogSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Timelog
+        list_serializer_class = TimelogListSerializer
         fields = [
             'id',
             'description',
@@ -245,9 +235,8 @@ class TimelogSerializerERP(TimelogSerializer):
     def get_description(self, obj: Timelog):
         if not obj.description:
             return '-'
-        h = html2text.HTML2Text()
-        h.ignore_links = False
-        return h.handle(obj.description)
+        # Rendered when the description is saved, see Timelog.render_description
+        return obj.description_text or description_to_text(obj.description)
 
 
 class ProjectLinkSerializer(serializers.ModelSerializer):
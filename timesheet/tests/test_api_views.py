@@ -1,9 +1,12 @@
 import json
+from datetime import timedelta
 from http import HTTPStatus
 from unittest.mock import patch
 
 from django.contrib.auth.models import User
+from django.db import connection
 from django.test import TestCase, Client
+from django.test.utils import CaptureQueriesContext
 from django.utils import timezone
 from rest_framework.reverse import reverse
 from rest_framework.test import APIClient
@@ -356,3 +359,132 @@ class TestOnlineUserApiView(TestCase):
         self.assertEqual(root.description, '<p>Latest description</p>')
         self.assertEqual(child.description, '<p>Latest description</p>')
         self.assertTrue(root.is_paused)
+
+
+class TestTimelogListQueries(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            username='timelogs', password='password'
+        )
+        self.client.force_authenticate(self.user)
+        self.url = reverse('timelog_view-list')
+        self.activity = ActivityFactory.create()
+
+    def _create_timelogs(self, count):
+        for index in range(count):
+            parent = None
+            if index % 2:
+                parent = Timelog.objects.filter(user=self.user, parent__isnull=True).last()
+            TimelogFactory.create(
+                user=self.user,
+                task=TaskFactory.create(),
+                activity=self.activity,
+                parent=parent
+            )
+
+    def test_list_query_count_is_fixed(self):
+        self._create_timelogs(100)
+        # Creates the site preferences on first use
+        self.client.get(self.url)
+        # Two preferences lookups, the timelogs with everything the
+        # serializer reads joined in, and their trees
+        with self.assertNumQueries(4):
+            response = self.client.get(self.url)
+        self.assertEqual(len(response.data), 100)
+        self.assertEqual(
+            sum(timelog['total_children'] for timelog in response.data),
+            50
+        )
+
+
+class TestBulkBreakTimesheet(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            username='splitter', password='password'
+        )
+        self.client.force_authenticate(self.user)
+        self.url = reverse('break-timesheets')
+        self.task = TaskFactory.create()
+
+    def _timelog(self, bullets, **kwargs):
+        items = ''.join(f'<li>{bullet}</li>' for bullet in bullets)
+        return TimelogFactory.create(
+            user=self.user, task=self.task,
+            description=f'<ul>{items}</ul>', **kwargs
+        )
+
+    def test_split_many_timelogs(self):
+        first = self._timelog(['Plan', 'Build', 'Ship'])
+        second = self._timelog(['Review', 'Merge'])
+        single = self._timelog(['Rest'])
+        child = TimelogFactory.create(
+            user=self.user, task=self.task, parent=first,
+            description=first.description
+        )
+
+        response = self.client.post(
+            self.url,
+            {'timelog_ids': [first.id, second.id, single.id, child.id]},
+            format='json'
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            sorted(timelog['description'] for timelog in response.data),
+            ['<ul><li>Build</li></ul>', '<ul><li>Merge</li></ul>', '<ul><li>Ship</li></ul>']
+        )
+        first.refresh_from_db()
+        child.refresh_from_db()
+        self.assertEqual(first.description, '<ul><li>Plan</li></ul>')
+        self.assertEqual(child.description, '<ul><li>Plan</li></ul>')
+        self.assertEqual(child.description_text, first.description_text)
+        created = Timelog.objects.get(description='<ul><li>Merge</li></ul>')
+        self.assertEqual(created.description_text, '  * Merge\n\n')
+        self.assertEqual(created.end_time, created.start_time)
+
+    def test_query_count_does_not_grow_with_timelogs(self):
+        for _ in range(20):
+            self._timelog(['One', 'Two', 'Three'])
+        timelog_ids = list(Timelog.objects.values_list('id', flat=True))
+        self.client.post(self.url, {'timelog_ids': []}, format='json')
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(
+                self.url, {'timelog_ids': timelog_ids}, format='json'
+            )
+        self.assertEqual(len(response.data), 40)
+        # Read the timelogs, update the parents and their children, insert
+        # the new rows (inside a savepoint), then read them back with their trees
+        self.assertEqual(
+            len([q for q in queries if 'preferences' not in q['sql']]), 8
+        )
+
+    def test_split_this_week(self):
+        this_week = self._timelog(['One', 'Two'])
+        self._timelog(['Old', 'Older'], start_time=timezone.now() - timedelta(days=14))
+        self._timelog(['Sent', 'Done'], submitted=True)
+        other_user = TimelogFactory.create(
+            task=self.task, description='<ul><li>A</li><li>B</li></ul>'
+        )
+
+        response = self.client.post(self.url, {'this_week': True}, format='json')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([timelog['description'] for timelog in response.data], ['<ul><li>Two</li></ul>'])
+        other_user.refresh_from_db()
+        self.assertEqual(other_user.description, '<ul><li>A</li><li>B</li></ul>')
+        this_week.refresh_from_db()
+        self.assertEqual(this_week.description, '<ul><li>One</li></ul>')
+
+    def test_invalid_request(self):
+        response = self.client.post(self.url, {'timelog_ids': 'all'}, format='json')
+        self.assertEqual(response.status_code, 400)
+        response = self.client.post(self.url, {}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_nothing_to_split(self):
+        single = self._timelog(['Rest'])
+        response = self.client.post(self.url, {'timelog_ids': [single.id]}, format='json')
+        self.assertEqual(response.status_code, 400)
@@ -1,24 +1,56 @@
 import datetime
+import json
+
+import requests
 from django.contrib.auth import get_user_model
-from django.test import TestCase
-from unittest.mock import patch, PropertyMock
+from django.db import IntegrityError, connection
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from django.urls import reverse
+from rest_framework.test import APIClient
+from django.test.utils import CaptureQueriesContext
+from unittest.mock import MagicMock, patch, PropertyMock
 from django.conf import settings
-from timesheet.models import Timelog, Project
+from timesheet.models import Timelog, Project, Task
 from timesheet.models.project_member import ProjectMember
+from timesheet.models.user_project import UserProject
 from timesheet.serializers.timesheet import TimelogSerializerERP
 from timesheet.tests.model_factories import (
+    TaskFactory,
     TimelogFactory,
     UserFactory,
     ProjectFactory,
 )
 from timesheet.models.department import Department
+from timesheet.models.erp_sync import ErpSyncState, TimesheetSubmission
+from timesheet.models.report_row import TimesheetReportRow
+from timesheet.utils.erp_client import ERPNextClient, get_erp_client
+from timesheet.utils.erpnext_oauth import get_valid_oauth_token
+from timesheet.enums.doctype import DocType
 from timesheet.utils.erp import (
+    ALREADY_SUBMITTED,
+    MEMBERS_SCOPE,
+    ErpFetchError,
+    iter_erp_data,
     push_timesheet_to_erp,
     pull_projects_from_erp,
+    pull_projects_only_from_erp,
+    pull_tasks_from_erp,
     pull_project_members_from_erp,
     pull_department_from_erp,
     pull_user_data_from_erp,
     ProjectsNotFound,
+    save_leave_data,
+    save_public_holidays,
+    fetch_public_holidays,
+    HolidayListCache,
+)
+from schedule.models import Schedule
+from timesheet.utils.report_rows import (
+    REPORT_NAME,
+    fetch_report_sync,
+    get_detailed_report_rows,
+    save_report_rows,
 )
 from pmo_dashboard.models import BusinessUnit
 
@@ -48,7 +80,7 @@ class TestErpHelper(TestCase):
             '2023-10-20 13:58:00'
         )
 
-    @patch('requests.post')
+    @patch('timesheet.utils.erp_client.ERPNextClient.post')
     def test_push_timesheet_to_erp_successful_submission(self, mock_post):
         # Mock a successful response from ERPNEXT
         mock_response = mock_post.return_value
@@ -63,7 +95,7 @@ class TestErpHelper(TestCase):
         self.timelog1.refresh_from_db()
         self.assertTrue(self.timelog1.submitted)
 
-    @patch('requests.post')
+    @patch('timesheet.utils.erp_client.ERPNextClient.post')
     def test_push_timesheet_to_erp_unsuccessful_submission(self, mock_post):
         mock_response = mock_post.return_value
         mock_response.status_code = 400
@@ -76,6 +108,191 @@ class TestErpHelper(TestCase):
         self.assertFalse(self.timelog1.submitted)
 
 
+
+class TestTimesheetSubmission(TestCase):
+    def setUp(self):
+        self.user = UserFactory.create()
+        self.task_a = TaskFactory.create()
+        self.task_b = TaskFactory.create()
+        monday = datetime.datetime(2026, 3, 2, 9)
+        self.week_1 = [
+            TimelogFactory.create(
+                user=self.user, task=task,
+                start_time=monday + datetime.timedelta(days=day),
+                end_time=monday + datetime.timedelta(days=day, hours=2)
+            )
+            for task, day in ((self.task_a, 0), (self.task_a, 2), (self.task_b, 1))
+        ]
+        self.week_2 = TimelogFactory.create(
+            user=self.user, task=self.task_a,
+            start_time=monday + datetime.timedelta(days=7),
+            end_time=monday + datetime.timedelta(days=7, hours=2)
+        )
+
+    def _response(self, status_code, name='TS-0001'):
+        response = MagicMock(status_code=status_code, text='rejected')
+        response.json.return_value = {'data': {'name': name}}
+        return response
+
+    @patch('timesheet.utils.erp_client.ERPNextClient.post')
+    def test_one_document_per_project_and_week(self, mock_post):
+        mock_post.return_value = self._response(200)
+
+        report = push_timesheet_to_erp(Timelog.objects.all(), self.user)
+
+        self.assertEqual(mock_post.call_count, 3)
+        project_a = self.task_a.project.name
+        self.assertEqual(report[project_a]['submitted'], 3)
+        self.assertEqual(len(report[project_a]['batches']), 2)
+        self.assertEqual(report[self.task_b.project.name]['submitted'], 1)
+        self.assertFalse(Timelog.objects.filter(submitted=False).exists())
+        submissions = TimesheetSubmission.objects.filter(status=TimesheetSubmission.SUBMITTED)
+        self.assertEqual(submissions.count(), 3)
+        self.assertEqual(set(submissions.values_list('erp_name', flat=True)), {'TS-0001'})
+        for call in mock_post.call_args_list:
+            payload = json.loads(call.kwargs['data'])
+            key = payload['note'].split()[-1]
+            self.assertTrue(submissions.filter(key=key).exists())
+
+    @patch('timesheet.utils.erp_client.ERPNextClient.post')
+    def test_failed_batch_does_not_block_the_others(self, mock_post):
+        project_b = self.task_b.project.name
+        mock_post.side_effect = lambda url, data, headers: self._response(
+            400 if json.loads(data)['title'].endswith(project_b) else 200
+        )
+
+        report = push_timesheet_to_erp(Timelog.objects.all(), self.user)
+
+        self.assertEqual(report[project_b]['failed'], 1)
+        self.assertEqual(report[project_b]['batches'][0]['status'], TimesheetSubmission.FAILED)
+        self.week_1[2].refresh_from_db()
+        self.assertFalse(self.week_1[2].submitted)
+        self.assertEqual(Timelog.objects.filter(submitted=True).count(), 3)
+
+    @patch('timesheet.utils.erp_client.ERPNextClient.get')
+    @patch('timesheet.utils.erp_client.ERPNextClient.post')
+    def test_retry_does_not_submit_twice(self, mock_post, mock_get):
+        mock_post.side_effect = requests.ConnectionError
+        report = push_timesheet_to_erp(Timelog.objects.all(), self.user)
+        self.assertTrue(all(
+            batch['status'] == TimesheetSubmission.PENDING
+            for project in report.values() for batch in project['batches']
+        ))
+        self.assertFalse(Timelog.objects.filter(submitted=True).exists())
+
+        # The first attempt reached ERPNext after all
+        mock_post.reset_mock(side_effect=True)
+        mock_get.return_value.status_code = 200
+        mock_get.return_value.json.return_value = {'data': [{'name': 'TS-0002'}]}
+        push_timesheet_to_erp(Timelog.objects.all(), self.user)
+
+        mock_post.assert_not_called()
+        self.assertFalse(Timelog.objects.filter(submitted=False).exists())
+        self.assertEqual(
+            set(TimesheetSubmission.objects.values_list('erp_name', 'attempts')),
+            {('TS-0002', 2)}
+        )
+
+    @patch('timesheet.utils.erp_client.ERPNextClient.post')
+    def test_submitted_batch_is_not_sent_again(self, mock_post):
+        mock_post.return_value = self._response(200)
+        push_timesheet_to_erp(Timelog.objects.all(), self.user)
+        Timelog.objects.update(submitted=False)
+        mock_post.reset_mock()
+
+        report = push_timesheet_to_erp(Timelog.objects.all(), self.user)
+
+        mock_post.assert_not_called()
+        self.assertEqual(report[self.task_a.project.name]['submitted'], 3)
+        self.assertFalse(Timelog.objects.filter(submitted=False).exists())
+
+    @patch('timesheet.utils.erp_client.ERPNextClient.post')
+    def test_submit_timesheet_api(self, mock_post):
+        mock_post.return_value = self._response(200)
+        client = APIClient()
+        client.force_authenticate(user=self.user)
+
+        response = client.post(reverse('submit-timesheet'))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['failed'], 0)
+        self.assertEqual(response.data['report'][self.task_a.project.name]['submitted'], 3)
+        self.assertFalse(Timelog.objects.filter(submitted=False).exists())
+
+    @patch('timesheet.utils.erp_client.ERPNextClient.post')
+    def test_submit_timesheet_api_reports_failures(self, mock_post):
+        mock_post.return_value = self._response(400)
+        client = APIClient()
+        client.force_authenticate(user=self.user)
+
+        response = client.post(reverse('submit-timesheet'))
+
+        self.assertEqual(response.status_code, 502)
+        self.assertEqual(response.data['failed'], 4)
+        self.assertFalse(Timelog.objects.filter(submitted=True).exists())
+
+    @patch('timesheet.utils.erp_client.ERPNextClient.post')
+    def test_batch_recorded_by_concurrent_submit_is_not_sent(self, mock_post):
+        with patch.object(TimesheetSubmission.objects, 'create', side_effect=IntegrityError):
+            report = push_timesheet_to_erp(Timelog.objects.all(), self.user)
+
+        mock_post.assert_not_called()
+        batches = [batch for project in report.values() for batch in project['batches']]
+        self.assertEqual({batch['status'] for batch in batches}, {ALREADY_SUBMITTED})
+        self.assertEqual(report[self.task_a.project.name]['failed'], 0)
+        self.assertFalse(Timelog.objects.filter(submitted=True).exists())
+
+
+class TestERPNextClient(TestCase):
+    def test_shared_client_is_reused(self):
+        self.assertIs(get_erp_client(), get_erp_client())
+
+    def test_pool_and_retries_configured(self):
+        client = ERPNextClient(pool_size=4, max_retries=2)
+        adapter = client.session.get_adapter('https://erp_example.com')
+        self.assertEqual(adapter._pool_maxsize, 4)
+        self.assertEqual(adapter.max_retries.total, 2)
+
+    @patch('requests.Session.request')
+    def test_default_timeout_applied(self, mock_request):
+        client = ERPNextClient(connect_timeout=2, read_timeout=30)
+        client.get('https://erp_example.com/api/resource/Task')
+        _, kwargs = mock_request.call_args
+        self.assertEqual(kwargs['timeout'], (2, 30))
+
+    @patch('requests.Session.request')
+    def test_explicit_timeout_kept(self, mock_request):
+        client = ERPNextClient()
+        client.post('https://erp_example.com/api/resource/Timesheet', timeout=1)
+        _, kwargs = mock_request.call_args
+        self.assertEqual(kwargs['timeout'], 1)
+
+
+class TestOAuthRefresh(TestCase):
+    def setUp(self):
+        self.user = UserFactory.create()
+        profile = self.user.profile
+        profile.erpnext_oauth_access_token = 'old'
+        profile.erpnext_oauth_refresh_token = 'refresh'
+        profile.erpnext_oauth_token_expires_at = timezone.now() - datetime.timedelta(minutes=1)
+        profile.save()
+
+    @patch('timesheet.utils.erpnext_oauth.refresh_oauth_token')
+    def test_reuses_token_refreshed_by_another_thread(self, mock_refresh):
+        stale_user = get_user_model().objects.select_related('profile').get(pk=self.user.pk)
+        self.user.profile.erpnext_oauth_access_token = 'new'
+        self.user.profile.erpnext_oauth_token_expires_at = timezone.now() + datetime.timedelta(hours=1)
+        self.user.profile.save()
+
+        self.assertEqual(get_valid_oauth_token(stale_user), 'new')
+        mock_refresh.assert_not_called()
+
+    @patch('timesheet.utils.erpnext_oauth.refresh_oauth_token', return_value=True)
+    def test_refreshes_expired_token(self, mock_refresh):
+        get_valid_oauth_token(self.user)
+        mock_refresh.assert_called_once_with(self.user.profile)
+
+
 ERP_PROJECT_DATA = {
     'name': 'ERP Project Alpha',
     'status': 'Open',
@@ -101,28 +318,31 @@ ERP_PROJECT_DATA = {
 }
 
 
-@patch('timesheet.utils.erp.get_erp_data')
+@patch('timesheet.utils.erp.iter_erp_data')
 class TestPullProjectsFromErp(TestCase):
     def setUp(self):
         self.user = UserFactory.create()
         self.user.profile.save()
+        activities = patch('timesheet.utils.erp.get_erp_data', return_value=[])
+        activities.start()
+        self.addCleanup(activities.stop)
 
     def _mock_erp(self, mock, projects):
-        # pull_projects_from_erp calls get_erp_data three times: projects, tasks, activities.
-        mock.side_effect = [projects, [], []]
+        # pull_projects_from_erp streams projects then tasks; activities come from get_erp_data.
+        mock.side_effect = [iter(projects), iter([])]
 
-    def test_raises_when_no_projects(self, mock_get_erp_data):
-        self._mock_erp(mock_get_erp_data, [])
+    def test_raises_when_no_projects(self, mock_iter_erp_data):
+        self._mock_erp(mock_iter_erp_data, [])
         with self.assertRaises(ProjectsNotFound):
             pull_projects_from_erp(self.user)
 
-    def test_creates_project(self, mock_get_erp_data):
-        self._mock_erp(mock_get_erp_data, [ERP_PROJECT_DATA])
+    def test_creates_project(self, mock_iter_erp_data):
+        self._mock_erp(mock_iter_erp_data, [ERP_PROJECT_DATA])
         pull_projects_from_erp(self.user)
         self.assertTrue(Project.objects.filter(name='ERP Project Alpha').exists())
 
-    def test_project_fields_saved(self, mock_get_erp_data):
-        self._mock_erp(mock_get_erp_data, [ERP_PROJECT_DATA])
+    def test_project_fields_saved(self, mock_iter_erp_data):
+        self._mock_erp(mock_iter_erp_data, [ERP_PROJECT_DATA])
         pull_projects_from_erp(self.user)
         p = Project.objects.get(name='ERP Project Alpha')
         self.assertTrue(p.is_active)
@@ -134,52 +354,247 @@ class TestPullProjectsFromErp(TestCase):
         self.assertEqual(p.gross_margin, 15000.0)
         self.assertEqual(p.per_gross_margin, 25.0)
 
-    def test_business_unit_created_and_assigned(self, mock_get_erp_data):
-        self._mock_erp(mock_get_erp_data, [ERP_PROJECT_DATA])
+    def test_business_unit_created_and_assigned(self, mock_iter_erp_data):
+        self._mock_erp(mock_iter_erp_data, [ERP_PROJECT_DATA])
         pull_projects_from_erp(self.user)
         bu = BusinessUnit.objects.get(name='Engineering')
         p = Project.objects.get(name='ERP Project Alpha')
         self.assertEqual(p.business_unit, bu)
 
-    def test_project_lead_user_created_by_email(self, mock_get_erp_data):
-        self._mock_erp(mock_get_erp_data, [ERP_PROJECT_DATA])
+    def test_project_lead_user_created_by_email(self, mock_iter_erp_data):
+        self._mock_erp(mock_iter_erp_data, [ERP_PROJECT_DATA])
         pull_projects_from_erp(self.user)
         p = Project.objects.get(name='ERP Project Alpha')
         self.assertIsNotNone(p.project_lead)
         self.assertEqual(p.project_lead.email, 'lead@example.com')
 
-    def test_relations_manager_user_created_by_email(self, mock_get_erp_data):
-        self._mock_erp(mock_get_erp_data, [ERP_PROJECT_DATA])
+    def test_relations_manager_user_created_by_email(self, mock_iter_erp_data):
+        self._mock_erp(mock_iter_erp_data, [ERP_PROJECT_DATA])
         pull_projects_from_erp(self.user)
         p = Project.objects.get(name='ERP Project Alpha')
         self.assertIsNotNone(p.relations_manager)
         self.assertEqual(p.relations_manager.email, 'rm@example.com')
 
-    def test_existing_project_updated(self, mock_get_erp_data):
+    def test_existing_project_updated(self, mock_iter_erp_data):
         Project.objects.create(name='ERP Project Alpha', is_active=False, rag='RED')
-        self._mock_erp(mock_get_erp_data, [ERP_PROJECT_DATA])
+        self._mock_erp(mock_iter_erp_data, [ERP_PROJECT_DATA])
         pull_projects_from_erp(self.user)
         p = Project.objects.get(name='ERP Project Alpha')
         self.assertTrue(p.is_active)
         self.assertEqual(p.rag, 'GREEN')
         self.assertEqual(Project.objects.filter(name='ERP Project Alpha').count(), 1)
 
-    def test_closed_project_set_inactive(self, mock_get_erp_data):
+    def test_closed_project_set_inactive(self, mock_iter_erp_data):
         closed = dict(ERP_PROJECT_DATA, name='Closed Project', status='Closed')
-        self._mock_erp(mock_get_erp_data, [closed])
+        self._mock_erp(mock_iter_erp_data, [closed])
         pull_projects_from_erp(self.user)
         self.assertFalse(Project.objects.get(name='Closed Project').is_active)
 
-    def test_missing_business_unit_leaves_field_null(self, mock_get_erp_data):
-        self._mock_erp(mock_get_erp_data, [dict(ERP_PROJECT_DATA, custom_business_unit='')])
+    def test_missing_business_unit_leaves_field_null(self, mock_iter_erp_data):
+        self._mock_erp(mock_iter_erp_data, [dict(ERP_PROJECT_DATA, custom_business_unit='')])
         pull_projects_from_erp(self.user)
         self.assertIsNone(Project.objects.get(name='ERP Project Alpha').business_unit)
 
-    def test_missing_project_lead_leaves_field_null(self, mock_get_erp_data):
-        self._mock_erp(mock_get_erp_data, [dict(ERP_PROJECT_DATA, project_lead='')])
+    def test_missing_project_lead_leaves_field_null(self, mock_iter_erp_data):
+        self._mock_erp(mock_iter_erp_data, [dict(ERP_PROJECT_DATA, project_lead='')])
         pull_projects_from_erp(self.user)
         self.assertIsNone(Project.objects.get(name='ERP Project Alpha').project_lead)
 
+    def test_query_count_independent_of_project_count(self, mock_iter_erp_data):
+        def queries_for(count):
+            rows = [dict(ERP_PROJECT_DATA, name=f'Project {count}-{i}') for i in range(count)]
+            mock_iter_erp_data.return_value = iter(rows)
+            with CaptureQueriesContext(connection) as ctx:
+                pull_projects_only_from_erp(self.user)
+            return len(ctx)
+
+        queries_for(1)  # creates the shared business unit and users
+        self.assertEqual(queries_for(2), queries_for(25))
+
+    def test_returns_ids_in_erp_order_and_links_user(self, mock_iter_erp_data):
+        existing = Project.objects.create(name='Beta')
+        mock_iter_erp_data.return_value = iter([
+            dict(ERP_PROJECT_DATA, name='Alpha'),
+            dict(ERP_PROJECT_DATA, name='Beta'),
+        ])
+        ids = pull_projects_only_from_erp(self.user)
+        self.assertEqual(ids, [Project.objects.get(name='Alpha').id, existing.id])
+        self.assertEqual(
+            set(UserProject.objects.filter(user=self.user).values_list('project_id', flat=True)),
+            set(ids)
+        )
+
+    def test_projects_fetched_with_explicit_fields(self, mock_iter_erp_data):
+        self._mock_erp(mock_iter_erp_data, [ERP_PROJECT_DATA])
+        pull_projects_from_erp(self.user)
+        _, kwargs = mock_iter_erp_data.call_args_list[0]
+        self.assertIn('per_gross_margin', kwargs['fields'])
+        self.assertNotIn('*', kwargs['fields'])
+
+
+@patch('timesheet.utils.erp.iter_erp_data')
+class TestIncrementalProjectSync(TestCase):
+    def setUp(self):
+        self.user = UserFactory.create()
+
+    def test_full_pull_does_not_move_watermark(self, mock_iter_erp_data):
+        mock_iter_erp_data.return_value = iter([dict(ERP_PROJECT_DATA, modified='2026-03-01 10:00:00.000000')])
+        pull_projects_only_from_erp(self.user, filters='[["name", "=", "ERP Project Alpha"]]')
+        self.assertEqual(ErpSyncState.get_watermark(DocType.PROJECT.value), '')
+
+    def test_recorded_watermark_used_as_modified_filter(self, mock_iter_erp_data):
+        mock_iter_erp_data.return_value = iter([dict(ERP_PROJECT_DATA, modified='2026-03-01 10:00:00.000000')])
+        pull_projects_only_from_erp(self.user, record_watermark=True)
+        self.assertEqual(ErpSyncState.get_watermark(DocType.PROJECT.value), '2026-03-01 10:00:00.000000')
+
+        mock_iter_erp_data.return_value = iter([])
+        self.assertEqual(pull_projects_only_from_erp(self.user, incremental=True), [])
+        _, kwargs = mock_iter_erp_data.call_args
+        self.assertEqual(
+            kwargs['filters'], '[["modified", ">", "2026-03-01 10:00:00.000000"]]'
+        )
+
+    def test_failed_page_does_not_move_watermark(self, mock_iter_erp_data):
+        ErpSyncState.advance(DocType.PROJECT.value, '2026-03-01 10:00:00.000000')
+
+        def truncated_stream():
+            yield dict(ERP_PROJECT_DATA, modified='2026-03-02 10:00:00.000000')
+            raise ErpFetchError('page failed')
+
+        mock_iter_erp_data.return_value = truncated_stream()
+        with self.assertRaises(ErpFetchError):
+            pull_projects_only_from_erp(self.user, incremental=True)
+        self.assertEqual(ErpSyncState.get_watermark(DocType.PROJECT.value), '2026-03-01 10:00:00.000000')
+        self.assertFalse(Project.objects.filter(name='ERP Project Alpha').exists())
+
+    def test_watermark_only_moves_forward(self, mock_iter_erp_data):
+        ErpSyncState.advance(DocType.PROJECT.value, '2026-03-01 10:00:00.000000')
+        ErpSyncState.advance(DocType.PROJECT.value, '2026-02-01 10:00:00.000000')
+        self.assertEqual(ErpSyncState.get_watermark(DocType.PROJECT.value), '2026-03-01 10:00:00.000000')
+
+
+@patch('timesheet.utils.erp.iter_erp_data')
+class TestPullTasksFromErp(TestCase):
+    def setUp(self):
+        self.user = UserFactory.create()
+        self.project = Project.objects.create(name='ERP Project Alpha', is_active=True)
+
+    def _task(self, erp_id, subject='Task', expected=1.0, actual=0.0, project='ERP Project Alpha'):
+        return {
+            'name': erp_id, 'subject': subject, 'project': project,
+            'expected_time': expected, 'actual_time': actual,
+        }
+
+    def test_reconciles_and_reports_counts(self, mock_iter_erp_data):
+        unchanged = Task.objects.create(project=self.project, erp_id='T1', name='Same', expected_time=1.0)
+        changed = Task.objects.create(project=self.project, erp_id='T2', name='Old', expected_time=1.0)
+        stale = Task.objects.create(project=self.project, erp_id='T3', name='Gone')
+        mock_iter_erp_data.return_value = iter([
+            self._task('T1', 'Same'),
+            self._task('T2', 'Renamed', expected=5.0, actual=2.0),
+            self._task('T4', 'New'),
+            self._task('T5', 'Unknown project', project='Missing'),
+        ])
+
+        counts = pull_tasks_from_erp(self.user, [self.project.id])
+
+        self.assertEqual(counts, {'created': 1, 'updated': 1, 'deactivated': 1})
+        changed.refresh_from_db()
+        self.assertEqual((changed.name, changed.expected_time, changed.actual_time), ('Renamed', 5.0, 2.0))
+        stale.refresh_from_db()
+        self.assertFalse(stale.active)
+        unchanged.refresh_from_db()
+        self.assertTrue(unchanged.active)
+        self.assertTrue(Task.objects.get(erp_id='T4').active)
+        self.assertFalse(Task.objects.filter(erp_id='T5').exists())
+
+    @override_settings(ERPNEXT_PAGE_LENGTH=2)
+    @patch('timesheet.utils.erp_client.ERPNextClient.get')
+    def test_failed_page_deactivates_nothing(self, mock_get, mock_iter_erp_data):
+        mock_iter_erp_data.side_effect = iter_erp_data
+        tasks = [Task.objects.create(project=self.project, erp_id=f'T{i}', name='Task') for i in range(1, 5)]
+        first_page = MagicMock(status_code=200)
+        first_page.json.return_value = {'data': [self._task('T1'), self._task('T2')]}
+        mock_get.side_effect = [first_page, MagicMock(status_code=502)]
+
+        with self.assertRaises(ErpFetchError):
+            pull_tasks_from_erp(self.user, [self.project.id])
+
+        self.assertEqual(mock_get.call_count, 2)
+        for task in tasks:
+            task.refresh_from_db()
+            self.assertTrue(task.active)
+
+    def test_duplicates_collapse_to_newest(self, mock_iter_erp_data):
+        Task.objects.create(project=self.project, erp_id='T1', name='Task')
+        newest = Task.objects.create(project=self.project, erp_id='T1', name='Task')
+        mock_iter_erp_data.return_value = iter([self._task('T1', expected=3.0)])
+
+        pull_tasks_from_erp(self.user, [self.project.id])
+
+        self.assertEqual(list(Task.objects.filter(erp_id='T1')), [newest])
+        newest.refresh_from_db()
+        self.assertEqual(newest.expected_time, 3.0)
+
+    def test_query_count_independent_of_task_count(self, mock_iter_erp_data):
+        def queries_for(count):
+            mock_iter_erp_data.return_value = iter(
+                [self._task(f'T{count}-{i}') for i in range(count)]
+            )
+            with CaptureQueriesContext(connection) as ctx:
+                pull_tasks_from_erp(self.user, [self.project.id])
+            return len(ctx)
+
+        queries_for(1)  # loads the preferences singleton
+        self.assertEqual(queries_for(2), queries_for(40))
+
+
+class TestIterErpData(TestCase):
+    def _response(self, rows):
+        response = MagicMock(status_code=200)
+        response.json.return_value = {'data': rows}
+        return response
+
+    @patch('timesheet.utils.erp_client.ERPNextClient.get')
+    def test_pages_until_short_page(self, mock_get):
+        mock_get.side_effect = [
+            self._response([{'name': 'T1'}, {'name': 'T2'}]),
+            self._response([{'name': 'T3'}]),
+        ]
+        rows = list(iter_erp_data(DocType.TASK, 'token', fields=['name'], page_length=2))
+        self.assertEqual([r['name'] for r in rows], ['T1', 'T2', 'T3'])
+        self.assertEqual(mock_get.call_count, 2)
+        second_url = mock_get.call_args_list[1][0][0]
+        self.assertIn('limit_start=2', second_url)
+        self.assertIn('limit_page_length=2', second_url)
+        self.assertIn('fields=["name"]', second_url)
+
+    @patch('timesheet.utils.erp_client.ERPNextClient.get')
+    def test_pages_in_stable_order(self, mock_get):
+        mock_get.return_value = self._response([])
+        list(iter_erp_data(DocType.TASK, 'token'))
+        self.assertIn('order_by=modified%20asc%2C%20name%20asc', mock_get.call_args[0][0])
+
+    @patch('timesheet.utils.erp_client.ERPNextClient.get')
+    def test_raises_on_failed_page(self, mock_get):
+        mock_get.side_effect = [
+            self._response([{'name': 'T1'}, {'name': 'T2'}]),
+            MagicMock(status_code=500),
+        ]
+        rows = []
+        with self.assertRaises(ErpFetchError):
+            for row in iter_erp_data(DocType.TASK, 'token', page_length=2):
+                rows.append(row)
+        self.assertEqual([r['name'] for r in rows], ['T1', 'T2'])
+
+    @patch('timesheet.utils.erp_client.ERPNextClient.get')
+    def test_raises_on_page_without_data(self, mock_get):
+        response = MagicMock(status_code=200)
+        response.json.return_value = {}
+        mock_get.return_value = response
+        with self.assertRaises(ErpFetchError):
+            list(iter_erp_data(DocType.TASK, 'token'))
+
 
 @patch('timesheet.utils.erp.get_erp_project_detail')
 class TestPullProjectMembersFromErp(TestCase):
@@ -234,6 +649,32 @@ class TestPullProjectMembersFromErp(TestCase):
         self.assertFalse(ProjectMember.objects.filter(user__email='old@example.com').exists())
         self.assertTrue(ProjectMember.objects.filter(user__email='new@example.com').exists())
 
+    @patch('timesheet.utils.erp.iter_erp_data')
+    def test_incremental_syncs_projects_modified_since_watermark(self, mock_iter, mock_detail):
+        ProjectFactory.create(name='Untouched Project')
+        ErpSyncState.advance(DocType.PROJECT.value, '2026-03-01 10:00:00.000000', scope=MEMBERS_SCOPE)
+        mock_iter.return_value = iter([{'name': 'Alpha Project', 'modified': '2026-03-02 10:00:00.000000'}])
+        mock_detail.return_value = self._detail([{'employee': 'dev@example.com', 'role': ''}])
+
+        pull_project_members_from_erp(self.user, incremental=True)
+
+        mock_detail.assert_called_once_with('Alpha Project', user=self.user)
+        self.assertEqual(
+            mock_iter.call_args[1]['filters'], '[["modified", ">", "2026-03-01 10:00:00.000000"]]'
+        )
+        self.assertEqual(
+            ErpSyncState.get_watermark(DocType.PROJECT.value, MEMBERS_SCOPE), '2026-03-02 10:00:00.000000'
+        )
+        self.assertEqual(ErpSyncState.get_watermark(DocType.PROJECT.value), '')
+
+    def test_full_run_starts_members_watermark_from_projects(self, mock_detail):
+        ErpSyncState.advance(DocType.PROJECT.value, '2026-03-01 10:00:00.000000', full=True)
+        mock_detail.return_value = self._detail([])
+        pull_project_members_from_erp(self.user, project_names=['Alpha Project'], record_watermark=True)
+        self.assertEqual(
+            ErpSyncState.get_watermark(DocType.PROJECT.value, MEMBERS_SCOPE), '2026-03-01 10:00:00.000000'
+        )
+
     def test_user_created_if_not_exist(self, mock_detail):
         mock_detail.return_value = self._detail(
             [{'employee': 'newuser@example.com', 'role': ''}]
@@ -397,3 +838,247 @@ class TestPullUserDataFromErp(TestCase):
         self.user.refresh_from_db()
         self.assertEqual(self.user.first_name, 'Jane')
         self.assertEqual(self.user.last_name, 'Doe')
+
+
+def _report_row(day, project='Project A', employee='HR-EMP-0001', hours=2.0):
+    return {
+        'Date': day,
+        'Employee ID': employee,
+        'Employee Name': 'Jane Doe',
+        'Project': project,
+        'Task': 'TASK-0001',
+        'Hours': hours,
+        'Billable Hours': hours,
+        'Total Costing': 0,
+        'Total Billing': 0,
+    }
+
+
+class TestReportRowCache(TestCase):
+
+    def test_save_replaces_rows_inside_window_only(self):
+        save_report_rows(
+            [_report_row('2024-01-05'), _report_row('2024-02-05')],
+            '2024-01-01', '2024-02-28', full=True)
+        saved = save_report_rows(
+            [_report_row('2024-02-10', hours=5.0), ['Total', 5.0]],
+            '2024-02-01', '2024-02-28')
+
+        self.assertEqual(saved, 1)
+        self.assertEqual(
+            list(TimesheetReportRow.objects.values_list('date', 'hours')),
+            [(datetime.date(2024, 1, 5), 2.0), (datetime.date(2024, 2, 10), 5.0)]
+        )
+        self.assertEqual(ErpSyncState.get_watermark(REPORT_NAME), '2024-02-28')
+
+    def test_empty_fetch_keeps_cache(self):
+        save_report_rows([_report_row('2024-01-05')], '2024-01-01', '2024-01-31', full=True)
+        self.assertEqual(save_report_rows([], '2024-01-01', '2024-01-31'), 0)
+        self.assertEqual(TimesheetReportRow.objects.count(), 1)
+
+    @patch('timesheet.utils.report_rows.get_report_data')
+    def test_reads_local_rows_once_synced(self, mock_report):
+        save_report_rows([
+            _report_row('2024-01-05'),
+            _report_row('2024-01-20', project='Project B'),
+            _report_row('2024-03-01', employee='HR-EMP-0002'),
+        ], '2024-01-01', '2024-03-31', full=True)
+
+        rows = get_detailed_report_rows(project_name='Project A')
+        self.assertEqual([row['Date'] for row in rows], ['2024-01-05', '2024-03-01'])
+        rows = get_detailed_report_rows(
+            employee_id='HR-EMP-0001', start_date='2024-01-10', end_date='2024-02-01')
+        self.assertEqual([row['Project'] for row in rows], ['Project B'])
+        mock_report.assert_not_called()
+
+    def test_rows_limited_to_users_projects_and_own_timesheets(self):
+        save_report_rows([
+            _report_row('2024-01-05'),
+            _report_row('2024-01-06', project='Project B'),
+            _report_row('2024-01-07', project='Project C', employee='HR-EMP-0002'),
+            _report_row('2024-01-08', project='Project D'),
+        ], '2024-01-01', '2024-01-31', full=True)
+        user = UserFactory.create()
+        user.profile.employee_id = 'HR-EMP-0002'
+        user.profile.save()
+        UserProject.objects.create(user=user, project=ProjectFactory.create(name='Project B'))
+
+        rows = get_detailed_report_rows(start_date='2024-01-01', end_date='2024-01-31', user=user)
+        self.assertEqual([row['Project'] for row in rows], ['Project B', 'Project C'])
+
+        admin = UserFactory.create(is_superuser=True)
+        rows = get_detailed_report_rows(start_date='2024-01-01', end_date='2024-01-31', user=admin)
+        self.assertEqual(len(rows), 4)
+
+    @override_settings(ERPNEXT_REPORT_SYNC_DAYS=45)
+    @patch('timesheet.utils.report_rows.get_detailed_report_data', return_value=[])
+    @patch('timesheet.utils.report_rows.iter_erp_data')
+    def test_sync_window_reaches_back_to_edited_timesheets(self, mock_iter, mock_report):
+        mock_iter.return_value = iter([
+            {'start_date': '2023-05-01', 'modified': '2024-03-02 10:00:00.000000'},
+            {'start_date': '2024-02-26', 'modified': '2024-03-03 09:00:00.000000'},
+        ])
+        sync = fetch_report_sync(since='2024-03-01 00:00:00.000000')
+
+        self.assertEqual(sync['start_date'], '2023-05-01')
+        self.assertEqual(sync['last_modified'], '2024-03-03 09:00:00.000000')
+        self.assertEqual(
+            mock_iter.call_args[1]['filters'],
+            json.dumps([['modified', '>', '2024-03-01 00:00:00.000000']])
+        )
+        self.assertIn('"start_date": "2023-05-01"', mock_report.call_args[0][1])
+
+    @patch('timesheet.utils.report_rows.get_report_data')
+    def test_falls_back_to_erp_before_first_full_sync(self, mock_report):
+        mock_report.return_value = [_report_row('2024-01-05'), ['Total', 2.0]]
+        rows = get_detailed_report_rows(project_name='Project A')
+        self.assertEqual(rows, [_report_row('2024-01-05')])
+        self.assertIn('"Project": "Project A"', mock_report.call_args[0][2])
+
+
+def _leave(name, from_date, to_date=None, leave_type='Paid Annual leave', status='Approved'):
+    return {
+        'name': name,
+        'leave_type': leave_type,
+        'from_date': from_date,
+        'to_date': to_date or from_date,
+        'description': f'{name} description',
+        'status': status,
+        'modified': f'{from_date} 10:00:00',
+    }
+
+
+@patch('timesheet.utils.erp.invalidate_schedule_cache')
+class TestSaveScheduleBatches(TestCase):
+
+    def setUp(self):
+        self.user = UserFactory.create()
+
+    def _leave_rows(self):
+        return list(
+            Schedule.objects.filter(user=self.user).order_by('start_time')
+            .values_list('erp_id', 'activity__name')
+        )
+
+    def test_full_leave_sync_replaces_schedule(self, mock_invalidate):
+        save_leave_data(self.user, [
+            _leave('HR-LAP-1', '2024-01-02'),
+            _leave('HR-LAP-2', '2024-02-02', leave_type='Unpaid leave'),
+        ])
+        save_leave_data(self.user, [
+            _leave('HR-LAP-2', '2024-02-02', leave_type='Unpaid leave'),
+            _leave('HR-LAP-3', '2024-03-02', leave_type='Paid Sick Leave'),
+        ])
+        self.assertEqual(self._leave_rows(), [
+            ('HR-LAP-2', 'Leave - Unpaid'),
+            ('HR-LAP-3', 'Leave - Sick'),
+        ])
+        self.assertEqual(mock_invalidate.call_count, 2)
+
+    def test_unchanged_leave_is_left_alone(self, mock_invalidate):
+        leave = [_leave('HR-LAP-1', '2024-01-02', '2024-01-04')]
+        save_leave_data(self.user, leave)
+        schedule_id = Schedule.objects.get(erp_id='HR-LAP-1').id
+        mock_invalidate.reset_mock()
+
+        with CaptureQueriesContext(connection) as ctx:
+            save_leave_data(self.user, leave)
+        self.assertFalse(any(q['sql'].startswith(('INSERT', 'DELETE')) for q in ctx.captured_queries))
+        self.assertEqual(Schedule.objects.get(erp_id='HR-LAP-1').id, schedule_id)
+        mock_invalidate.assert_not_called()
+
+    def test_same_days_collapse_to_latest_application(self, mock_invalidate):
+        save_leave_data(self.user, [
+            _leave('HR-LAP-1', '2024-01-02'),
+            _leave('HR-LAP-1-1', '2024-01-02'),
+        ])
+        self.assertEqual(self._leave_rows(), [('HR-LAP-1-1', 'Leave - Paid')])
+
+    def test_incremental_leave_sync_drops_cancelled(self, mock_invalidate):
+        save_leave_data(self.user, [
+            _leave('HR-LAP-1', '2024-01-02'),
+            _leave('HR-LAP-2', '2024-02-02'),
+        ])
+        save_leave_data(self.user, [
+            _leave('HR-LAP-1', '2024-01-02', status='Cancelled'),
+            _leave('HR-LAP-4', '2024-04-02'),
+        ], since='2024-01-01 00:00:00')
+        self.assertEqual(self._leave_rows(), [
+            ('HR-LAP-2', 'Leave - Paid'),
+            ('HR-LAP-4', 'Leave - Paid'),
+        ])
+
+    def test_public_holidays_are_diffed(self, mock_invalidate):
+        save_public_holidays(self.user, [
+            {'description': 'New Year', 'holiday_date': '2024-01-01'},
+            {'description': 'Freedom Day', 'holiday_date': '2024-04-27'},
+        ])
+        new_year_id = Schedule.objects.get(erp_id='New Year').id
+        save_public_holidays(self.user, [
+            {'description': 'New Year', 'holiday_date': '2024-01-01'},
+            {'description': 'Workers Day', 'holiday_date': '2024-05-01'},
+            {'description': 'Workers Day', 'holiday_date': '2024-05-01'},
+        ])
+        self.assertEqual(self._leave_rows(), [
+            ('New Year', 'Public holiday'),
+            ('Workers Day', 'Public holiday'),
+        ])
+        self.assertEqual(Schedule.objects.get(erp_id='New Year').id, new_year_id)
+
+
+@patch('timesheet.utils.erp.get_country_code_from_timezone', return_value='ZA')
+@patch('timesheet.utils.erp.iter_erp_data')
+@patch('timesheet.utils.erp.get_erp_data')
+class TestHolidayListCache(TestCase):
+
+    def setUp(self):
+        self.users = []
+        for index in range(3):
+            user = UserFactory.create(first_name=f'user{index}')
+            user.profile.employee_id = f'HR-EMP-{index}'
+            self.users.append(user)
+        year = datetime.date.today().year
+        self.holiday_doc = {'holidays': [
+            {'description': 'New Year', 'holiday_date': f'{year}-01-01'},
+            {'description': 'Sunday', 'holiday_date': f'{year}-01-07'},
+            {'description': 'Old Holiday', 'holiday_date': f'{year - 1}-12-25'},
+        ]}
+
+    def _get_erp_data(self, doctype, token=None, filters='', doctype_value='', user=None):
+        if doctype_value:
+            return self.holiday_doc
+        if doctype == DocType.HOLIDAY_LIST:
+            return [{'name': 'ZA Holidays'}, {'name': 'user2 Holidays'}]
+        return []
+
+    def test_shared_lists_are_fetched_once(self, mock_get_erp_data, mock_iter_erp_data, mock_country):
+        mock_iter_erp_data.return_value = [
+            {'name': 'HR-EMP-0', 'employee': 'HR-EMP-0', 'holiday_list': 'ZA Holidays'},
+            {'name': 'HR-EMP-1', 'employee': 'HR-EMP-1', 'holiday_list': 'ZA Holidays'},
+        ]
+        mock_get_erp_data.side_effect = self._get_erp_data
+        holiday_lists = HolidayListCache()
+
+        for user in self.users[:2]:
+            holidays = fetch_public_holidays(user, holiday_lists)
+            self.assertEqual([h['description'] for h in holidays], ['New Year'])
+
+        mock_iter_erp_data.assert_called_once()
+        mock_get_erp_data.assert_called_once()
+        mock_country.assert_not_called()
+
+    def test_falls_back_to_country_list(self, mock_get_erp_data, mock_iter_erp_data, mock_country):
+        mock_iter_erp_data.return_value = []
+        mock_get_erp_data.side_effect = self._get_erp_data
+        holiday_lists = HolidayListCache()
+
+        fetch_public_holidays(self.users[2], holiday_lists)
+        self.assertEqual(mock_get_erp_data.call_args.kwargs['doctype_value'], 'user2 Holidays')
+        fetch_public_holidays(self.users[0], holiday_lists)
+        self.assertEqual(mock_get_erp_data.call_args.kwargs['doctype_value'], 'ZA Holidays')
+
+        country_lookups = [
+            call for call in mock_get_erp_data.call_args_list
+            if call.args[0] == DocType.HOLIDAY_LIST and not call.kwargs.get('doctype_value')
+        ]
+        self.assertEqual(len(country_lookups), 1)
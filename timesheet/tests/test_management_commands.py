@@ -1,14 +1,23 @@
-from unittest.mock import call, patch
+import threading
+from contextlib import ExitStack, contextmanager
+from datetime import timedelta
+from io import StringIO
+from unittest.mock import ANY, patch
 
 from django.contrib.auth import get_user_model
 from django.core.management import call_command
 from django.core.management.base import CommandError
 from django.test import TestCase
+from django.utils import timezone
 
+from timesheet.enums.doctype import DocType
+from timesheet.models.erp_sync import ErpSyncState
 from timesheet.models.project import Project
 from timesheet.models.project_member import ProjectMember
 from timesheet.models.user_project import UserProject
-from timesheet.utils.erp import ProjectsNotFound
+from timesheet.tests.model_factories import TimelogFactory
+from timesheet.utils.erp import HolidayListCache, ProjectsNotFound
+from timesheet.utils.sync_graph import SyncGraph
 
 User = get_user_model()
 
@@ -18,11 +27,19 @@ PATCHED = {
     'pull_projects_only': f'{MODULE}.pull_projects_only_from_erp',
     'pull_tasks':         f'{MODULE}.pull_tasks_from_erp',
     'pull_members':       f'{MODULE}.pull_project_members_from_erp',
-    'pull_leave':         f'{MODULE}.pull_leave_data_from_erp',
-    'pull_holiday':       f'{MODULE}.pull_holiday_list',
-    'update_schedule':    f'{MODULE}.update_schedule_countdown',
-    'pull_department':    f'{MODULE}.pull_department_from_erp',
-    'pull_user_data':     f'{MODULE}.pull_user_data_from_erp',
+    'sync_billable':      f'{MODULE}.sync_company_billable_hours',
+    'report_rows_synced': f'{MODULE}.report_rows_synced',
+    'fetch_leave':        f'{MODULE}.fetch_leave_data',
+    'save_leave':         f'{MODULE}.save_leave_data',
+    'fetch_holiday':      f'{MODULE}.fetch_public_holidays',
+    'save_holiday':       f'{MODULE}.save_public_holidays',
+    'recount_tasks':      f'{MODULE}.recount_tasks',
+    'fetch_department':   f'{MODULE}.fetch_departments',
+    'save_department':    f'{MODULE}.save_departments',
+    'fetch_user_data':    f'{MODULE}.fetch_employee_data',
+    'save_user_data':     f'{MODULE}.save_user_data',
+    'fetch_report_sync':  f'{MODULE}.fetch_report_sync',
+    'save_report_rows':   f'{MODULE}.save_report_rows',
 }
 
 
@@ -34,15 +51,19 @@ def _make_user(username, email, api_secret='', oauth_token='', is_active=True):
     return user
 
 
-def _all_pmo_patches():
-    """Decorator stack that patches all three PMO sync functions."""
-    def decorator(fn):
-        for key in ('pull_user_data', 'pull_department', 'update_schedule',
-                    'pull_holiday', 'pull_leave', 'pull_members', 'pull_tasks'):
-            fn = patch(PATCHED[key])(fn)
-        fn = patch(PATCHED['pull_projects_only'], return_value=[])(fn)
-        return fn
-    return decorator
+@contextmanager
+def _patched_sync(**overrides):
+    """Patch every ERP call made by the command; yields the mocks keyed like PATCHED.
+
+    Keyword arguments are passed to the matching patch, e.g. pull_projects_only={'return_value': [1]}.
+    """
+    options = {'pull_projects_only': {'return_value': []}, 'report_rows_synced': {'return_value': True}}
+    options.update(overrides)
+    with ExitStack() as stack:
+        yield {
+            key: stack.enter_context(patch(target, **options.get(key, {})))
+            for key, target in PATCHED.items()
+        }
 
 
 # ── PMO sync ──────────────────────────────────────────────────────────────────
@@ -51,49 +72,51 @@ class TestPMOSync(TestCase):
 
     def _run(self, **kwargs):
         """Run command with all ERP calls mocked; return the mock objects."""
-        with patch(PATCHED['pull_projects_only'], return_value=[]) as mp, \
-             patch(PATCHED['pull_tasks']) as mt, \
-             patch(PATCHED['pull_members']) as mm, \
-             patch(PATCHED['pull_leave']), \
-             patch(PATCHED['pull_holiday']), \
-             patch(PATCHED['update_schedule']), \
-             patch(PATCHED['pull_department']), \
-             patch(PATCHED['pull_user_data']):
+        with _patched_sync() as mocks:
             call_command('update_erp_data', **kwargs)
-            return mp, mt, mm
+            return mocks['pull_projects_only'], mocks['pull_tasks'], mocks['pull_members']
 
     def test_pmo_sync_uses_global_token_by_default(self):
         mp, mt, mm = self._run()
-        mp.assert_called_once_with(None, filters='[["status", "=", "Open"]]')
+        mp.assert_called_once_with(None, filters='[["status", "=", "Open"]]', record_watermark=True)
 
     def test_pmo_sync_uses_specified_user(self):
         user = _make_user('pmgr', 'pmgr@example.com', api_secret='s')
         mp, mt, mm = self._run(user='pmgr')
-        mp.assert_called_once_with(user, filters='[["status", "=", "Open"]]')
+        mp.assert_called_once_with(user, filters='[["status", "=", "Open"]]', record_watermark=True)
 
     def test_invalid_user_raises_command_error(self):
         with self.assertRaises(CommandError):
             call_command('update_erp_data', user='nobody')
 
     def test_no_open_projects_skips_tasks_and_members(self):
-        with patch(PATCHED['pull_projects_only'], side_effect=ProjectsNotFound), \
-             patch(PATCHED['pull_tasks']) as mt, \
-             patch(PATCHED['pull_members']) as mm, \
-             patch(PATCHED['pull_leave']), patch(PATCHED['pull_holiday']), \
-             patch(PATCHED['update_schedule']), patch(PATCHED['pull_department']), \
-             patch(PATCHED['pull_user_data']):
+        with _patched_sync(pull_projects_only={'side_effect': ProjectsNotFound}) as mocks:
+            call_command('update_erp_data')
+        mocks['pull_tasks'].assert_not_called()
+        mocks['pull_members'].assert_not_called()
+        mocks['sync_billable'].assert_not_called()
+
+    def test_no_open_projects_still_runs_per_user_sync(self):
+        user = _make_user('u1', 'u1@example.com', api_secret='s1')
+        with _patched_sync(pull_projects_only={'side_effect': ProjectsNotFound}) as mocks:
             call_command('update_erp_data')
-        mt.assert_not_called()
-        mm.assert_not_called()
+        mocks['fetch_leave'].assert_called_once_with(user, since='')
+        mocks['recount_tasks'].assert_called_once()
+
+    def test_countdown_runs_in_process_by_default(self):
+        with _patched_sync() as mocks:
+            call_command('update_erp_data', workers=8)
+        mocks['recount_tasks'].assert_called_once_with(ANY, workers=1)
+
+    def test_countdown_workers_option(self):
+        with _patched_sync() as mocks:
+            call_command('update_erp_data', countdown_workers=3)
+        mocks['recount_tasks'].assert_called_once_with(ANY, workers=3)
 
     def test_stale_projects_marked_inactive(self):
         kept = Project.objects.create(name='Kept', is_active=True)
         stale = Project.objects.create(name='Stale', is_active=True)
-        with patch(PATCHED['pull_projects_only'], return_value=[kept.id]), \
-             patch(PATCHED['pull_tasks']), patch(PATCHED['pull_members']), \
-             patch(PATCHED['pull_leave']), patch(PATCHED['pull_holiday']), \
-             patch(PATCHED['update_schedule']), patch(PATCHED['pull_department']), \
-             patch(PATCHED['pull_user_data']):
+        with _patched_sync(pull_projects_only={'return_value': [kept.id]}):
             call_command('update_erp_data')
         stale.refresh_from_db()
         kept.refresh_from_db()
@@ -102,19 +125,37 @@ class TestPMOSync(TestCase):
 
     def test_tasks_and_members_called_with_active_projects(self):
         project = Project.objects.create(name='Active', is_active=True)
-        with patch(PATCHED['pull_projects_only'], return_value=[project.id]) as mp, \
-             patch(PATCHED['pull_tasks']) as mt, \
-             patch(PATCHED['pull_members']) as mm, \
-             patch(PATCHED['pull_leave']), patch(PATCHED['pull_holiday']), \
-             patch(PATCHED['update_schedule']), patch(PATCHED['pull_department']), \
-             patch(PATCHED['pull_user_data']):
+        with _patched_sync(pull_projects_only={'return_value': [project.id]}) as mocks:
             call_command('update_erp_data')
+        mt, mm = mocks['pull_tasks'], mocks['pull_members']
         mt.assert_called_once()
-        mm.assert_called_once()
-        _, mt_kwargs = mt.call_args
+        mm.assert_called_once_with(None, project_names=['Active'], record_watermark=True)
         passed_projects = mt.call_args[0][1]
         self.assertIn(project, passed_projects)
 
+    def test_billable_hours_summed_once_for_all_projects_after_report_rows(self):
+        first = Project.objects.create(name='First', is_active=True)
+        second = Project.objects.create(name='Second', is_active=True)
+        order = []
+        with _patched_sync(
+            pull_projects_only={'return_value': [first.id, second.id]},
+            save_report_rows={'side_effect': lambda *args, **kwargs: order.append('report_rows') or 0},
+            sync_billable={'side_effect': lambda projects: order.append('billable') or 0},
+        ) as mocks:
+            call_command('update_erp_data')
+        mocks['sync_billable'].assert_called_once()
+        self.assertCountEqual(mocks['sync_billable'].call_args[0][0], [first, second])
+        self.assertEqual(order, ['report_rows', 'billable'])
+
+    def test_billable_hours_skipped_until_report_rows_cached(self):
+        project = Project.objects.create(name='Active', is_active=True)
+        with _patched_sync(
+            pull_projects_only={'return_value': [project.id]},
+            report_rows_synced={'return_value': False},
+        ) as mocks:
+            call_command('update_erp_data')
+        mocks['sync_billable'].assert_not_called()
+
 
 # ── UserProject sync from members ─────────────────────────────────────────────
 
@@ -125,11 +166,7 @@ class TestUserProjectSync(TestCase):
         member_user = _make_user('member', 'member@example.com')
         ProjectMember.objects.create(project=project, user=member_user, role='Dev')
 
-        with patch(PATCHED['pull_projects_only'], return_value=[project.id]), \
-             patch(PATCHED['pull_tasks']), patch(PATCHED['pull_members']), \
-             patch(PATCHED['pull_leave']), patch(PATCHED['pull_holiday']), \
-             patch(PATCHED['update_schedule']), patch(PATCHED['pull_department']), \
-             patch(PATCHED['pull_user_data']):
+        with _patched_sync(pull_projects_only={'return_value': [project.id]}):
             call_command('update_erp_data')
 
         self.assertTrue(UserProject.objects.filter(user=member_user, project=project).exists())
@@ -140,11 +177,7 @@ class TestUserProjectSync(TestCase):
         ProjectMember.objects.create(project=project, user=member_user, role='Dev')
         UserProject.objects.create(user=member_user, project=project)
 
-        with patch(PATCHED['pull_projects_only'], return_value=[project.id]), \
-             patch(PATCHED['pull_tasks']), patch(PATCHED['pull_members']), \
-             patch(PATCHED['pull_leave']), patch(PATCHED['pull_holiday']), \
-             patch(PATCHED['update_schedule']), patch(PATCHED['pull_department']), \
-             patch(PATCHED['pull_user_data']):
+        with _patched_sync(pull_projects_only={'return_value': [project.id]}):
             call_command('update_erp_data')
 
         self.assertEqual(UserProject.objects.filter(user=member_user, project=project).count(), 1)
@@ -155,15 +188,12 @@ class TestUserProjectSync(TestCase):
 class TestPerUserSync(TestCase):
 
     def _run_with_user(self, user):
-        with patch(PATCHED['pull_projects_only'], return_value=[]), \
-             patch(PATCHED['pull_tasks']), patch(PATCHED['pull_members']), \
-             patch(PATCHED['pull_leave']) as ml, \
-             patch(PATCHED['pull_holiday']) as mh, \
-             patch(PATCHED['update_schedule']) as ms, \
-             patch(PATCHED['pull_department']) as md, \
-             patch(PATCHED['pull_user_data']) as mu:
+        with _patched_sync() as mocks:
             call_command('update_erp_data')
-            return ml, mh, ms, md, mu
+            return (
+                mocks['fetch_leave'], mocks['fetch_holiday'], mocks['recount_tasks'],
+                mocks['fetch_department'], mocks['fetch_user_data'],
+            )
 
     def test_users_without_credentials_skipped(self):
         _make_user('plain', 'plain@example.com')
@@ -179,15 +209,35 @@ class TestPerUserSync(TestCase):
     def test_api_secret_user_triggers_per_user_sync(self):
         user = _make_user('u1', 'u1@example.com', api_secret='secret')
         ml, mh, ms, md, mu = self._run_with_user(user)
-        ml.assert_called_once_with(user)
-        mh.assert_called_once_with(user)
-        ms.assert_called_once_with(user)
+        ml.assert_called_once_with(user, since='')
+        mh.assert_called_once_with(user, ANY)
+        self.assertIsInstance(mh.call_args.args[1], HolidayListCache)
+        ms.assert_called_once()
         mu.assert_called_once_with(user)
 
     def test_oauth_token_user_triggers_per_user_sync(self):
         user = _make_user('oauth', 'oauth@example.com', oauth_token='tok123')
         ml, mh, ms, md, mu = self._run_with_user(user)
-        ml.assert_called_once_with(user)
+        ml.assert_called_once_with(user, since='')
+
+    def test_expired_oauth_token_refreshed_before_fetches(self):
+        user = _make_user('oauth', 'oauth@example.com', oauth_token='old')
+        user.profile.erpnext_oauth_refresh_token = 'refresh'
+        user.profile.erpnext_oauth_token_expires_at = timezone.now() - timedelta(minutes=1)
+        user.profile.save()
+        refreshed_on = []
+
+        def refresh(profile):
+            refreshed_on.append(threading.current_thread())
+            profile.erpnext_oauth_access_token = 'new'
+            profile.erpnext_oauth_token_expires_at = timezone.now() + timedelta(hours=1)
+            profile.save()
+            return True
+
+        with patch('timesheet.utils.erpnext_oauth.refresh_oauth_token', side_effect=refresh):
+            ml, mh, ms, md, mu = self._run_with_user(user)
+        self.assertEqual(refreshed_on, [threading.main_thread()])
+        ml.assert_called_once_with(user, since='')
 
     def test_department_synced_only_once_for_multiple_users(self):
         _make_user('u1', 'u1@example.com', api_secret='s1')
@@ -200,3 +250,156 @@ class TestPerUserSync(TestCase):
         _make_user('u2', 'u2@example.com', api_secret='s2')
         ml, _, _, _, _ = self._run_with_user(None)
         self.assertEqual(ml.call_count, 2)
+
+    def test_fetched_data_saved_for_user(self):
+        user = _make_user('u1', 'u1@example.com', api_secret='s1')
+        employee = {'employee': 'EMP-1'}
+        with _patched_sync(
+            fetch_user_data={'return_value': employee},
+            fetch_leave={'return_value': ['leave']},
+            fetch_holiday={'return_value': ['holiday']},
+        ) as mocks:
+            call_command('update_erp_data')
+        mocks['save_user_data'].assert_called_once_with(user, employee)
+        mocks['save_leave'].assert_called_once_with(user, ['leave'], since='')
+        mocks['save_holiday'].assert_called_once_with(user, ['holiday'])
+
+    def test_failed_fetch_does_not_stop_other_users(self):
+        _make_user('u1', 'u1@example.com', api_secret='s1')
+        _make_user('u2', 'u2@example.com', api_secret='s2')
+        with _patched_sync(fetch_leave={'side_effect': [RuntimeError('ERPNext down'), []]}) as mocks:
+            call_command('update_erp_data')
+        self.assertEqual(mocks['save_leave'].call_count, 1)
+        mocks['recount_tasks'].assert_called_once()
+
+
+# ── Incremental sync ──────────────────────────────────────────────────────────
+
+class TestIncrementalSync(TestCase):
+
+    def _mark_full_sync_done(self):
+        for doctype in (DocType.PROJECT, DocType.TASK):
+            ErpSyncState.advance(doctype.value, '2026-01-01 00:00:00.000000', full=True)
+
+    def _run(self, project_ids):
+        with _patched_sync(pull_projects_only={'return_value': project_ids}) as mocks:
+            call_command('update_erp_data', incremental=True)
+            return (
+                mocks['pull_projects_only'], mocks['pull_tasks'], mocks['pull_members'],
+                mocks['fetch_leave'], mocks['sync_billable'],
+            )
+
+    def test_falls_back_to_full_sync_without_watermark(self):
+        mp, mt, mm, ml, mb = self._run([])
+        mp.assert_called_once_with(None, filters='[["status", "=", "Open"]]', record_watermark=True)
+
+    def test_falls_back_to_full_sync_when_interval_elapsed(self):
+        self._mark_full_sync_done()
+        ErpSyncState.objects.update(last_full_sync_at=timezone.now() - timedelta(days=30))
+        mp, mt, mm, ml, mb = self._run([])
+        mp.assert_called_once_with(None, filters='[["status", "=", "Open"]]', record_watermark=True)
+
+    def test_incremental_only_syncs_changed_projects(self):
+        self._mark_full_sync_done()
+        changed = Project.objects.create(name='Changed', is_active=True)
+        untouched = Project.objects.create(name='Untouched', is_active=True)
+        mp, mt, mm, ml, mb = self._run([changed.id])
+
+        mp.assert_called_once_with(None, incremental=True)
+        self.assertEqual(mt.call_args[0][1], [changed])
+        self.assertEqual(mt.call_args[1], {'incremental': True})
+        mm.assert_called_once_with(None, incremental=True)
+        mb.assert_called_once()
+        untouched.refresh_from_db()
+        self.assertTrue(untouched.is_active)
+
+    def test_incremental_members_use_their_own_watermark(self):
+        self._mark_full_sync_done()
+        mp, mt, mm, ml, mb = self._run([])
+        mm.assert_called_once_with(None, incremental=True)
+
+    def test_incremental_still_refreshes_billable_for_all_projects(self):
+        self._mark_full_sync_done()
+        Project.objects.create(name='Untouched', is_active=True)
+        mp, mt, mm, ml, mb = self._run([])
+        mb.assert_called_once()
+
+    def test_incremental_leave_sync(self):
+        self._mark_full_sync_done()
+        user = _make_user('u1', 'u1@example.com', api_secret='s1')
+        ErpSyncState.advance(DocType.LEAVE.value, '2026-02-01 00:00:00.000000', scope=str(user.pk))
+        mp, mt, mm, ml, mb = self._run([])
+        ml.assert_called_once_with(user, since='2026-02-01 00:00:00.000000')
+
+
+# ── Sync graph ────────────────────────────────────────────────────────────────
+
+class TestSyncGraph(TestCase):
+
+    def test_applies_run_in_dependency_order(self):
+        order = []
+        graph = SyncGraph(max_workers=4)
+        graph.add('b', fetch=lambda: 'b', apply=order.append, requires=('a',))
+        graph.add('a', fetch=lambda: 'a', apply=order.append)
+        graph.add('c', apply=lambda: order.append('c'), after=('a', 'b'))
+        graph.run()
+        self.assertEqual(order, ['a', 'b', 'c'])
+
+    def test_failed_requirement_skips_dependents_but_not_after(self):
+        calls = []
+
+        def fail():
+            raise RuntimeError('boom')
+
+        graph = SyncGraph()
+        graph.add('a', fetch=fail, apply=calls.append)
+        graph.add('b', apply=lambda: calls.append('b'), requires=('a',))
+        graph.add('c', apply=lambda: calls.append('c'), after=('a',))
+        graph.run()
+        self.assertEqual(calls, ['c'])
+        self.assertEqual(graph.failed, {'a', 'b'})
+
+    def test_phases_added_while_running(self):
+        calls = []
+        graph = SyncGraph()
+        graph.add('a', apply=lambda: graph.add('b', fetch=lambda: 'b', apply=calls.append, group='extra'))
+        timings = graph.run()
+        self.assertEqual(calls, ['b'])
+        self.assertEqual(list(timings), ['a', 'extra'])
+
+
+# ── Countdown ─────────────────────────────────────────────────────────────────
+
+class TestUpdateCountdown(TestCase):
+
+    @patch('timesheet.management.commands.update_countdown.recount_tasks', return_value=0)
+    @patch('timesheet.management.commands.update_countdown.countdown_tasks', return_value=[1, 2])
+    def test_since_limits_tasks(self, mock_tasks, mock_recount):
+        call_command('update_countdown', since='2024-03-01', workers=2)
+        since = mock_tasks.call_args.kwargs['since']
+        self.assertEqual(since.date().isoformat(), '2024-03-01')
+        self.assertTrue(timezone.is_aware(since))
+        mock_recount.assert_called_once_with([1, 2], workers=2)
+
+    @patch('timesheet.management.commands.update_countdown.recount_tasks', return_value=0)
+    @patch('timesheet.management.commands.update_countdown.countdown_tasks', return_value=[])
+    def test_without_since_recounts_all_tasks(self, mock_tasks, mock_recount):
+        call_command('update_countdown')
+        mock_tasks.assert_called_once_with(since=None)
+
+    def test_invalid_since_raises_command_error(self):
+        with self.assertRaises(CommandError):
+            call_command('update_countdown', since='yesterday')
+
+
+class BenchmarkDescriptionsCommandTest(TestCase):
+    def test_benchmark_over_database_descriptions(self):
+        TimelogFactory.create(description='<ul><li>One</li><li>Two</li></ul>')
+        out = StringIO()
+        call_command('benchmark_descriptions', '--repeat', '1', stdout=out)
+        self.assertIn('1 descriptions', out.getvalue())
+        self.assertIn('parse on read (before)', out.getvalue())
+
+    def test_no_descriptions(self):
+        with self.assertRaises(CommandError):
+            call_command('benchmark_descriptions')
@@ -1,5 +1,10 @@
+from unittest.mock import patch
+
 from django.test import TestCase
 
+from timesheet.models import Timelog
+from timesheet.serializers.timesheet import TimelogSerializer, TimelogSerializerERP
+from timesheet.utils.description import clean_description
 from timesheet.tests.model_factories import *
 
 
@@ -16,3 +21,111 @@ class TestTimelogModel(TestCase):
             str(model),
             f'{model.user} - {model.task}'
         )
+
+
+class TestTimelogTree(TestCase):
+    def setUp(self) -> None:
+        self.user = UserFactory.create()
+        self.task = TaskFactory.create()
+        self.root = TimelogFactory.create(user=self.user, task=self.task)
+        self.child = TimelogFactory.create(user=self.user, task=self.task, parent=self.root)
+        self.grandchild = TimelogFactory.create(user=self.user, task=self.task, parent=self.child)
+        self.other = TimelogFactory.create(user=self.user, task=self.task, parent=self.root)
+
+    def _roots(self):
+        return dict(Timelog.objects.values_list('id', 'root_id'))
+
+    def test_root_pointers(self):
+        self.assertEqual(self._roots(), {
+            self.root.id: None,
+            self.child.id: self.root.id,
+            self.grandchild.id: self.root.id,
+            self.other.id: self.root.id,
+        })
+        with self.assertNumQueries(1):
+            self.assertEqual(self.grandchild.get_root_ancestor(), self.root)
+        with self.assertNumQueries(1):
+            descendants = self.root.get_all_descendants()
+        self.assertEqual(
+            [timelog.id for timelog in descendants],
+            [self.child.id, self.other.id, self.grandchild.id]
+        )
+
+    def test_detaching_moves_descendants(self):
+        self.child.parent = None
+        self.child.save()
+        self.assertEqual(self._roots()[self.grandchild.id], self.child.id)
+        self.assertEqual(self._roots()[self.other.id], self.root.id)
+
+        self.child.parent = self.other
+        self.child.save()
+        self.assertEqual(self._roots()[self.child.id], self.root.id)
+        self.assertEqual(self._roots()[self.grandchild.id], self.root.id)
+
+    def test_rebuild_after_queryset_update(self):
+        Timelog.objects.filter(id=self.other.id).update(parent=None)
+        Timelog.objects.filter(id=self.child.id).update(parent=self.other)
+        Timelog.rebuild_roots(self.root.id)
+        self.assertEqual(self._roots(), {
+            self.root.id: None,
+            self.child.id: self.other.id,
+            self.grandchild.id: self.other.id,
+            self.other.id: None,
+        })
+
+    def test_serializer_loads_trees_once(self):
+        for _ in range(3):
+            root = TimelogFactory.create(user=self.user, task=self.task)
+            TimelogFactory.create(user=self.user, task=self.task, parent=root)
+        timelogs = Timelog.objects.select_related(
+            'user__profile', 'task__project', 'project', 'activity'
+        ).order_by('id')
+        with self.assertNumQueries(2):
+            data = TimelogSerializer(timelogs, many=True).data
+        root_data = data[0]
+        self.assertEqual(root_data['total_children'], 3)
+        self.assertAlmostEqual(root_data['all_hours'], 4.0, places=3)
+        self.assertEqual(
+            root_data['all_to_time'],
+            max(self.child.end_time, self.grandchild.end_time, self.other.end_time).strftime('%Y-%m-%d %H:%M:%S')
+        )
+        self.assertEqual(data[1]['total_children'], 1)
+
+
+class TestTimelogDescription(TestCase):
+    def test_clean_description(self):
+        html = (
+            '<p><br></p><ul><li onclick="steal()">Fixed <a href="javascript:x()">map</a></li></ul>'
+            '<script>alert(1)</script><p> </p>'
+        )
+        self.assertEqual(
+            clean_description(html),
+            '<ul><li>Fixed <a>map</a></li></ul>'
+        )
+        self.assertEqual(clean_description('Plain text'), 'Plain text')
+        self.assertEqual(clean_description(None), '')
+
+    def test_text_rendered_on_save(self):
+        timelog = TimelogFactory.create(description='<p>Write <b>docs</b></p>')
+        self.assertEqual(timelog.description_text, 'Write **docs**\n\n')
+
+        timelog = Timelog.objects.get(pk=timelog.pk)
+        timelog.description = '<ul><li>Review</li></ul>'
+        timelog.save(update_fields=['description'])
+        timelog.refresh_from_db()
+        self.assertEqual(timelog.description_text, '  * Review\n\n')
+
+    def test_text_not_rendered_when_unchanged(self):
+        timelog = TimelogFactory.create(description='<p>Plan</p>')
+        timelog = Timelog.objects.get(pk=timelog.pk)
+        with patch('timesheet.models.timelog.description_to_text') as render:
+            timelog.end_time = timelog.start_time
+            timelog.save()
+        render.assert_not_called()
+
+    def test_erp_serializer_uses_stored_text(self):
+        timelog = TimelogFactory.create(description='<p>Plan</p>')
+        with patch('timesheet.serializers.timesheet.description_to_text') as render:
+            data = TimelogSerializerERP(Timelog.objects.get(pk=timelog.pk)).data
+        render.assert_not_called()
+        self.assertEqual(data['description'], 'Plan\n\n')
@@ -10,6 +10,7 @@ from timesheet.api_views.timesheet import (
     SubmitTimeLogsAPIView,
     ClearSubmittedTimesheetsAPIView,
     BreakTimesheet,
+    BulkBreakTimesheet,
     PauseTimesheetAPIView
 )
 from timesheet.api_views.activity_list import ActivityList
@@ -82,6 +83,9 @@ urlpatterns = [
     path('api/break-timesheet/<int:timelog_id>/',
          BreakTimesheet.as_view(),
          name='break-timesheet'),
+    path('api/break-timesheets/',
+         BulkBreakTimesheet.as_view(),
+         name='break-timesheets'),
     path('api/submit-timesheet/',
          SubmitTimeLogsAPIView.as_view(),
          name='submit-timesheet'),
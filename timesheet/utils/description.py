@@ -0,0 +1,65 @@
+import html2text
+from bs4 import BeautifulSoup
+
+# Elements dropped with their content, and attributes dropped from every tag
+UNSAFE_TAGS = ('script', 'style', 'iframe', 'object', 'embed')
+URL_ATTRIBUTES = ('href', 'src')
+
+
+def _is_plain_text(html: str) -> bool:
+    # Nothing the parser would change: no markup and no entities
+    return '<' not in html and '>' not in html and '&' not in html
+
+
+def clean_description(html: str) -> str:
+    """
+    Canonical HTML of a timelog description, in one parse: scripts, event
+    handlers and javascript: links are removed, as are empty paragraphs
+    (e.g. <p><br></p> or paragraphs that only contain whitespace).
+    """
+    if not html or _is_plain_text(html):
+        return html or ''
+    soup = BeautifulSoup(html, 'html.parser')
+    for tag in soup.find_all(UNSAFE_TAGS):
+        tag.decompose()
+    for tag in soup.find_all(True):
+        for attribute in list(tag.attrs):
+            value = tag.attrs[attribute]
+            if attribute.lower().startswith('on'):
+                del tag.attrs[attribute]
+            elif (
+                attribute.lower() in URL_ATTRIBUTES and
+                isinstance(value, str) and
+                value.strip().lower().startswith('javascript:')
+            ):
+                del tag.attrs[attribute]
+    for p in soup.find_all('p'):
+        # If the paragraph contains no non-whitespace text, remove it.
+        if not p.get_text(strip=True):
+            p.decompose()
+    return str(soup)
+
+
+def description_to_text(html: str) -> str:
+    """Markdown rendering of a description, as sent to ERPNext."""
+    if not html:
+        return ''
+    converter = html2text.HTML2Text()
+    converter.ignore_links = False
+    return converter.handle(html)
+
+
+def description_items(html: str):
+    """
+    Bullet points of a description: the inner HTML of each <li>, or of each
+    <p> when there is no list. Returns (tag, items), tag None when the
+    description has neither.
+    """
+    if not html or _is_plain_text(html):
+        return None, []
+    soup = BeautifulSoup(html, 'html.parser')
+    for tag in ('li', 'p'):
+        elements = soup.find_all(tag)
+        if elements:
+            return tag, [element.decode_contents().strip() for element in elements]
+    return None, []
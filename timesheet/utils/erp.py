@@ -1,34 +1,36 @@
+import hashlib
 import json
+import threading
 import time
 from concurrent.futures import ThreadPoolExecutor, as_completed
-from datetime import datetime
+from datetime import datetime, timedelta
 from collections import OrderedDict
 from urllib.parse import quote
-import requests
 from django.utils.dateparse import parse_date
 from preferences import preferences
 import logging
 import calendar
 from django.conf import settings
-from django.db.models import Sum, Q
+from django.db.models import F, Sum, Q
 from django.db import transaction
-from django.db.utils import OperationalError
+from django.db.utils import IntegrityError, OperationalError
 
 from django.utils import timezone
 from django.contrib.auth import get_user_model
-from schedule.api_views.schedule import (
-    calculate_remaining_task_days, update_previous_schedules,
-    update_subsequent_schedules, _naive
-)
+from schedule.countdown import countdown_tasks, recount_tasks
 from schedule.models import Schedule
+from schedule.models.schedule import delete_schedules
+from schedule.cache import invalidate_schedule_cache
 from timesheet.enums.doctype import DocType
 from timesheet.models import Timelog, Project, Task, Activity
 from timesheet.models.department import Department
+from timesheet.models.erp_sync import ErpSyncState, TimesheetSubmission
 from pmo_dashboard.models import BusinessUnit
 from timesheet.models.project_member import ProjectMember
 from timesheet.models.profile import get_country_code_from_timezone
 from timesheet.models.user_project import UserProject
 from timesheet.serializers.timesheet import TimelogSerializerERP
+from timesheet.utils.erp_client import get_erp_client
 from timesheet.utils.erpnext_oauth import get_valid_oauth_token
 
 logger = logging.getLogger(__name__)
@@ -74,6 +76,142 @@ class ProjectsNotFound(Exception):
     pass
 
 
+class ErpFetchError(Exception):
+    "Raised when a page of an ERPNext list could not be fetched"
+    pass
+
+
+PROJECT_FIELDS = [
+    'name', 'status', 'project_type', 'custom_business_unit',
+    'expected_start_date', 'expected_end_date', 'project_lead',
+    'custom_project_relations_manager', 'customer', 'rag',
+    'expected_time', 'actual_time', 'progress_in_hours', 'percent_complete',
+    'estimated_costing', 'total_sales_amount', 'total_costing_amount',
+    'total_billable_amount', 'total_billed_amount', 'gross_margin',
+    'per_gross_margin', 'modified',
+]
+
+TASK_FIELDS = ['name', 'subject', 'project', 'expected_time', 'actual_time', 'modified']
+
+
+BULK_BATCH_SIZE = 500
+# Report status of a batch recorded and sent by a concurrent submission
+ALREADY_SUBMITTED = 'already_submitted'
+# ErpSyncState scope of the project members watermark
+MEMBERS_SCOPE = 'members'
+
+PROJECT_UPDATE_FIELDS = [
+    'is_active', 'updated', 'project_type', 'business_unit',
+    'expected_start_date', 'expected_end_date', 'project_lead',
+    'relations_manager', 'customer', 'rag', 'expected_time', 'actual_time',
+    'progress_in_hours', 'percent_complete', 'estimated_costing',
+    'total_sales_amount', 'total_costing_amount', 'total_billable_amount',
+    'total_billed_amount', 'gross_margin', 'per_gross_margin',
+]
+
+
+def _users_by_email(emails: set) -> dict:
+    """Return {lowercased email: User} for the given emails, creating stub accounts as needed."""
+    emails = {email.lower() for email in emails if email}
+    users = {
+        u.email.lower(): u
+        for u in get_user_model().objects.filter(email__in=emails)
+    }
+    for email in emails - users.keys():
+        # Created one by one so the profile post_save signal still fires.
+        users[email] = _user_by_email(email)
+    return users
+
+
+def _bulk_upsert_projects(rows: OrderedDict, user: get_user_model() = None) -> list:
+    """Write ERPNext project rows keyed by name with bulk queries. Returns project IDs in row order."""
+    if not rows:
+        return []
+
+    business_units = {
+        bu.name: bu
+        for bu in BusinessUnit.objects.filter(
+            name__in={r.get('custom_business_unit') for r in rows.values() if r.get('custom_business_unit')}
+        )
+    }
+    for row in rows.values():
+        name = row.get('custom_business_unit', '')
+        if name and name not in business_units:
+            business_units[name] = BusinessUnit.objects.create(name=name)
+
+    users = _users_by_email({
+        email
+        for r in rows.values()
+        for email in (r.get('project_lead'), r.get('custom_project_relations_manager'))
+    })
+
+    existing = {}
+    for project in Project.objects.filter(name__in=rows.keys()).order_by('id'):
+        existing.setdefault(project.name, project)
+
+    updated = timezone.now()
+    to_create = []
+    to_update = []
+    for name, row in rows.items():
+        project = existing.get(name) or Project(name=name)
+        project_type = row.get('project_type')
+        project.is_active = row.get('status', '') == 'Open'
+        project.updated = updated
+        project.project_type = project_type.upper() if project_type else ''
+        project.business_unit = business_units.get(row.get('custom_business_unit', ''))
+        project.expected_start_date = row.get('expected_start_date') or None
+        project.expected_end_date = row.get('expected_end_date') or None
+        project.project_lead = users.get((row.get('project_lead') or '').lower())
+        project.relations_manager = users.get((row.get('custom_project_relations_manager') or '').lower())
+        project.customer = row.get('customer') or ''
+        project.rag = row.get('rag') or ''
+        for field in (
+            'expected_time', 'actual_time', 'progress_in_hours', 'percent_complete',
+            'estimated_costing', 'total_sales_amount', 'total_costing_amount',
+            'total_billable_amount', 'total_billed_amount', 'gross_margin', 'per_gross_margin',
+        ):
+            setattr(project, field, row.get(field))
+        if project.pk:
+            to_update.append(project)
+        else:
+            to_create.append(project)
+
+    Project.objects.bulk_update(to_update, PROJECT_UPDATE_FIELDS, batch_size=BULK_BATCH_SIZE)
+    Project.objects.bulk_create(to_create, batch_size=BULK_BATCH_SIZE)
+
+    project_ids = {name: project.id for name, project in existing.items()}
+    project_ids.update(
+        Project.objects.filter(name__in=[p.name for p in to_create]).values_list('name', 'id')
+    )
+
+    if user:
+        linked = set(
+            UserProject.objects.filter(user=user, project_id__in=project_ids.values())
+            .values_list('project_id', flat=True)
+        )
+        UserProject.objects.bulk_create(
+            [UserProject(user=user, project_id=pid) for pid in project_ids.values() if pid not in linked],
+            batch_size=BULK_BATCH_SIZE,
+        )
+
+    return [project_ids[name] for name in rows]
+
+
+def _modified_since(filters: str, since: str) -> str:
+    """Append a `modified > since` condition to an ERPNext JSON filter string."""
+    if not since:
+        return filters
+    conditions = json.loads(filters) if filters else []
+    conditions.append(['modified', '>', since])
+    return json.dumps(conditions)
+
+
+def _latest_modified(current: str, row: dict) -> str:
+    # ERPNext returns `modified` as 'YYYY-MM-DD HH:MM:SS.ffffff', so string order is time order.
+    modified = row.get('modified') or ''
+    return modified if modified > current else current
+
+
 def get_erp_data(doctype: DocType, erpnext_token: str = None, filters: str = '', doctype_value: str = '', user=None) -> list:
     """Fetch a list (or single doc) from ERPNext REST API. Returns empty list on failure."""
     path = f'resource/{doctype.value}/{doctype_value}'.rstrip('/')
@@ -81,8 +219,7 @@ def get_erp_data(doctype: DocType, erpnext_token: str = None, filters: str = '',
     if filters:
         url += '&filters=' + filters
     headers = get_auth_headers(user=user, erpnext_token=erpnext_token)
-    response = requests.request(
-        'GET',
+    response = get_erp_client().get(
         url,
         headers=headers
     )
@@ -97,11 +234,51 @@ def get_erp_data(doctype: DocType, erpnext_token: str = None, filters: str = '',
     return response_data['data']
 
 
+def iter_erp_data(doctype: DocType, erpnext_token: str = None, filters: str = '', fields: list = None,
+                  user=None, page_length: int = None):
+    """Yield rows of an ERPNext doctype one page at a time.
+
+    Pages through limit_start/limit_page_length instead of asking ERPNext for the
+    whole table in one document. Pass fields to restrict the columns returned.
+    Pages are ordered by modified then name, so a row edited mid-stream moves to
+    the end (and may be seen twice) rather than shifting an unread row onto a
+    page already read. Raises ErpFetchError on the first failed page, so callers
+    never mistake a truncated stream for a complete one.
+    """
+    page_length = page_length or settings.ERPNEXT_PAGE_LENGTH
+    url = (
+        f'{settings.ERPNEXT_SITE_LOCATION}/api/resource/{doctype.value}'
+        f'?fields={json.dumps(fields or ["*"])}'
+        f'&order_by={quote("modified asc, name asc")}'
+    )
+    if filters:
+        url += '&filters=' + filters
+    headers = get_auth_headers(user=user, erpnext_token=erpnext_token)
+    client = get_erp_client()
+
+    start = 0
+    while True:
+        response = client.get(
+            f'{url}&limit_start={start}&limit_page_length={page_length}',
+            headers=headers
+        )
+        if not response.status_code == 200:
+            logger.error(response.content)
+            raise ErpFetchError(f'{doctype.value} page at {start} failed: {response.status_code}')
+        rows = response.json().get('data')
+        if rows is None:
+            raise ErpFetchError(f'{doctype.value} page at {start} has no data')
+        yield from rows
+        if len(rows) < page_length:
+            return
+        start += page_length
+
+
 def get_erp_project_detail(project_name: str, user=None) -> dict:
     """Fetch full project doc including child tables (e.g. project_team_members) by name."""
     url = f'{settings.ERPNEXT_SITE_LOCATION}/api/resource/Project/{quote(project_name)}?fields=["*"]'
     headers = get_auth_headers(user=user)
-    response = requests.get(url, headers=headers)
+    response = get_erp_client().get(url, headers=headers)
     if response.status_code != 200:
         logger.error(f'Failed to fetch project detail for {project_name}: {response.content}')
         return {}
@@ -118,7 +295,7 @@ def generate_api_secret(user: get_user_model()):
     headers = {
         'Authorization': 'token {}'.format(token)
     }
-    response = requests.post(
+    response = get_erp_client().post(
         url + user.email,
         headers=headers
     )
@@ -129,18 +306,53 @@ def generate_api_secret(user: get_user_model()):
             user.profile.save()
 
 
-@retry_operation
-def pull_holiday_list(user):
-    with transaction.atomic():
-        public_holidays = []
+class HolidayListCache:
+    """Holiday lists fetched from ERPNext, shared between users for one sync run.
 
-        employee_id = getattr(user.profile, 'employee_id', None)
-        if not employee_id:
-            pull_user_data_from_erp(user)
-            employee_id = getattr(user.profile, 'employee_id', None)
-        if not employee_id:
-            return
+    Staff share a handful of holiday lists, so each employee's list name, each
+    country's lists and each list's holidays are fetched once and reused. The
+    employee lookup is filled with a single Employee request up front. Safe to
+    share between fetch threads.
+    """
 
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._key_locks = {}
+        self._memo = {}
+
+    def _get(self, key, load):
+        # One lock per key: concurrent callers wait for the same fetch, not for each other's
+        with self._lock:
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+        with key_lock:
+            if key not in self._memo:
+                self._memo[key] = load()
+            return self._memo[key]
+
+    def employee_holiday_list(self, employee_id: str, user=None) -> str:
+        employees = self._get('employees', lambda: self._fetch_employee_holiday_lists(user))
+        if employee_id in employees:
+            return employees[employee_id]
+        # Not visible in the bulk listing, look the employee up directly
+        return self._get(('employee', employee_id), lambda: self._fetch_employee_holiday_list(employee_id, user))
+
+    def _fetch_employee_holiday_lists(self, user=None) -> dict:
+        employees = {}
+        try:
+            for employee in iter_erp_data(
+                    DocType.EMPLOYEE,
+                    preferences.TimesheetPreferences.admin_token,
+                    fields=['name', 'employee', 'holiday_list'],
+                    user=user):
+                for key in (employee.get('name'), employee.get('employee')):
+                    if key:
+                        employees[key] = employee.get('holiday_list') or ''
+        except ErpFetchError:
+            # Employees missing from a partial listing are looked up one by one
+            logger.warning('Employee holiday list listing failed', exc_info=True)
+        return employees
+
+    def _fetch_employee_holiday_list(self, employee_id: str, user=None) -> str:
         employee_docs = get_erp_data(
             DocType.EMPLOYEE,
             preferences.TimesheetPreferences.admin_token,
@@ -154,98 +366,117 @@ def pull_holiday_list(user):
                 f'[["employee", "=", "{employee_id}"]]',
                 user=user
             )
-
-        holiday_list_name = None
         if employee_docs:
-            emp = employee_docs[0]
-            holiday_list_name = emp.get('holiday_list')
+            return employee_docs[0].get('holiday_list') or ''
+        return ''
+
+    def country_holiday_lists(self, country_code: str, user=None) -> list:
+        return self._get(('country', country_code), lambda: self._fetch_country_holiday_lists(country_code, user))
 
-        if not holiday_list_name:
-            country_code = get_country_code_from_timezone(user.profile.timezone)
-            if not country_code:
-                return
+    def _fetch_country_holiday_lists(self, country_code: str, user=None) -> list:
+        holiday_list = get_erp_data(
+            DocType.HOLIDAY_LIST,
+            preferences.TimesheetPreferences.admin_token,
+            f'[["country", "=", "{country_code}"]]',
+            user=user
+        )
+        if len(holiday_list) == 0:
             holiday_list = get_erp_data(
                 DocType.HOLIDAY_LIST,
                 preferences.TimesheetPreferences.admin_token,
-                f'[["country", "=", "{country_code}"]]',
+                f'[["custom_country_code", "=", "{country_code}"]]',
                 user=user
             )
-            if len(holiday_list) == 0:
-                holiday_list = get_erp_data(
-                    DocType.HOLIDAY_LIST,
-                    preferences.TimesheetPreferences.admin_token,
-                    f'[["custom_country_code", "=", "{country_code}"]]',
-                    user=user
-                )
-            if len(holiday_list) > 0:
-                if len(holiday_list) > 1:
-                    holiday_data = next(
-                        (item for item in holiday_list if user.first_name.lower() in str(item.get('name','')).lower()),
-                        None
-                    )
-                    if holiday_data:
-                        holiday_list_name = holiday_data['name']
-                    else:
-                        holiday_list_name = holiday_list[0]['name']
-                else:
-                    holiday_list_name = holiday_list[0]['name']
-            else:
-                return
+        return [item['name'] for item in holiday_list]
 
-        current_year = datetime.now().year
-        first_day_of_current_year = f"{current_year}-01-01"
+    def public_holidays(self, holiday_list_name: str, user=None) -> list:
+        return self._get(('holidays', holiday_list_name), lambda: self._fetch_public_holidays(holiday_list_name, user))
 
-        holidays_doc = None
-        if holiday_list_name:
-            holidays_doc = get_erp_data(
-                DocType.HOLIDAY_LIST,
-                preferences.TimesheetPreferences.admin_token,
-                doctype_value=holiday_list_name,
-                user=user
-            )
+    def _fetch_public_holidays(self, holiday_list_name: str, user=None) -> list:
+        holidays_doc = get_erp_data(
+            DocType.HOLIDAY_LIST,
+            preferences.TimesheetPreferences.admin_token,
+            doctype_value=holiday_list_name,
+            user=user
+        )
+        first_day_of_current_year = parse_date(f"{datetime.now().year}-01-01")
 
+        public_holidays = []
         if isinstance(holidays_doc, dict) and 'holidays' in holidays_doc:
             for holiday in holidays_doc['holidays']:
                 if (
                     holiday['description'] not in ['Saturday', 'Sunday'] and
-                    parse_date(holiday['holiday_date']) >= parse_date(first_day_of_current_year)
+                    parse_date(holiday['holiday_date']) >= first_day_of_current_year
                 ):
                     public_holidays.append(holiday)
+        return public_holidays
 
-        if len(public_holidays) == 0:
-            return
 
-        activity, _ = Activity.objects.get_or_create(
-            name='Public holiday'
-        )
+def fetch_public_holidays(user, holiday_lists: HolidayListCache = None) -> list:
+    """Fetch this year's public holidays for the user's holiday list from ERPNext.
 
-        user_public_holidays = Schedule.objects.filter(
-            activity__name__icontains='Public holiday',
-            user=user
+    Network only, so it is safe to run off the main thread. Returns an empty list
+    when the user has no employee ID or no holiday list can be found. Pass a
+    shared holiday_lists cache to reuse lookups across users.
+    """
+    employee_id = getattr(user.profile, 'employee_id', None)
+    if not employee_id:
+        return []
+    holiday_lists = holiday_lists or HolidayListCache()
+
+    holiday_list_name = holiday_lists.employee_holiday_list(employee_id, user)
+    if not holiday_list_name:
+        country_code = get_country_code_from_timezone(user.profile.timezone)
+        if not country_code:
+            return []
+        names = holiday_lists.country_holiday_lists(country_code, user)
+        if not names:
+            return []
+        holiday_list_name = next(
+            (name for name in names if user.first_name.lower() in str(name).lower()),
+            names[0]
         )
-        user_public_holidays.delete()
 
-        for leave in public_holidays:
-            Schedule.objects.update_or_create(
-                erp_id=leave['description'],
+    return holiday_lists.public_holidays(holiday_list_name, user)
+
+
+@retry_operation
+def save_public_holidays(user, public_holidays: list):
+    """Replace the user's public holiday schedules with the fetched holidays."""
+    if len(public_holidays) == 0:
+        return
+
+    with transaction.atomic():
+        activity, _ = Activity.objects.get_or_create(
+            name='Public holiday'
+        )
+        holidays = OrderedDict()
+        for holiday in public_holidays:
+            day = _schedule_day(holiday['holiday_date'])
+            holidays[(holiday['description'], day)] = Schedule(
+                erp_id=holiday['description'],
                 user=user,
                 activity=activity,
-                start_time=leave['holiday_date'],
-                end_time=leave['holiday_date'],
-                defaults={
-                    'notes': leave['description']
-                }
+                start_time=day,
+                end_time=day,
+                notes=holiday['description']
             )
-            leave = Schedule.objects.filter(
-                erp_id=leave['description'],
-                start_time=leave['holiday_date'],
-                end_time=leave['holiday_date'],
+        changed = _replace_schedules(
+            Schedule.objects.filter(
+                activity__name__icontains='Public holiday',
                 user=user
-            )
-            if leave.count() > 1:
-                leave.exclude(
-                    id=leave.last().id
-                ).delete()
+            ),
+            holidays.values()
+        )
+    if changed:
+        invalidate_schedule_cache([])
+
+
+@retry_operation
+def pull_holiday_list(user, holiday_lists: HolidayListCache = None):
+    if not getattr(user.profile, 'employee_id', None):
+        pull_user_data_from_erp(user)
+    save_public_holidays(user, fetch_public_holidays(user, holiday_lists))
 
 
 def generate_api_key(user: get_user_model()):
@@ -273,10 +504,14 @@ def generate_api_key(user: get_user_model()):
             user.profile.save()
 
 
-def pull_department_from_erp(user=None):
-    """Sync ERPNext departments into local Department model and Django Groups."""
+def fetch_departments(user=None) -> list:
+    """Fetch ERPNext departments. Network only."""
+    return get_erp_data(DocType.DEPARTMENT, user=user)
+
+
+def save_departments(departments: list):
+    """Upsert ERPNext departments into the local Department model and Django Groups."""
     from django.contrib.auth.models import Group
-    departments = get_erp_data(DocType.DEPARTMENT, user=user)
     for dept in departments:
         if dept.get('disabled'):
             continue
@@ -292,8 +527,13 @@ def pull_department_from_erp(user=None):
         )
 
 
-def pull_user_data_from_erp(user: get_user_model()):
-    """Sync employee name, ID, and department from ERPNext into the user's local profile."""
+def pull_department_from_erp(user=None):
+    """Sync ERPNext departments into local Department model and Django Groups."""
+    save_departments(fetch_departments(user))
+
+
+def fetch_employee_data(user: get_user_model()):
+    """Fetch the ERPNext Employee record matching the user's email, or None. Network only."""
 
     # if not user.profile.token:
     #     generate_api_key(user)
@@ -304,25 +544,38 @@ def pull_user_data_from_erp(user: get_user_model()):
         user=user
     )
     if len(employee) > 0:
-        employee_data = employee[0]
-        user.profile.employee_name = employee_data['employee_name']
-        user.profile.employee_id = employee_data['employee']
+        return employee[0]
+    return None
 
-        dept_erp_id = employee_data.get('department', '')
-        if dept_erp_id:
-            try:
-                department = Department.objects.get(erp_id=dept_erp_id)
-                user.profile.department = department
-                if department.group:
-                    user.groups.add(department.group)
-            except Department.DoesNotExist:
-                pass
 
-        user.profile.save()
+def save_user_data(user: get_user_model(), employee_data):
+    """Copy employee name, ID, and department from an ERPNext Employee record onto the user."""
+    if not employee_data:
+        return
+
+    user.profile.employee_name = employee_data['employee_name']
+    user.profile.employee_id = employee_data['employee']
+
+    dept_erp_id = employee_data.get('department', '')
+    if dept_erp_id:
+        try:
+            department = Department.objects.get(erp_id=dept_erp_id)
+            user.profile.department = department
+            if department.group:
+                user.groups.add(department.group)
+        except Department.DoesNotExist:
+            pass
 
-        user.first_name = employee_data['first_name']
-        user.last_name = employee_data['last_name']
-        user.save()
+    user.profile.save()
+
+    user.first_name = employee_data['first_name']
+    user.last_name = employee_data['last_name']
+    user.save()
+
+
+def pull_user_data_from_erp(user: get_user_model()):
+    """Sync employee name, ID, and department from ERPNext into the user's local profile."""
+    save_user_data(user, fetch_employee_data(user))
 
 
 def _user_by_email(email: str):
@@ -338,12 +591,38 @@ def _user_by_email(email: str):
 
 
 @retry_operation
-def pull_project_members_from_erp(user: get_user_model(), project_names: list = None):
+def pull_project_members_from_erp(user: get_user_model(), project_names: list = None,
+                                  incremental: bool = False, record_watermark: bool = False):
     """Sync ERPNext project team members into the local ProjectMember model.
 
     If project_names is given, syncs only those projects in parallel (no stale detection).
     If project_names is None (default), syncs all projects in parallel and removes stale ones.
+
+    With incremental=True only projects modified since the members watermark are
+    synced; the team is a child table, so editing it bumps the project's modified.
+    The members watermark has its own scope so a failed members sync is retried
+    even when the project sync went through. Set record_watermark on full runs to
+    start it from the project watermark recorded just before.
     """
+    since = ''
+    if incremental:
+        since = ErpSyncState.get_watermark(DocType.PROJECT.value, MEMBERS_SCOPE)
+        last_modified = since
+        project_names = []
+        for project in iter_erp_data(
+                DocType.PROJECT, user=user, filters=_modified_since('', since), fields=['name', 'modified']):
+            last_modified = _latest_modified(last_modified, project)
+            project_names.append(project['name'])
+    elif record_watermark:
+        last_modified = ErpSyncState.get_watermark(DocType.PROJECT.value)
+
+    _sync_project_members(user, project_names)
+
+    if incremental or record_watermark:
+        ErpSyncState.advance(DocType.PROJECT.value, last_modified, scope=MEMBERS_SCOPE, full=not since)
+
+
+def _sync_project_members(user, project_names: list = None):
     is_subset = project_names is not None
 
     if is_subset:
@@ -448,113 +727,141 @@ def pull_project_members_from_erp(user: get_user_model(), project_names: list =
             ])
 
 
-def pull_projects_only_from_erp(user: get_user_model(), filters: str = '') -> list:
+def pull_projects_only_from_erp(user: get_user_model(), filters: str = '', incremental: bool = False,
+                                record_watermark: bool = False) -> list:
     """Upsert projects from ERPNext into the local DB. Returns list of updated project IDs.
 
     Does not sync tasks or activities — call pull_tasks_from_erp / pull_activities_from_erp
     separately, or use pull_projects_from_erp to do all three at once.
+
+    With incremental=True only projects modified since the last recorded watermark are
+    fetched, and an empty result is not an error. The watermark is only moved by
+    incremental runs or when record_watermark is set, so ad-hoc single-project pulls
+    never skip other projects' changes.
     """
-    projects = get_erp_data(DocType.PROJECT, user=user, filters=filters)
+    since = ErpSyncState.get_watermark(DocType.PROJECT.value) if incremental else ''
+    projects = iter_erp_data(
+        DocType.PROJECT, user=user, filters=_modified_since(filters, since), fields=PROJECT_FIELDS
+    )
 
-    if len(projects) == 0:
+    # Drain the stream before opening the transaction so the write lock is only
+    # held for the bulk writes, not for the ERPNext round trips. A failed page
+    # raises ErpFetchError here, before anything is written or the watermark moves.
+    rows = OrderedDict()
+    last_modified = since
+    for project in projects:
+        last_modified = _latest_modified(last_modified, project)
+        rows[project['name']] = project
+
+    if not rows and not since:
         raise ProjectsNotFound
 
     with transaction.atomic():
-        updated = timezone.now()
-        updated_projects = []
-        for project in projects:
-            project_type = project.get('project_type')
-            business_unit_name = project.get('custom_business_unit', '')
-            business_unit = None
-            if business_unit_name:
-                business_unit, _ = BusinessUnit.objects.get_or_create(name=business_unit_name)
-
-            _project, _ = Project.objects.update_or_create(
-                name=project['name'],
-                defaults={
-                    'is_active': project.get('status', '') == 'Open',
-                    'updated': updated,
-                    'project_type': project_type.upper() if project_type else '',
-                    'business_unit': business_unit,
-                    'expected_start_date': project.get('expected_start_date') or None,
-                    'expected_end_date': project.get('expected_end_date') or None,
-                    'project_lead': _user_by_email(project.get('project_lead', '')),
-                    'relations_manager': _user_by_email(project.get('custom_project_relations_manager', '')),
-                    'customer': project.get('customer') or '',
-                    'rag': project.get('rag') or '',
-                    'expected_time': project.get('expected_time'),
-                    'actual_time': project.get('actual_time'),
-                    'progress_in_hours': project.get('progress_in_hours'),
-                    'percent_complete': project.get('percent_complete'),
-                    'estimated_costing': project.get('estimated_costing'),
-                    'total_sales_amount': project.get('total_sales_amount'),
-                    'total_costing_amount': project.get('total_costing_amount'),
-                    'total_billable_amount': project.get('total_billable_amount'),
-                    'total_billed_amount': project.get('total_billed_amount'),
-                    'gross_margin': project.get('gross_margin'),
-                    'per_gross_margin': project.get('per_gross_margin'),
-                }
-            )
-            if user:
-                UserProject.objects.get_or_create(
-                    user=user,
-                    project=_project
-                )
-            updated_projects.append(_project.id)
+        updated_projects = _bulk_upsert_projects(rows, user)
+        if incremental or record_watermark:
+            ErpSyncState.advance(DocType.PROJECT.value, last_modified, full=not since)
 
     return updated_projects
 
 
-def pull_tasks_from_erp(user: get_user_model(), updated_projects: list, filters: str = ''):
-    """Upsert tasks from ERPNext for the given project IDs. Deduplicates on MultipleObjectsReturned.
+def pull_tasks_from_erp(user: get_user_model(), updated_projects: list, filters: str = '',
+                        incremental: bool = False, record_watermark: bool = False) -> dict:
+    """Reconcile tasks from ERPNext for the given project IDs with set-based writes.
 
     Pass filters to scope the ERP fetch (e.g. '[["project", "=", "My Project"]]').
-    Without filters, all tasks are fetched and then matched against updated_projects in Python.
+    Without filters, all tasks are fetched and then matched against local projects by name.
+    Local tasks are keyed by (project_id, erp_id); duplicates keep the newest row.
+    With incremental=True only tasks modified since the last watermark are fetched and
+    stale-task deactivation is skipped, since unchanged tasks are not returned.
+
+    Returns a dict of created, updated and deactivated task counts.
     """
-    tasks = get_erp_data(
+    since = ErpSyncState.get_watermark(DocType.TASK.value) if incremental else ''
+    tasks = iter_erp_data(
         DocType.TASK, preferences.TimesheetPreferences.admin_token,
-        user=user, filters=filters
+        user=user, filters=_modified_since(filters, since), fields=TASK_FIELDS
     )
-    updated_tasks = []
+    # The whole stream is read before any write: a failed page raises ErpFetchError
+    # here, so stale-task deactivation below only ever runs on a complete listing.
+    rows = OrderedDict()
+    last_modified = since
     for task in tasks:
-        try:
-            project = Project.objects.get(name=task['project'])
-        except Project.DoesNotExist:
-            continue
-        try:
-            task_obj, _ = Task.objects.update_or_create(
-                project=project,
-                name=task['subject'],
-                erp_id=task['name'],
-                defaults={
-                    'expected_time': task['expected_time'],
-                    'actual_time': task['actual_time'],
-                }
-            )
-            updated_tasks.append(task_obj.id)
-        except Task.MultipleObjectsReturned:
-            duplicates = Task.objects.filter(
-                project=project,
-                name=task['subject'],
-                erp_id=task['name'],
-            ).order_by('-id')
-            latest = duplicates.first()
-            duplicates.exclude(id=latest.id).delete()
-            duplicates.update(
-                expected_time=task['expected_time'],
-                actual_time=task['actual_time'],
-            )
-            updated_tasks.append(latest.id)
+        last_modified = _latest_modified(last_modified, task)
+        rows[task['name']] = task
 
-    inactive_tasks = Task.objects.filter(
-        project_id__in=updated_projects,
-        active=True,
-    ).exclude(
-        id__in=updated_tasks
-    ).distinct()
-    count = inactive_tasks.update(active=False)
-    if count:
-        logger.info('Marked %d stale task(s) inactive', count)
+    counts = {'created': 0, 'updated': 0, 'deactivated': 0}
+    with transaction.atomic():
+        project_ids = dict(
+            Project.objects.filter(
+                name__in={t['project'] for t in rows.values() if t.get('project')}
+            ).values_list('name', 'id')
+        )
+
+        existing = {}
+        duplicate_ids = []
+        for task_obj in Task.objects.filter(
+            project_id__in=project_ids.values()
+        ).exclude(erp_id='').only(
+            'id', 'project_id', 'erp_id', 'name', 'expected_time', 'actual_time'
+        ).order_by('-id'):
+            key = (task_obj.project_id, task_obj.erp_id)
+            if key in existing:
+                duplicate_ids.append(task_obj.id)
+            else:
+                existing[key] = task_obj
+        if duplicate_ids:
+            Task.objects.filter(id__in=duplicate_ids).delete()
+
+        now = timezone.now()
+        to_create = []
+        to_update = []
+        seen_ids = set()
+        for erp_id, task in rows.items():
+            project_id = project_ids.get(task.get('project'))
+            if not project_id:
+                continue
+            task_obj = existing.get((project_id, erp_id))
+            if task_obj is None:
+                to_create.append(Task(
+                    project_id=project_id,
+                    erp_id=erp_id,
+                    name=task['subject'],
+                    expected_time=task['expected_time'],
+                    actual_time=task['actual_time'],
+                    last_update=now,
+                ))
+                continue
+            seen_ids.add(task_obj.id)
+            if (task_obj.name, task_obj.expected_time, task_obj.actual_time) != (
+                    task['subject'], task['expected_time'], task['actual_time']):
+                task_obj.name = task['subject']
+                task_obj.expected_time = task['expected_time']
+                task_obj.actual_time = task['actual_time']
+                task_obj.last_update = now
+                to_update.append(task_obj)
+
+        if not since:
+            # Runs before the inserts, so only pre-existing tasks ERPNext no longer returns are hit.
+            counts['deactivated'] = Task.objects.filter(
+                project_id__in=updated_projects,
+                active=True,
+            ).exclude(
+                id__in=seen_ids
+            ).update(active=False)
+
+        Task.objects.bulk_create(to_create, batch_size=BULK_BATCH_SIZE)
+        Task.objects.bulk_update(
+            to_update, ['name', 'expected_time', 'actual_time', 'last_update'], batch_size=BULK_BATCH_SIZE
+        )
+        counts['created'] = len(to_create)
+        counts['updated'] = len(to_update)
+
+        if incremental or record_watermark:
+            ErpSyncState.advance(DocType.TASK.value, last_modified, full=not since)
+
+    if counts['deactivated']:
+        logger.info('Marked %d stale task(s) inactive', counts['deactivated'])
+    return counts
 
 
 def pull_activities_from_erp(user: get_user_model()):
@@ -573,86 +880,232 @@ def pull_projects_from_erp(user: get_user_model(), filters: str = ''):
     pull_activities_from_erp(user)
 
 
-def push_timesheet_to_erp(queryset: Timelog.objects, user: get_user_model()):
-    """Push local timelogs to ERPNext as Timesheet documents, grouped by project."""
+def submission_key(user_id, project_name: str, week, timelog_ids) -> str:
+    """Idempotency key of a submission batch; the same logs always give the same key."""
+    ids = ','.join(str(timelog_id) for timelog_id in sorted(timelog_ids))
+    raw = f'{user_id}|{project_name}|{week.isoformat()}|{ids}'
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+def _submission_batches(queryset, user):
+    """Group the serialized timelogs into one batch per project and ISO week.
+
+    Zero length logs are not sent; those that were paused (have children)
+    are marked submitted together with the batches holding their children.
+    """
     serializer = TimelogSerializerERP(
-        queryset.order_by('start_time'), many=True)
+        queryset.for_serializer().order_by('start_time'), many=True)
 
     datetime_format = '%Y-%m-%d %H:%M:%S'
-    timelogs = {}
-    parent_ids = []
+    batches = OrderedDict()
+    zero_duration_ids = []
 
     for serializer_data in serializer.data:
         from_time = datetime.strptime(serializer_data['from_time'], datetime_format)
         to_time = datetime.strptime(serializer_data['to_time'], datetime_format)
         if from_time == to_time:
-            try:
-                if Timelog.objects.get(id=serializer_data.get('id')).children.count() > 0:
-                    parent_ids.append(serializer_data.get('id'))
-            except Timelog.DoesNotExist:
-                pass
+            zero_duration_ids.append(serializer_data.get('id'))
             continue
         project_name = serializer_data['project_name']
-        if project_name not in timelogs:
-            timelogs[project_name] = {
+        week = from_time.date() - timedelta(days=from_time.weekday())
+        batch = batches.get((project_name, week))
+        if batch is None:
+            batches[(project_name, week)] = {
+                'project_name': project_name,
+                'week': week,
                 'owner': serializer_data['owner_name'],
                 'employee_name': serializer_data['employee_name'],
                 'employee': serializer_data['employee'],
                 'from_time': from_time,
                 'to_time': to_time,
                 'data': [serializer_data],
-                'ids': [serializer_data.get('id')]
+                'ids': [serializer_data.get('id')],
+                'parent_ids': set()
             }
         else:
-            if from_time < timelogs[project_name]['from_time']:
-                timelogs[project_name]['from_time'] = from_time
-            if to_time > timelogs[project_name]['to_time']:
-                timelogs[project_name]['to_time'] = to_time
-            timelogs[serializer_data['project_name']]['data'].append(
-                serializer_data
-            )
-            timelogs[serializer_data['project_name']]['ids'].append(
-                serializer_data.get('id')
-            )
-
-    url = f'{settings.ERPNEXT_SITE_LOCATION}/api/resource/Timesheet'
-    headers = get_auth_headers(user=user)
-    logger.error(headers)
-
-    submitted_timelogs = []
-    for key, value in timelogs.items():
-        erp_timesheet_data = {
-            'employee_name': value['employee_name'],
-            'employee': value['employee'],
-            'title': (
-                f'{value["owner"]} : '
-                f'{value["from_time"].strftime("%d/%m/%y")}-'
-                f'{value["to_time"].strftime("%d/%m/%y")} - {key}'
-            ),
-            'time_logs': value["data"]
+            batch['from_time'] = min(batch['from_time'], from_time)
+            batch['to_time'] = max(batch['to_time'], to_time)
+            batch['data'].append(serializer_data)
+            batch['ids'].append(serializer_data.get('id'))
+
+    if zero_duration_ids:
+        batch_of = {
+            timelog_id: batch
+            for batch in batches.values() for timelog_id in batch['ids']
         }
-        submitted_timelogs.append(value["data"])
+        children = Timelog.objects.filter(
+            parent_id__in=zero_duration_ids
+        ).values_list('id', 'parent_id')
+        for child_id, parent_id in children:
+            if child_id in batch_of:
+                batch_of[child_id]['parent_ids'].add(parent_id)
+
+    for batch in batches.values():
+        batch['key'] = submission_key(
+            user.id, batch['project_name'], batch['week'], batch['ids'])
+    return list(batches.values())
+
+
+def _find_submitted_timesheet(key: str, headers: dict) -> str:
+    """Name of the ERPNext Timesheet tagged with the key, '' if there is none."""
+    filters = json.dumps([['note', 'like', f'%{key}%']])
+    response = get_erp_client().get(
+        f'{settings.ERPNEXT_SITE_LOCATION}/api/resource/Timesheet'
+        f'?fields=["name"]&filters={quote(filters)}',
+        headers=headers
+    )
+    if response.status_code != 200:
+        raise ValueError(f'Could not look up timesheet {key}: {response.status_code}')
+    data = response.json().get('data') or []
+    return data[0].get('name', '') if data else ''
+
+
+def _send_submission(batch: dict, headers: dict, check_existing: bool) -> dict:
+    """POST one batch as an ERPNext Timesheet. Runs on a worker thread, no database access."""
+    if check_existing:
+        # A previous attempt may have reached ERPNext without us seeing the answer
+        erp_name = _find_submitted_timesheet(batch['key'], headers)
+        if erp_name:
+            return {'status': TimesheetSubmission.SUBMITTED, 'erp_name': erp_name, 'error': ''}
+
+    erp_timesheet_data = {
+        'employee_name': batch['employee_name'],
+        'employee': batch['employee'],
+        'title': (
+            f'{batch["owner"]} : '
+            f'{batch["from_time"].strftime("%d/%m/%y")}-'
+            f'{batch["to_time"].strftime("%d/%m/%y")} - {batch["project_name"]}'
+        ),
+        'note': f'Submission {batch["key"]}',
+        'time_logs': batch['data']
+    }
+    response = get_erp_client().post(
+        f'{settings.ERPNEXT_SITE_LOCATION}/api/resource/Timesheet',
+        data=json.dumps(erp_timesheet_data),
+        headers=headers
+    )
+    if response.status_code != 200:
+        return {'status': TimesheetSubmission.FAILED, 'erp_name': '', 'error': str(response.text)}
+    data = response.json().get('data')
+    erp_name = data.get('name', '') if isinstance(data, dict) else ''
+    return {'status': TimesheetSubmission.SUBMITTED, 'erp_name': erp_name or '', 'error': ''}
 
-        logger.error(erp_timesheet_data)
-        response = requests.post(
-            url,
-            data=json.dumps(erp_timesheet_data),
-            headers=headers
-        )
-        if response.status_code == 200:
-            logger.info('Timesheet submitted successfully')
 
+def push_timesheet_to_erp(queryset: Timelog.objects, user: get_user_model()) -> dict:
+    """Push local timelogs to ERPNext as Timesheet documents, one per project and week.
+
+    Batches are sent concurrently on a bounded pool; database writes stay on
+    the calling thread. Every batch is recorded as a TimesheetSubmission under
+    its idempotency key before it is sent, so a retry skips batches ERPNext
+    already has. The logs of each accepted batch are marked submitted with one
+    update.
+
+    A batch another request recorded first is left to that request and
+    reported as already submitted.
+
+    Returns a report per project:
+    {project_name: {'submitted': n, 'failed': n, 'batches': [...]}}.
+    """
+    batches = _submission_batches(queryset, user)
+    if not batches:
+        return {}
+
+    previous = {
+        submission.key: submission
+        for submission in TimesheetSubmission.objects.filter(
+            key__in=[batch['key'] for batch in batches]
+        )
+    }
+    to_send = []
+    results = {}
+    for batch in batches:
+        submission = previous.get(batch['key'])
+        if submission and submission.status == TimesheetSubmission.SUBMITTED:
+            results[batch['key']] = {
+                'status': TimesheetSubmission.SUBMITTED,
+                'erp_name': submission.erp_name,
+                'error': ''
+            }
+            continue
+        if submission is None:
+            try:
+                with transaction.atomic():
+                    submission = TimesheetSubmission.objects.create(
+                        key=batch['key'],
+                        user=user,
+                        project_name=batch['project_name'],
+                        week=batch['week'],
+                        timelog_count=len(batch['ids'])
+                    )
+            except IntegrityError:
+                # A concurrent submit of the same logs recorded the batch first and sends it
+                results[batch['key']] = {'status': ALREADY_SUBMITTED, 'erp_name': '', 'error': ''}
+                continue
+        # Only an attempt that never got an answer may have reached ERPNext
+        check_existing = submission.status == TimesheetSubmission.PENDING and submission.attempts > 0
+        TimesheetSubmission.objects.filter(pk=submission.pk).update(
+            status=TimesheetSubmission.PENDING,
+            attempts=F('attempts') + 1,
+            updated_at=timezone.now()
+        )
+        to_send.append((batch, check_existing))
+
+    if to_send:
+        headers = get_auth_headers(user=user)
+        workers = min(settings.ERPNEXT_SUBMIT_WORKERS, len(to_send))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = {
+                executor.submit(_send_submission, batch, headers, check_existing): batch
+                for batch, check_existing in to_send
+            }
+            for future in as_completed(futures):
+                batch = futures[future]
+                try:
+                    results[batch['key']] = future.result()
+                except Exception:
+                    # No answer from ERPNext: stays pending and is checked on retry
+                    logger.exception('Error submitting timesheet %s', batch['key'])
+                    results[batch['key']] = {
+                        'status': TimesheetSubmission.PENDING,
+                        'erp_name': '',
+                        'error': 'No response from ERPNext'
+                    }
+
+    sent_keys = {batch['key'] for batch, _ in to_send}
+    report = {}
+    for batch in batches:
+        result = results[batch['key']]
+        if result['status'] == TimesheetSubmission.SUBMITTED:
             Timelog.objects.filter(
-                id__in=value['ids']
+                id__in=batch['ids'] + list(batch['parent_ids'])
             ).update(submitted=True)
+        elif result['status'] == TimesheetSubmission.FAILED:
+            logger.error(
+                'Timesheet %s of %s was rejected: %s',
+                batch['key'], batch['project_name'], result['error']
+            )
+        if batch['key'] in sent_keys:
+            TimesheetSubmission.objects.filter(key=batch['key']).update(
+                status=result['status'],
+                erp_name=result['erp_name'],
+                error=result['error'],
+                updated_at=timezone.now()
+            )
 
-            if parent_ids:
-                Timelog.objects.filter(
-                    id__in=parent_ids
-                ).update(submitted=True)
-
+        project = report.setdefault(
+            batch['project_name'], {'submitted': 0, 'failed': 0, 'batches': []}
+        )
+        if result['status'] in (TimesheetSubmission.SUBMITTED, ALREADY_SUBMITTED):
+            project['submitted'] += len(batch['ids'])
         else:
-            logger.error(response.text)
+            project['failed'] += len(batch['ids'])
+        project['batches'].append({
+            'week': batch['week'],
+            'key': batch['key'],
+            'timelogs': len(batch['ids']),
+            **result
+        })
+    return report
 
 
 def get_report_data(report_name: str, erpnext_token: str = None, filters: str = '', user=None) -> list:
@@ -664,8 +1117,7 @@ def get_report_data(report_name: str, erpnext_token: str = None, filters: str =
     if filters:
         url += '&filters=' + filters
     headers = get_auth_headers(user=user, erpnext_token=erpnext_token)
-    response = requests.request(
-        'GET',
+    response = get_erp_client().get(
         url,
         headers=headers
     )
@@ -713,7 +1165,7 @@ def get_week_of_month(dt):
 
 
 def get_burndown_chart_data(project_name):
-    """Return weekly hours and task totals for a burndown chart, sourced from ERPNext reports."""
+    """Return weekly hours and task totals for a burndown chart, sourced from the report row cache."""
     try:
         project = Project.objects.get(name=project_name)
     except Project.DoesNotExist:
@@ -724,7 +1176,8 @@ def get_burndown_chart_data(project_name):
         total_actual_hours=Sum('actual_time')
     )
 
-    timesheet_detail = get_detailed_report_data(project_name)
+    from timesheet.utils.report_rows import get_detailed_report_rows
+    timesheet_detail = get_detailed_report_rows(project_name)
     hours_by_week = {}
 
     for timesheet in timesheet_detail:
@@ -759,127 +1212,148 @@ def get_burndown_chart_data(project_name):
     }
 
 
-@retry_operation
-def pull_leave_data_from_erp(user):
+def fetch_leave_data(user, since: str = '') -> list:
+    """Fetch the user's leave applications from ERPNext. Network only.
+
+    Without since only approved applications are returned; with since every
+    application modified after it is returned, so cancellations can be applied.
     """
-    Retrieves leave days data from ERPNext and generates a leave schedule.
+    filters = []
+    if user.profile.employee_id:
+        filters.append(["employee", "=", user.profile.employee_id])
+    else:
+        filters.append(
+            ["employee_name", "=", f"{user.first_name} {user.last_name}"])
+    if since:
+        filters.append(["modified", ">", since])
+    else:
+        filters.append(["status", "=", "Approved"])
+    return get_erp_data(
+        DocType.LEAVE, preferences.TimesheetPreferences.admin_token,
+        str(filters).replace('\'', '"'),
+        user=user
+    )
+
+
+@retry_operation
+def save_leave_data(user, leave_data: list, since: str = ''):
+    """Write fetched leave applications as schedules and advance the user's leave watermark.
+
+    With since, only the applications that changed are replaced; otherwise the
+    user's whole leave schedule is rebuilt.
     """
-    from schedule.models.schedule import Schedule
     with transaction.atomic():
-        filters = []
-        if user.profile.employee_id:
-            filters.append(["employee", "=", user.profile.employee_id])
-        else:
-            filters.append(
-                ["employee_name", "=", f"{user.first_name} {user.last_name}"])
-        filters.append(["status", "=", "Approved"])
-        leave_data = get_erp_data(
-            DocType.LEAVE, preferences.TimesheetPreferences.admin_token,
-            str(filters).replace('\'', '"'),
-            user=user
-        )
-        from django.db.models import Q
+        last_modified = since
+        for leave in leave_data:
+            last_modified = _latest_modified(last_modified, leave)
 
-        # Delete all leave first
-        user_leave = Schedule.objects.filter(
-            Q(activity__name__icontains='leave -') | Q(activity__name__icontains='lieu'),
-            user=user
-        )
-        user_leave.delete()
+        if since:
+            # Replace only the applications that changed; cancelled or rejected ones are dropped
+            user_leave = Schedule.objects.filter(
+                erp_id__in=[leave['name'] for leave in leave_data],
+                user=user
+            )
+            leave_data = [leave for leave in leave_data if leave.get('status') == 'Approved']
+        else:
+            user_leave = Schedule.objects.filter(
+                Q(activity__name__icontains='leave -') | Q(activity__name__icontains='lieu'),
+                user=user
+            )
 
-        leave_type = {
-            'Paid Annual leave': 'Leave - Paid',
-            'Paid Sick Leave': 'Leave - Sick',
-            'Leave in lieu of time worked': 'Time in lieu'
-        }
+        activities = {}
+        leaves = OrderedDict()
         for leave in leave_data:
-            if leave['leave_type'] in leave_type:
-                activity, _ = Activity.objects.get_or_create(
-                    name=leave_type[leave['leave_type']]
+            activity_name = _leave_activity_name(leave['leave_type'])
+            if activity_name not in activities:
+                activities[activity_name], _ = Activity.objects.get_or_create(
+                    name=activity_name
                 )
-            else:
-                if 'unpaid' in leave['leave_type'].lower():
-                    activity, _ = Activity.objects.get_or_create(
-                        name='Leave - Unpaid'
-                    )
-                elif 'family' in leave['leave_type'].lower():
-                    activity, _ = Activity.objects.get_or_create(
-                        name='Leave - Paid Family Responsibility'
-                    )
-                else:
-                    activity, _ = Activity.objects.get_or_create(
-                        name=leave['leave_type']
-                    )
-            Schedule.objects.update_or_create(
+            start_time = _schedule_day(leave['from_date'])
+            end_time = _schedule_day(leave['to_date'])
+            # Overlapping applications for the same days collapse to the latest one
+            leaves.pop((start_time, end_time), None)
+            leaves[(start_time, end_time)] = Schedule(
                 erp_id=leave['name'],
-                defaults={
-                    'user': user,
-                    'activity': activity,
-                    'start_time': leave['from_date'],
-                    'end_time': leave['to_date'],
-                    'notes': leave['description']
-                }
-            )
-            leave = Schedule.objects.filter(
-                start_time=leave['from_date'],
-                end_time=leave['to_date'],
-                user=user
+                user=user,
+                activity=activities[activity_name],
+                start_time=start_time,
+                end_time=end_time,
+                notes=leave['description']
             )
-            if leave.count() > 1:
-                leave.exclude(
-                    id=leave.last().id
-                ).delete()
+        changed = _replace_schedules(user_leave, leaves.values())
+
+        ErpSyncState.advance(DocType.LEAVE.value, last_modified, scope=str(user.pk), full=not since)
+    if changed:
+        invalidate_schedule_cache([])
+
+
+LEAVE_ACTIVITIES = {
+    'Paid Annual leave': 'Leave - Paid',
+    'Paid Sick Leave': 'Leave - Sick',
+    'Leave in lieu of time worked': 'Time in lieu'
+}
+
+
+def _leave_activity_name(leave_type: str) -> str:
+    if leave_type in LEAVE_ACTIVITIES:
+        return LEAVE_ACTIVITIES[leave_type]
+    if 'unpaid' in leave_type.lower():
+        return 'Leave - Unpaid'
+    if 'family' in leave_type.lower():
+        return 'Leave - Paid Family Responsibility'
+    return leave_type
+
+
+def _schedule_day(value) -> datetime:
+    """Midnight of an ERPNext date, as an aware datetime for Schedule start/end times."""
+    return timezone.make_aware(datetime.combine(parse_date(str(value)[:10]), datetime.min.time()))
+
+
+def _schedule_key(schedule: Schedule) -> tuple:
+    return (
+        schedule.erp_id, schedule.activity_id, schedule.start_time,
+        schedule.end_time, schedule.notes or ''
+    )
+
+
+def _replace_schedules(existing, desired) -> int:
+    """Make the existing schedule queryset match the desired unsaved schedules.
+
+    Rows that already match are kept, the rest are removed with one delete and
+    the missing ones added with one bulk_create. Returns the number of rows
+    deleted plus created.
+    """
+    wanted = OrderedDict((_schedule_key(schedule), schedule) for schedule in desired)
+    stale = []
+    for schedule in existing.only('id', 'erp_id', 'activity_id', 'start_time', 'end_time', 'notes'):
+        if wanted.pop(_schedule_key(schedule), None) is None:
+            stale.append(schedule.id)
+    if stale:
+        delete_schedules(Schedule.objects.filter(id__in=stale))
+    Schedule.objects.bulk_create(wanted.values(), batch_size=BULK_BATCH_SIZE)
+    return len(stale) + len(wanted)
+
+
+def leave_watermark(user) -> str:
+    """Return the ERPNext modified watermark of the user's last leave sync."""
+    return ErpSyncState.get_watermark(DocType.LEAVE.value, str(user.pk))
+
+
+@retry_operation
+def pull_leave_data_from_erp(user, incremental: bool = False):
+    """
+    Retrieves leave days data from ERPNext and generates a leave schedule.
+
+    With incremental=True only leave applications modified since the user's last
+    watermark are fetched; those are replaced (or dropped if no longer approved)
+    instead of rebuilding the user's whole leave schedule.
+    """
+    since = leave_watermark(user) if incremental else ''
+    save_leave_data(user, fetch_leave_data(user, since=since), since=since)
 
 
 @retry_operation
 def update_schedule_countdown(user):
+    """Recount the countdown of every task the user has slot schedules in."""
     with transaction.atomic():
-        schedules = Schedule.objects.filter(
-            user_project__user=user
-        ).order_by('-start_time')
-        updated_tasks = []
-        for schedule in schedules:
-            if not schedule.task:
-                continue
-            if schedule.task.id in updated_tasks:
-                continue
-            updated_tasks.append(
-                schedule.task.id
-            )
-            start_time = _naive(schedule.start_time)
-            end_time = _naive(schedule.end_time)
-            last_update = _naive(schedule.task.last_update)
-
-            remaining_task_days = calculate_remaining_task_days(
-                schedule.task,
-                start_time,
-                end_time
-            )
-            print('updating schedule {user} : {task} - {remaining_days}'.format(
-                user=user.username,
-                task=schedule.task.name,
-                remaining_days=remaining_task_days
-            ))
-            last_day_number = (
-                    remaining_task_days - (schedule.end_time - schedule.start_time).days
-            )
-            schedule.first_day_number = remaining_task_days
-            schedule.last_day_number = last_day_number
-            schedule.save()
-
-            updated = update_subsequent_schedules(
-                start_time=start_time,
-                task_id=schedule.task.id,
-                last_day_number=last_day_number,
-                excluded_schedule=schedule
-            )
-            if start_time < last_update:
-                excluded_schedules = updated
-                excluded_schedules.append(schedule.id)
-                updated_previous = update_previous_schedules(
-                    start_time,
-                    schedule.task.id,
-                    remaining_task_days,
-                    excluded_schedules=excluded_schedules
-                )
-                updated += updated_previous
+        return recount_tasks(countdown_tasks(user=user), user=user)
@@ -0,0 +1,86 @@
+import logging
+import os
+import threading
+
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+logger = logging.getLogger(__name__)
+
+
+class ERPNextClient:
+    """Thin wrapper around a pooled, keep-alive ``requests.Session`` for ERPNext.
+
+    Every call gets a (connect, read) timeout by default, and idempotent
+    requests are retried with exponential backoff on connection errors and
+    transient 5xx/429 responses.
+    """
+
+    RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+    def __init__(self, pool_size=None, connect_timeout=None,
+                 read_timeout=None, max_retries=None, backoff_factor=None):
+        self.pool_size = pool_size or settings.ERPNEXT_POOL_SIZE
+        self.timeout = (
+            connect_timeout or settings.ERPNEXT_CONNECT_TIMEOUT,
+            read_timeout or settings.ERPNEXT_READ_TIMEOUT,
+        )
+        if max_retries is None:
+            max_retries = settings.ERPNEXT_MAX_RETRIES
+        if backoff_factor is None:
+            backoff_factor = settings.ERPNEXT_RETRY_BACKOFF
+
+        retry = Retry(
+            total=max_retries,
+            connect=max_retries,
+            read=max_retries,
+            status=max_retries,
+            backoff_factor=backoff_factor,
+            status_forcelist=self.RETRY_STATUSES,
+            allowed_methods=Retry.DEFAULT_ALLOWED_METHODS,
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(
+            pool_connections=self.pool_size,
+            pool_maxsize=self.pool_size,
+            max_retries=retry,
+        )
+        self.session = requests.Session()
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault('timeout', self.timeout)
+        return self.session.request(method, url, **kwargs)
+
+    def get(self, url, **kwargs):
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request('POST', url, **kwargs)
+
+    def close(self):
+        self.session.close()
+
+
+_client = None
+_client_pid = None
+_client_lock = threading.Lock()
+
+
+def get_erp_client() -> ERPNextClient:
+    """Return the per-process shared ERPNext client, creating it on first use.
+
+    The client is rebuilt after a fork so worker processes never share
+    sockets with their parent.
+    """
+    global _client, _client_pid
+    pid = os.getpid()
+    if _client is None or _client_pid != pid:
+        with _client_lock:
+            if _client is None or _client_pid != pid:
+                _client = ERPNextClient()
+                _client_pid = pid
+    return _client
@@ -1,12 +1,28 @@
 import logging
+import threading
 from datetime import timedelta
 
-import requests
 from django.conf import settings
 from django.utils import timezone
 
+from timesheet.utils.erp_client import get_erp_client
+
 logger = logging.getLogger(__name__)
 
+_refresh_locks = {}
+_refresh_locks_guard = threading.Lock()
+
+OAUTH_FIELDS = (
+    'erpnext_oauth_access_token',
+    'erpnext_oauth_refresh_token',
+    'erpnext_oauth_token_expires_at',
+)
+
+
+def _refresh_lock(profile):
+    with _refresh_locks_guard:
+        return _refresh_locks.setdefault(profile.pk, threading.Lock())
+
 
 def refresh_oauth_token(profile):
     """Refresh the OAuth access token using the refresh token."""
@@ -25,7 +41,7 @@ def refresh_oauth_token(profile):
     }
 
     try:
-        response = requests.post(token_url, data=data)
+        response = get_erp_client().post(token_url, data=data)
         if response.status_code != 200:
             logger.error('Failed to refresh OAuth token: %s', response.text)
             return False
@@ -55,7 +71,13 @@ def get_valid_oauth_token(user):
     if profile.erpnext_oauth_token:
         return profile.erpnext_oauth_token
 
-    if refresh_oauth_token(profile):
-        return profile.erpnext_oauth_access_token
+    # Sync fetches run on worker threads: only one of them may spend the
+    # refresh token, the others pick up the access token it saved.
+    with _refresh_lock(profile):
+        profile.refresh_from_db(fields=OAUTH_FIELDS)
+        if profile.erpnext_oauth_token:
+            return profile.erpnext_oauth_token
+        if refresh_oauth_token(profile):
+            return profile.erpnext_oauth_access_token
 
     return None
@@ -0,0 +1,192 @@
+import json
+import logging
+from datetime import date, timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from preferences import preferences
+
+from timesheet.enums.doctype import DocType
+from timesheet.models.erp_sync import ErpSyncState
+from timesheet.models.report_row import TimesheetReportRow
+from timesheet.models.user_project import UserProject
+from timesheet.utils.erp import (
+    _latest_modified,
+    _modified_since,
+    get_detailed_report_data,
+    get_report_data,
+    iter_erp_data,
+)
+
+logger = logging.getLogger(__name__)
+
+REPORT_NAME = 'Timesheet Detailed Report'
+
+
+def _report_date(value):
+    try:
+        return date.fromisoformat(str(value)[:10])
+    except ValueError:
+        return None
+
+
+def _row_to_model(row: dict, row_date: date) -> TimesheetReportRow:
+    return TimesheetReportRow(
+        date=row_date,
+        employee_id=row.get('Employee ID') or row.get('Employee') or '',
+        employee_name=row.get('Employee Name') or '',
+        project=row.get('Project') or '',
+        task=row.get('Task') or '',
+        activity=row.get('Activity Type') or row.get('Activity') or '',
+        hours=float(row.get('Hours') or 0),
+        billable_hours=float(row.get('Billable Hours') or 0),
+        costing=float(row.get('Total Costing') or 0),
+        billing=float(row.get('Total Billing') or 0),
+        description=row.get('Description') or '',
+        data=row,
+    )
+
+
+def report_sync_window(full: bool = False, changed_from: str = '') -> tuple[str, str]:
+    """Date window to refresh: the whole history when full, else the trailing ERPNEXT_REPORT_SYNC_DAYS.
+
+    changed_from, the earliest date of a Timesheet edited in ERPNext since the
+    last run, stretches the trailing window back so late edits are picked up.
+    """
+    end = date.today()
+    if full:
+        start = date.fromisoformat(settings.ERPNEXT_BILLABLE_HISTORY_START)
+    else:
+        start = end - timedelta(days=settings.ERPNEXT_REPORT_SYNC_DAYS)
+        changed = _report_date(changed_from) if changed_from else None
+        if changed and changed < start:
+            start = changed
+    return start.isoformat(), end.isoformat()
+
+
+def report_full_sync_due() -> bool:
+    interval = timedelta(hours=settings.ERPNEXT_FULL_SYNC_INTERVAL_HOURS)
+    return ErpSyncState.full_sync_due(REPORT_NAME, interval)
+
+
+def fetch_report_rows(start_date: str, end_date: str) -> list:
+    """Run the Timesheet Detailed Report for every employee and project within a date window."""
+    filters = json.dumps({'start_date': start_date, 'end_date': end_date})
+    return get_detailed_report_data('', filters)
+
+
+def fetch_changed_timesheets(since: str = '') -> tuple[str, str]:
+    """Earliest start_date and newest modified of the ERPNext Timesheets modified after since."""
+    timesheets = iter_erp_data(
+        DocType.TIMESHEET,
+        preferences.TimesheetPreferences.admin_token,
+        filters=_modified_since('', since),
+        fields=['start_date', 'modified'],
+    )
+    earliest, last_modified = '', since
+    for timesheet in timesheets:
+        start_date = str(timesheet.get('start_date') or '')[:10]
+        if start_date and (not earliest or start_date < earliest):
+            earliest = start_date
+        last_modified = _latest_modified(last_modified, timesheet)
+    return earliest, last_modified
+
+
+def fetch_report_sync(full: bool = False, since: str = '') -> dict:
+    """Fetch one report row refresh: the window to replace, its rows and the new watermark.
+
+    since is the report's ErpSyncState watermark, read by the caller so this can
+    run off the database thread.
+    """
+    changed_from, last_modified = fetch_changed_timesheets(since)
+    start_date, end_date = report_sync_window(full, changed_from)
+    return {
+        'rows': fetch_report_rows(start_date, end_date),
+        'start_date': start_date,
+        'end_date': end_date,
+        'full': full,
+        'last_modified': last_modified,
+    }
+
+
+def save_report_rows(rows: list, start_date: str, end_date: str, full: bool = False,
+                     last_modified: str = '') -> int:
+    """Replace the cached report rows dated within the window with freshly fetched rows.
+
+    ERPNext rows carry no stable ID, so the whole window is swapped in one transaction.
+    An empty fetch is treated as a failed report run and leaves the cache untouched.
+    last_modified is the newest Timesheet `modified` seen, recorded as the watermark
+    for the next run's changed-timesheet lookup.
+    """
+    entries = []
+    for row in rows:
+        if not isinstance(row, dict):
+            continue
+        row_date = _report_date(row.get('Date'))
+        if row_date:
+            entries.append(_row_to_model(row, row_date))
+    if not entries:
+        logger.warning('Timesheet Detailed Report returned no rows for %s..%s, keeping cache', start_date, end_date)
+        return 0
+
+    with transaction.atomic():
+        TimesheetReportRow.objects.filter(date__range=(start_date, end_date)).delete()
+        TimesheetReportRow.objects.bulk_create(entries, batch_size=500)
+        ErpSyncState.advance(REPORT_NAME, last_modified or end_date, full=full)
+    return len(entries)
+
+
+def report_rows_synced() -> bool:
+    """True once the whole report history has been copied locally at least once."""
+    return ErpSyncState.objects.filter(doctype=REPORT_NAME, last_full_sync_at__isnull=False).exists()
+
+
+def _visible_to(rows, user):
+    """Limit cached rows to what ERPNext would show the user: their own rows and their projects' rows."""
+    if user.is_superuser:
+        return rows
+    visible = Q(project__in=UserProject.objects.filter(user=user).values('project__name'))
+    employee_id = getattr(getattr(user, 'profile', None), 'employee_id', '')
+    if employee_id:
+        visible |= Q(employee_id=employee_id)
+    return rows.filter(visible)
+
+
+def get_detailed_report_rows(project_name: str = None, employee_id: str = None,
+                             start_date: str = None, end_date: str = None, user=None) -> list:
+    """Timesheet Detailed Report rows, without the trailing totals row, ordered by date.
+
+    Reads the local TimesheetReportRow table once it has been synced, and falls
+    back to running the report on ERPNext before that. Pass user to apply their
+    ERPNext permissions: the cache is shared, so it is narrowed to their rows.
+    """
+    if report_rows_synced():
+        rows = TimesheetReportRow.objects.all()
+        if user is not None:
+            rows = _visible_to(rows, user)
+        if project_name:
+            rows = rows.filter(project=project_name)
+        if employee_id:
+            rows = rows.filter(employee_id=employee_id)
+        if start_date:
+            rows = rows.filter(date__gte=start_date)
+        if end_date:
+            rows = rows.filter(date__lte=end_date)
+        return list(rows.values_list('data', flat=True))
+
+    filters = {}
+    if project_name:
+        filters['Project'] = project_name
+    if employee_id:
+        filters['Employee ID'] = employee_id
+    if start_date:
+        filters['start_date'] = start_date
+    if end_date:
+        filters['end_date'] = end_date
+    rows = get_report_data(
+        'Timesheet%20Detailed%20Report',
+        preferences.TimesheetPreferences.admin_token,
+        json.dumps(filters),
+        user)
+    return [row for row in rows if isinstance(row, dict)]
@@ -0,0 +1,137 @@
+import logging
+import time
+from collections import OrderedDict
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+
+class PhaseSkipped(Exception):
+    """Raise from a phase to skip it and its dependents without logging a failure."""
+
+
+class SyncPhase:
+
+    def __init__(self, name, fetch=None, apply=None, requires=(), after=(), group=None):
+        self.name = name
+        self.fetch = fetch
+        self.apply = apply
+        self.requires = tuple(requires)
+        self.after = tuple(requires) + tuple(after)
+        self.group = group or name
+
+
+class SyncGraph:
+    """Run ERPNext sync phases as a dependency graph.
+
+    Each phase has an optional ``fetch`` callable, run on a bounded worker pool
+    so ERPNext round trips overlap, and an optional ``apply`` callable that gets
+    the fetch result and always runs on the calling thread, so database writes
+    stay serialized on a single connection.
+
+    A phase starts once every phase in ``requires`` and ``after`` has finished.
+    If a phase in ``requires`` failed or was skipped the phase is skipped too;
+    ``after`` only orders. ``apply`` callables may add further phases.
+    """
+
+    def __init__(self, max_workers=8):
+        self.max_workers = max_workers
+        self.phases = OrderedDict()
+        self.finished = set()
+        self.failed = set()
+        self.timings = OrderedDict()
+        self._queued = set()
+
+    def add(self, name, fetch=None, apply=None, requires=(), after=(), group=None):
+        if name in self.phases:
+            raise ValueError(f'Duplicate sync phase: {name}')
+        phase = SyncPhase(name, fetch, apply, requires, after, group)
+        self.phases[name] = phase
+        return phase
+
+    def run(self):
+        pending = OrderedDict()
+        running = {}
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            while True:
+                # Pick up phases added by apply callables since the last pass.
+                for name, phase in self.phases.items():
+                    if name not in self._queued:
+                        self._queued.add(name)
+                        pending[name] = phase
+                if self._start_ready(pending, running, executor):
+                    continue
+                if not running:
+                    break
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    phase = running.pop(future)
+                    try:
+                        result = future.result()
+                    except PhaseSkipped:
+                        self._finish(phase, failed=True)
+                        continue
+                    except Exception:
+                        logger.warning('Sync phase %s failed to fetch', phase.name, exc_info=True)
+                        self._finish(phase, failed=True)
+                        continue
+                    self._apply(phase, result)
+
+        for name in pending:
+            logger.warning('Sync phase %s has unmet dependencies, skipping', name)
+        return self.timings
+
+    def _start_ready(self, pending, running, executor):
+        progressed = False
+        for name in list(pending):
+            phase = pending[name]
+            if not all(dep in self.finished for dep in phase.after):
+                continue
+            del pending[name]
+            progressed = True
+            self._mark_started(phase)
+            if any(dep in self.failed for dep in phase.requires):
+                logger.info('Skipping sync phase %s, a required phase failed', name)
+                self._finish(phase, failed=True)
+            elif phase.fetch:
+                running[executor.submit(self._fetch, phase.fetch)] = phase
+            else:
+                self._apply(phase, None)
+        return progressed
+
+    @staticmethod
+    def _fetch(fetch):
+        try:
+            return fetch()
+        finally:
+            # Worker threads get their own connections; don't leak them.
+            connections.close_all()
+
+    def _apply(self, phase, result):
+        try:
+            if phase.apply:
+                if phase.fetch:
+                    phase.apply(result)
+                else:
+                    phase.apply()
+        except PhaseSkipped:
+            self._finish(phase, failed=True)
+            return
+        except Exception:
+            logger.warning('Sync phase %s failed', phase.name, exc_info=True)
+            self._finish(phase, failed=True)
+            return
+        self._finish(phase)
+
+    def _mark_started(self, phase):
+        start, end, count = self.timings.get(phase.group, (time.perf_counter(), None, 0))
+        self.timings[phase.group] = (start, end, count)
+
+    def _finish(self, phase, failed=False):
+        self.finished.add(phase.name)
+        if failed:
+            self.failed.add(phase.name)
+        start, _, count = self.timings[phase.group]
+        self.timings[phase.group] = (start, time.perf_counter(), count + 1)
@@ -1,79 +1,108 @@
-from bs4 import BeautifulSoup
+from django.db import transaction
+from django.db.models import Case, TextField, Value, When
 
 from timesheet.models import Timelog
+from timesheet.utils.description import description_items, description_to_text
 
 
-def split_timelog_by_description(timelog):
+def _bullet_html(tag, bullet):
+    bullet = bullet.strip()
+    if tag == "li":
+        return f"<ul><li>{bullet}</li></ul>"
+    if tag == "p":
+        return f"<p>{bullet}</p>"
+    return bullet
+
+
+def split_timelogs_by_description(timelogs):
     """
-    Splits a timelog's HTML description into multiple timelogs.
+    Splits the HTML descriptions of many timelogs into multiple timelogs,
+    in one transaction.
 
-    - The parent timelog's description is updated to only contain the first bullet,
-      wrapped in a <ul><li> ... </li></ul> structure.
-    - Additional timelogs (children) are created for each extra bullet.
-      Each child timelog's description is similarly wrapped in a <ul><li> ... </li></ul> structure,
-      and they are given a zero-duration (end_time == start_time).
+    - Each parent timelog's description is updated to only contain its first bullet,
+      wrapped in a <ul><li> ... </li></ul> structure (or a <p> for paragraphs).
+    - Additional timelogs are created for each extra bullet with bulk_create.
+      Each one's description is similarly wrapped, and they are given a
+      zero-duration (end_time == start_time).
 
-    Returns the number of child timelogs created.
+    A child timelog is split through its parent, and each parent only once.
+    Descriptions are parsed once each. Returns the created timelogs.
     """
-    # Use the parent timelog if this one is a child.
-    parent_log = timelog.parent if timelog.parent else timelog
-
-    # Parse the parent's description as HTML.
-    soup = BeautifulSoup(parent_log.description or "", "html.parser")
-    if soup.find_all("li"):
-        tag = "li"
-        bullet_points = [li.decode_contents().strip() for li in soup.find_all("li")]
-    elif soup.find_all("p"):
-        tag = "p"
-        bullet_points = [p.decode_contents().strip() for p in soup.find_all("p")]
-    else:
-        bullet_points = []
-        tag = None
-
-    # If there is one or no bullet point, there is nothing to split.
-    if len(bullet_points) <= 1:
-        return 0
-
-    # Create new HTML using only the first bullet.
-    first_bullet = bullet_points[0].strip()
-    if tag == "li":
-        first_bullet_html = f"<ul><li>{first_bullet}</li></ul>"
-    elif tag == "p":
-        first_bullet_html = f"<p>{first_bullet}</p>"
-    else:
-        first_bullet_html = first_bullet
-
-    # Update the parent's description if needed.
-    if parent_log.description.strip() != first_bullet_html:
-        parent_log.description = first_bullet_html
-        parent_log.save()
-
-    existing_children = parent_log.children.all()
-    existing_children.update(
-        description=first_bullet_html,
-    )
-
-    created_count = 0
-    for bp in bullet_points[1:]:
-        bp = bp.strip()
-        if tag == "li":
-            bullet_html = f"<ul><li>{bp}</li></ul>"
-        elif tag == "p":
-            bullet_html = f"<p>{bp}</p>"
-        else:
-            bullet_html = bp
-        Timelog.objects.create(
-            user=parent_log.user,
-            task=parent_log.task,
-            project=parent_log.project,
-            activity=parent_log.activity,
-            description=bullet_html,
-            start_time=parent_log.start_time,
-            end_time=parent_log.start_time,
-            timezone=parent_log.timezone,
-            submitted=parent_log.submitted,
-            parent=None,
+    parents = {}
+    for timelog in timelogs:
+        # Use the parent timelog if this one is a child.
+        parent_log = timelog.parent if timelog.parent_id else timelog
+        parents.setdefault(parent_log.pk, parent_log)
+
+    changed_parents = []
+    first_bullets = {}
+    new_timelogs = []
+    rendered = {}
+
+    def render(html):
+        if html not in rendered:
+            rendered[html] = description_to_text(html)
+        return rendered[html]
+
+    for parent_log in parents.values():
+        tag, bullet_points = description_items(parent_log.description)
+
+        # If there is one or no bullet point, there is nothing to split.
+        if len(bullet_points) <= 1:
+            continue
+
+        first_bullet_html = _bullet_html(tag, bullet_points[0])
+        first_bullets[parent_log.pk] = first_bullet_html
+        if parent_log.description.strip() != first_bullet_html:
+            parent_log.description = first_bullet_html
+            parent_log.description_text = render(first_bullet_html)
+            changed_parents.append(parent_log)
+
+        for bullet in bullet_points[1:]:
+            bullet_html = _bullet_html(tag, bullet)
+            new_timelogs.append(Timelog(
+                user_id=parent_log.user_id,
+                task_id=parent_log.task_id,
+                project_id=parent_log.project_id,
+                activity_id=parent_log.activity_id,
+                description=bullet_html,
+                description_text=render(bullet_html),
+                start_time=parent_log.start_time,
+                end_time=parent_log.start_time,
+                timezone=parent_log.timezone,
+                submitted=parent_log.submitted,
+                parent=None,
+            ))
+
+    if not new_timelogs:
+        return []
+
+    with transaction.atomic():
+        if changed_parents:
+            Timelog.objects.bulk_update(
+                changed_parents, ['description', 'description_text']
+            )
+        # Existing children take their parent's first bullet, in one query
+        Timelog.objects.filter(parent_id__in=first_bullets).update(
+            description=Case(
+                *[When(parent_id=parent_id, then=Value(html))
+                  for parent_id, html in first_bullets.items()],
+                output_field=TextField()
+            ),
+            description_text=Case(
+                *[When(parent_id=parent_id, then=Value(render(html)))
+                  for parent_id, html in first_bullets.items()],
+                output_field=TextField()
+            )
         )
-        created_count += 1
+        return Timelog.objects.bulk_create(new_timelogs)
+
 
-    return created_count
+def split_timelog_by_description(timelog):
+    """
+    Splits a timelog's HTML description into multiple timelogs, see
+    split_timelogs_by_description.
+
+    Returns the number of child timelogs created.
+    """
+    return len(split_timelogs_by_description([timelog]))